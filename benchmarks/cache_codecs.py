@@ -0,0 +1,83 @@
+"""
+Micro-benchmark of the formats that information is saved in, for large payloads.
+
+Compares loading and dumping aggregated file locations and catrefs with the pure-python YAML
+that was used by older versions, YAML with libyaml, and JSON (the default). Run with
+
+    python benchmarks/cache_codecs.py
+"""
+
+import timeit
+
+import pandas as pd
+import yaml
+
+from model_catalogs.cache import CODECS
+
+
+def agg_filelocs_payload(days=31):
+    """Aggregated file locations of a month of hourly files with 4 timing cycles a day."""
+
+    base = "https://www.ncei.noaa.gov/thredds/dodsC/model-cbofs-files"
+    return {
+        "agg_filelocs": [
+            f"{base}/{date:%Y/%m}/nos.cbofs.fields.n{hour:03d}.{date:%Y%m%d}.t{cycle:02d}z.nc"
+            for date in pd.date_range("2022-01-01", periods=days)
+            for cycle in range(0, 24, 6)
+            for hour in range(1, 7)
+        ]
+    }
+
+
+def catrefs_payload(years=15):
+    """Catrefs of an archive organized by day."""
+
+    return {
+        "catrefs": [
+            [f"{date:%Y}", f"{date:%m}", f"{date:%d}"]
+            for date in pd.date_range("2008-01-01", periods=365 * years)
+        ]
+    }
+
+
+def pure_yaml_dumps(value):
+    return yaml.dump(value, Dumper=yaml.SafeDumper, default_flow_style=False)
+
+
+def pure_yaml_loads(text):
+    return yaml.load(text, Loader=yaml.SafeLoader)
+
+
+def best(function, number):
+    """Return best time of function over a few repeats, in milliseconds."""
+
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1000
+
+
+def main():
+    codecs = {
+        "yaml (pure python)": (pure_yaml_dumps, pure_yaml_loads),
+        "yaml (libyaml)": (CODECS["yaml"].dumps, CODECS["yaml"].loads),
+        "json": (CODECS["json"].dumps, CODECS["json"].loads),
+    }
+    payloads = {
+        "agg_filelocs (744 urls)": agg_filelocs_payload(),
+        "catrefs (5475 days)": catrefs_payload(),
+    }
+
+    print(f"{'payload':<25}{'format':<20}{'dump ms':>10}{'load ms':>10}{'bytes':>10}")
+    for payload_name, value in payloads.items():
+        for codec_name, (dumps, loads) in codecs.items():
+            text = dumps(value)
+            assert loads(text) == value
+            number = 3 if "pure" in codec_name else 20
+            print(
+                f"{payload_name:<25}{codec_name:<20}"
+                f"{best(lambda: dumps(value), number):>10.2f}"
+                f"{best(lambda: loads(text), number):>10.2f}"
+                f"{len(text):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
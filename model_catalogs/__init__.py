@@ -2,7 +2,9 @@
 Set up for using package.
 """
 
+import hashlib
 import importlib
+import warnings
 
 from importlib.metadata import PackageNotFoundError, version
 from pathlib import Path
@@ -11,6 +13,14 @@ import pandas as pd
 
 from appdirs import AppDirs
 
+from . import cache  # noqa
+from .aio import (  # noqa
+    afind_availability,
+    afind_catrefs,
+    aselect_date_range,
+    async_session,
+)
+from .cache import cache_info, cache_prune  # noqa
 from .model_catalogs import (  # noqa
     find_availability,
     make_catalog,
@@ -18,19 +28,34 @@ from .model_catalogs import (  # noqa
     select_date_range,
     setup,
     transform_source,
+    warm_cache,
 )
 from .utils import (  # noqa
+    CircuitOpenError,
+    FileDates,
     agg_for_date,
     astype,
     calculate_boundaries,
+    catalog_cache_clear,
+    catalog_cache_info,
+    circuit_open,
     file2dt,
     filedates2df,
+    files2dt,
     find_bbox,
     find_catrefs,
     find_filelocs,
+    fresh_parameter,
     get_fresh_parameter,
+    get_session,
     is_fresh,
+    metrics,
+    metrics_clear,
+    metrics_prometheus,
     status,
+    status_cache_clear,
+    status_cache_info,
+    status_many,
 )
 
 
@@ -78,16 +103,38 @@ cache_dir = Path(dirs.user_cache_dir)
 # This is where files are saved to refer back to for saving time
 CACHE_PATH = cache_dir
 CACHE_PATH_COMPILED = CACHE_PATH / "compiled"
-CACHE_PATH_AVAILABILITY = CACHE_PATH / "availability"
-CACHE_PATH_FILE_LOCS = CACHE_PATH / "file_locs"
+CACHE_PATH_STATUS = CACHE_PATH / "status"
+CACHE_PATH_HTTP = CACHE_PATH / "http"
+
+# catrefs, start/end datetimes, and aggregated file locations of model sources
+CACHE_PATH_DB = CACHE_PATH / "cache.sqlite"
+
+# Format of files saved for the package other than catalogs: "json" (default) or "yaml".
+# Files saved as YAML by older versions are still read. See `mc.cache.CODECS`.
+CACHE_FORMAT = "json"
+
+# Maximum number of reads of saved information that are remembered in memory, for files
+# and for the database in each thread. They are read again once the file or database
+# changed.
+CACHE_MEMO_SIZE = 1024
+
+# lock files so that information is found by one process at a time, see `mc.cache.lock()`
+CACHE_PATH_LOCKS = CACHE_PATH / "locks"
+
+# Where catrefs, start/end datetimes, and file locations are kept, so that a fleet of
+# workers can share them: None for the database at CACHE_PATH_DB, a directory that the
+# machines share (e.g. on NFS), an fsspec URL (e.g. "s3://bucket/model_catalogs"), or an
+# instance of `mc.cache.Backend`. With a shared backend, compiled catalogs and boundaries
+# are also shared. See `mc.cache.backend()`.
+CACHE_BACKEND = None
 
 # whenever a package of catalogs is installed, have it copy any available boundaries to here
 CAT_PATH_BOUNDARIES = CACHE_PATH / "boundaries"
 
 # make directories
 CACHE_PATH_COMPILED.mkdir(parents=True, exist_ok=True)
-CACHE_PATH_AVAILABILITY.mkdir(parents=True, exist_ok=True)
-CACHE_PATH_FILE_LOCS.mkdir(parents=True, exist_ok=True)
+CACHE_PATH_STATUS.mkdir(parents=True, exist_ok=True)
+CACHE_PATH_HTTP.mkdir(parents=True, exist_ok=True)
 CAT_PATH_BOUNDARIES.mkdir(parents=True, exist_ok=True)
 
 
@@ -102,34 +149,71 @@ def FILE_PATH_COMPILED(model):
     return (CACHE_PATH_COMPILED / model).with_suffix(".yaml")
 
 
-# availability file names
-def FILE_PATH_START(model, model_source):
-    """Return filename for model/model_source start time."""
-    return CACHE_PATH_AVAILABILITY / f"{model}_{model_source}_start_datetime.yaml"
+def FILE_PATH_BOUNDARIES(model):
+    """Return filename for model boundaries information, in the format of CACHE_FORMAT."""
+    return CAT_PATH_BOUNDARIES / f"{model}{cache.suffix()}"
 
 
-def FILE_PATH_END(model, model_source):
-    """Return filename for model/model_source end time."""
-    return CACHE_PATH_AVAILABILITY / f"{model}_{model_source}_end_datetime.yaml"
+def FILE_PATH_STATUS(host, endpoint):
+    """Return filename for server status of host and endpoint, in the format of CACHE_FORMAT."""
+    name = f"{host}{endpoint}".replace("/", "_").replace(":", "_")
+    return CACHE_PATH_STATUS / f"{name}{cache.suffix()}"
 
 
-def FILE_PATH_BOUNDARIES(model):
-    """Return filename for model boundaries information."""
-    return (CAT_PATH_BOUNDARIES / model).with_suffix(".yaml")
+def FILE_PATH_HTTP(url):
+    """Return filenames for the cached response body and validators of url."""
+    name = hashlib.sha1(url.encode()).hexdigest()
+    return CACHE_PATH_HTTP / f"{name}.xml", CACHE_PATH_HTTP / f"{name}{cache.suffix()}"
+
+
+def _FILE_PATH_START(model, model_source):
+    """Return filename for model/model_source start time, as saved by older versions."""
+    return CACHE_PATH / "availability" / f"{model}_{model_source}_start_datetime.yaml"
 
 
-def FILE_PATH_CATREFS(model, model_source):
-    """Return filename for model/model_source start time."""
-    return CACHE_PATH_AVAILABILITY / f"{model}_{model_source}_catrefs.yaml"
+def _FILE_PATH_END(model, model_source):
+    """Return filename for model/model_source end time, as saved by older versions."""
+    return CACHE_PATH / "availability" / f"{model}_{model_source}_end_datetime.yaml"
 
 
-def FILE_PATH_AGG_FILE_LOCS(model, model_source, date, is_fore):
-    """Return filename for aggregated file locations.
+def _FILE_PATH_CATREFS(model, model_source):
+    """Return filename for model/model_source catrefs, as saved by older versions."""
+    return CACHE_PATH / "availability" / f"{model}_{model_source}_catrefs.yaml"
+
+
+def _FILE_PATH_AGG_FILE_LOCS(model, model_source, date, is_fore):
+    """Return filename for aggregated file locations, as saved by older versions.
 
     Date included to day."""
-    date = astype(date, pd.Timestamp)
+    date = pd.Timestamp(date)
     name = f"{model}_{model_source}_{date.isoformat()[:10]}_is-forecast_{is_fore}.yaml"
-    return CACHE_PATH_FILE_LOCS / name
+    return CACHE_PATH / "file_locs" / name
+
+
+# Paths of files that information about model sources was saved to by older versions,
+# which is now saved in CACHE_PATH_DB. Old files there are removed, see
+# `mc.cache.connection()`.
+_DEPRECATED_PATHS = {
+    "CACHE_PATH_AVAILABILITY": lambda: CACHE_PATH / "availability",
+    "CACHE_PATH_FILE_LOCS": lambda: CACHE_PATH / "file_locs",
+    "FILE_PATH_START": lambda: _FILE_PATH_START,
+    "FILE_PATH_END": lambda: _FILE_PATH_END,
+    "FILE_PATH_CATREFS": lambda: _FILE_PATH_CATREFS,
+    "FILE_PATH_AGG_FILE_LOCS": lambda: _FILE_PATH_AGG_FILE_LOCS,
+}
+
+
+def __getattr__(name):
+    """Return deprecated paths, with a warning."""
+
+    if name in _DEPRECATED_PATHS:
+        warnings.warn(
+            f"mc.{name} is deprecated and will be removed in a future version: information about model sources is saved in mc.CACHE_PATH_DB instead, see mc.cache.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return _DEPRECATED_PATHS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Fresh parameters: how long until model output avialability will be refreshed
@@ -140,4 +224,55 @@ FRESH = {
     "catrefs": "6 hours",
     "file_locs": "4 hours",
     "compiled": "6 hours",  # want to be on the same calendar day as when they were compiled; this approximates that.  # noqa: E501
+    "status": "10 minutes",
+    "missing": "5 minutes",  # days without catref or files, and servers that are down
+    "catalog": "1 hour",  # thredds catalog pages held in memory
 }
+
+# HTTP parameters for the process-wide session that is shared by server status checks
+# and THREDDS catalog crawling. Pool sizes and retries take effect the next time the
+# session is created; timeouts and circuit breaker parameters take effect right away.
+HTTP = {
+    "pool_connections": 20,  # number of hosts to keep a connection pool for
+    "pool_maxsize": 10,  # maximum number of connections kept alive per host
+    "max_retries": 2,  # retries on failed connections (not on HTTP error codes)
+    "connect_timeout": 5,  # seconds
+    "read_timeout": 60,  # seconds
+    "crawl_timeout": 600,  # seconds for `find_catrefs()` to walk a whole catalog
+    "circuit_failures": 3,  # failures in a row before requests to a host fail fast
+    "circuit_cooldown": "5 minutes",  # how long requests to that host then fail fast
+}
+
+# Whether server status checks are also saved to mc.CACHE_PATH_STATUS so they can be
+# used by other processes. They are always remembered in memory for the current process.
+STATUS_CACHE_DISK = False
+
+# Maximum number of thredds catalog pages held in memory, for ``mc.FRESH["catalog"]``.
+# The least recently used are forgotten first.
+CATALOG_CACHE_SIZE = 128
+
+# Whether thredds catalog xml is saved to mc.CACHE_PATH_HTTP with its ETag/Last-Modified
+# validators, so that it is only downloaded again if it changed on the server.
+HTTP_CACHE_DISK = True
+
+# Limits for each category of saved information: rows of mc.CACHE_PATH_DB by category
+# (e.g. "file_locs"), and the files in mc.CACHE_PATH_COMPILED ("compiled"),
+# mc.CACHE_PATH_HTTP ("http"), and mc.CACHE_PATH_STATUS ("status"). Anything not used for
+# max_age is removed, then the least recently used until there are at most max_entries
+# taking at most max_size bytes. Use None for no limit. The limits are applied by
+# `mc.cache_prune()`, which runs automatically in a separate thread after information is
+# saved and at the end of `mc.warm_cache()`, at most once per prune_interval (None to only
+# run it by hand). When rows were last used is only updated once they were not used for
+# access_interval, so that reading them rarely writes.
+CACHE_LIMITS = {
+    "max_age": "30 days",
+    "max_entries": 100000,
+    "max_size": 200 * 2**20,  # bytes
+    "prune_interval": "1 hour",
+    "access_interval": "1 hour",
+}
+
+# Upper bounds in seconds of the buckets of the timing histograms of `mc.metrics()`, for
+# finding saved information again and for network requests. Changes take effect after
+# `mc.metrics_clear()`.
+METRICS_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300]
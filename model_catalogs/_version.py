@@ -0,0 +1 @@
+__version__ = "0.1.dev35+gf9d90482f"
\ No newline at end of file
@@ -0,0 +1,812 @@
+"""
+Coroutine versions of the functions that find model availability and file locations.
+
+These use an asynchronous HTTP client so that many models and sources can be resolved at once in one event loop. They read and write the same cached information as their synchronous counterparts, in separate threads so that the event loop is not blocked by a shared ``mc.CACHE_BACKEND`` such as an object store.
+"""
+
+import asyncio
+import contextlib
+import functools
+import time
+import warnings
+
+import requests
+
+from intake.catalog import Catalog
+from intake_xarray.opendap import OpenDapSource
+
+import model_catalogs as mc
+
+from model_catalogs import utils
+from model_catalogs.model_catalogs import (
+    _agg_for_days,
+    _aggregation_days,
+    _catalog_with_availability,
+    _check_model_source,
+    _check_not_nested,
+    _daily_catrefs,
+    _date_range_parameters,
+    _end_datetime,
+    _filetype,
+    _fresh_agg_filelocs,
+    _known_agg_filelocs,
+    _pick_model_source,
+    _plan_agg_filelocs,
+    _previous_catrefs,
+    _raise_catalog_not_working,
+    _read_catrefs,
+    _read_datetimes,
+    _record_agg_filelocs_misses,
+    _record_datetimes_hits,
+    _record_datetimes_misses,
+    _save_catrefs,
+    _save_datetimes,
+    _save_no_catref,
+    _search_first_populated,
+    _set_date_range,
+    _source_with_availability,
+    _start_datetime,
+    _update_source_urlpath,
+    _warn_date_range_not_available,
+    _warn_server_not_working,
+)
+from model_catalogs.process import DatasetTransform
+
+
+# aiohttp is required for the coroutines in this module
+try:
+    import aiohttp
+
+    AIOHTTP_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    AIOHTTP_AVAILABLE = False  # pragma: no cover
+
+
+def _check_aiohttp():
+    """Raise error if aiohttp is not available."""
+    if not AIOHTTP_AVAILABLE:
+        raise ModuleNotFoundError(  # pragma: no cover
+            "`aiohttp` is not available but is required for the coroutine versions of `model_catalogs` functions."
+        )
+
+
+def async_session():
+    """Return asynchronous HTTP session.
+
+    The session is set up like the one from ``mc.get_session()``: connections are kept alive with at most ``mc.HTTP["pool_maxsize"]`` per host, responses can be gzip-encoded, and the timeouts in ``mc.HTTP`` are applied. Use it as an async context manager and pass it to the coroutines in this module to share its connections between them.
+
+    Returns
+    -------
+    aiohttp.ClientSession
+
+    Examples
+    --------
+
+    Find availability for several models at once:
+
+    >>> async with mc.async_session() as session:
+    ...     cats = await asyncio.gather(
+    ...         *[mc.afind_availability(main_cat[model], session=session) for model in ["CBOFS", "DBOFS"]]
+    ...     )
+    """
+
+    _check_aiohttp()
+    connector = aiohttp.TCPConnector(limit_per_host=mc.HTTP["pool_maxsize"])
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=mc.HTTP["connect_timeout"], sock_read=mc.HTTP["read_timeout"]
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def _in_thread(function, *args, **kwargs):
+    """Return result of function run in a separate thread, for saved information that might be in a remote ``mc.CACHE_BACKEND``."""
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(function, *args, **kwargs)
+    )
+
+
+@contextlib.asynccontextmanager
+async def _session_context(session):
+    """Use session if input, otherwise a new session that is closed afterward."""
+
+    if session is not None:
+        yield session
+    else:
+        async with async_session() as session:
+            yield session
+
+
+async def _get(session, url):
+    """GET url, applying the circuit breaker for its host.
+
+    Thredds catalog xml is requested conditionally on it having changed since it was saved to ``mc.CACHE_PATH_HTTP``, as in ``mc.get_session()``.
+
+    Returns
+    -------
+    tuple
+        Status code and content of response. For a 304 Not Modified response, content is the saved content.
+    """
+
+    host = utils.urlsplit(url).netloc
+    if not utils._circuit_allow(host):
+        raise mc.CircuitOpenError(
+            f"Circuit breaker is open for {host} after repeated failures."
+        )
+
+    cacheable = utils._http_cacheable(url)
+    headers = await _in_thread(utils._http_cache_headers, url) if cacheable else {}
+    try:
+        async with session.get(url, headers=headers) as resp:
+            content = await resp.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        utils._circuit_record(host, success=False)
+        raise requests.exceptions.ConnectionError(
+            f"Request to {url} failed: {e!r}"
+        ) from e
+    utils._circuit_record(host, success=resp.status < 500)
+
+    if cacheable:
+        cached = await _in_thread(
+            utils._http_cache_update, url, resp.status, resp.headers, content
+        )
+        if cached is not None:
+            content, _ = cached
+
+    return resp.status, content
+
+
+async def astatus(urlpath, suffix=".das", use_cache=True, session=None):
+    """Check status of server for urlpath.
+
+    Coroutine version of ``mc.status()``, with the same cache of server status by host and endpoint, which is only set by responses of 200 and by server failures.
+
+    Parameters
+    ----------
+    urlpath : str
+        Path to file location to check.
+    suffix : str, optional
+        Suffix to add to urlpath for the request. Defaults to ".das" for OPeNDAP.
+    use_cache : bool, optional
+        If False, check server regardless of a previously-found status. Defaults to True.
+    session : aiohttp.ClientSession, optional
+        Session from ``mc.async_session()`` to use.
+
+    Returns
+    -------
+    bool
+        If True, server was reachable.
+    """
+
+    key = utils._health_key(urlpath)
+    if use_cache and key is not None:
+        status = await _in_thread(utils._health_lookup, key)
+        if status is not None:
+            return status
+
+    async with _session_context(session) as session:
+        start = time.perf_counter()
+        try:
+            status_code, _ = await _get(session, urlpath + suffix)
+        except requests.exceptions.RequestException as e:
+            status, server, reason = False, False, type(e).__name__
+        else:
+            status, server = status_code == 200, utils._server_status(status_code)
+            reason = f"{status_code} error"
+        utils._record_request("status", time.perf_counter() - start, error=not status)
+
+    if key is not None and server is not None:
+        await _in_thread(utils._health_record, key, server, reason)
+
+    return status
+
+
+async def _source_status(source, session):
+    """Fill in and return ``source._status``."""
+
+    if not hasattr(source, "_status"):
+        source._status = await astatus(*source._status_request(), session=session)
+    return source._status
+
+
+async def _acatalog(session, catalog_url, filetype=None):
+    """Read thredds catalog into catalog references and OPeNDAP dataset locations.
+
+    If filetype is input, only datasets that are model output files of filetype are kept. Uses the same cache of thredds catalogs as ``find_filelocs()``, under a separate key.
+    """
+
+    key = ("parsed", catalog_url, filetype)
+    parsed = utils._catalog_cache_get(key)
+    if parsed is None:
+        with utils._timed_request("catalog"):
+            status_code, content = await _get(session, catalog_url)
+            previous = utils._catalog_cache_get(key, stale=True)
+            if status_code == 304 and previous is not None:
+                parsed = previous
+            elif status_code in (200, 304):
+                parsed = utils._parse_thredds_catalog(content, catalog_url, filetype)
+            else:
+                raise requests.exceptions.HTTPError(
+                    f"{status_code} error for thredds catalog {catalog_url}."
+                )
+        utils._catalog_cache_put(key, parsed)
+    return parsed
+
+
+async def _afind_catrefs(session, catloc, catrefs=None):
+    """Find or update catrefs, following the catalogs of each level all at once."""
+
+    # 0th level catalog, only keep numerical directories
+    refs0, _ = await _acatalog(session, catloc)
+    years = [(catref,) for catref in refs0 if catref.isnumeric()]
+
+    # 1st level catalog
+    relist = utils._branches_to_relist(years, catrefs)
+    cats1 = await asyncio.gather(
+        *[_acatalog(session, refs0[year[0]]) for year in relist]
+    )
+    refs1 = {year: refs for year, (refs, _) in zip(relist, cats1)}
+
+    async def href1(catref):
+        """Catalog url for catref, reading its year catalog if it wasn't on the 1st level."""
+        if catref[:1] not in refs1:
+            refs1[catref[:1]], _ = await _acatalog(session, refs0[catref[0]])
+        return refs1[catref[:1]][catref[1]]
+
+    catrefs1 = [
+        year + (catref1,)
+        for year in years
+        for catref1 in (
+            refs1[year] if year in refs1 else utils._known_labels(year, catrefs)
+        )
+    ]
+
+    # Check first one to see if there are more catalog references or not
+    if catrefs is None:
+        refs_test, _ = await _acatalog(session, await href1(catrefs1[0]))
+        more_levels = len(refs_test) > 0
+    else:
+        more_levels = len(catrefs[0]) == 3
+
+    # If there are more catalog references, run another level of catalog and combine
+    if not more_levels:
+        return catrefs1
+
+    relist = utils._branches_to_relist(catrefs1, catrefs)
+    cats2 = await asyncio.gather(
+        *[_acatalog(session, await href1(catref)) for catref in relist]
+    )
+    refs2 = {catref: refs for catref, (refs, _) in zip(relist, cats2)}
+    return [
+        catref + (catref2,)
+        for catref in catrefs1
+        for catref2 in (
+            refs2[catref] if catref in refs2 else utils._known_labels(catref, catrefs)
+        )
+    ]
+
+
+async def afind_catrefs(catloc, session=None, catrefs=None):
+    """Find hierarchy of catalog references for thredds catalog.
+
+    Coroutine version of ``mc.find_catrefs()``. All catalogs on one level of the hierarchy are read at once. The whole search has to finish within ``mc.HTTP["crawl_timeout"]`` seconds, otherwise ``requests.exceptions.Timeout`` is raised.
+
+    Parameters
+    ----------
+    catloc: str
+        Search in thredds catalog structure from base catalog, catloc.
+    session : aiohttp.ClientSession, optional
+        Session from ``mc.async_session()`` to use.
+    catrefs : list, optional
+        Previously-found output of this function for catloc, to update by reading only new catalogs and the earliest and latest previously-found catalogs on each level.
+
+    Returns
+    -------
+    list
+        Contains tuples containing the hierarchy of directories in the thredds catalog structure to get to where the datafiles start.
+    """
+
+    if catrefs is not None:
+        catrefs = [tuple(catref) for catref in catrefs] or None
+
+    async with _session_context(session) as session:
+        try:
+            return await asyncio.wait_for(
+                _afind_catrefs(session, catloc, catrefs), mc.HTTP["crawl_timeout"]
+            )
+        except asyncio.TimeoutError:
+            raise requests.exceptions.Timeout(
+                f"Crawling catalog {catloc} took longer than {mc.HTTP['crawl_timeout']} seconds."
+            )
+
+
+async def afind_filelocs(catref, catloc, filetype="fields", session=None):
+    """Find thredds file locations.
+
+    Coroutine version of ``mc.find_filelocs()``.
+
+    Parameters
+    ----------
+    catref: tuple
+        2 or 3 labels describing the directories from catlog to get the data
+        locations.
+    catloc: str
+        Base thredds catalog location.
+    filetype: str
+        Which filetype to use. Every NOAA OFS model has "fields" available, but
+        some have "regulargrid" or "2ds" also (listed in separate catalogs in the
+        model name).
+    session : aiohttp.ClientSession, optional
+        Session from ``mc.async_session()`` to use.
+
+    Returns
+    -------
+    list
+        Locations of files found from catloc to hierarchical location described by catref.
+    """
+
+    async with _session_context(session) as session:
+        catalog_url = catloc
+        for label in catref:
+            refs, _ = await _acatalog(session, catalog_url)
+            catalog_url = refs[label]
+        _, datasets = await _acatalog(session, catalog_url, filetype)
+
+    return list(datasets.values())
+
+
+async def _afind_day_filelocs(catref, catloc, filetype, session):
+    """Return file locations of the catalog of one day, or None if it is not found, as ``mc.model_catalogs._find_day_filelocs()``."""
+
+    try:
+        return await afind_filelocs(catref, catloc, filetype, session=session)
+    except (KeyError, requests.exceptions.RequestException):
+        return None
+
+
+async def _acatrefs(source, override, session):
+    """Return catrefs for source, saved if fresh, otherwise updated or found from its catalog.
+
+    As in ``mc.model_catalogs._find_catrefs()``, only one process at a time finds the catrefs of a source.
+    """
+
+    catrefs = await _in_thread(_read_catrefs, source, override)
+    if catrefs is None:
+        async with mc.cache.alock("catrefs", source.cat.name, source.name):
+            # another process may have found them while waiting for the lock
+            catrefs = await _in_thread(_read_catrefs, source, override)
+            if catrefs is None:
+                with utils._timed_cache("catrefs"):
+                    catrefs = await _in_thread(
+                        _save_catrefs,
+                        source,
+                        await afind_catrefs(
+                            source.metadata["catloc"],
+                            session=session,
+                            catrefs=await _in_thread(
+                                _previous_catrefs, source, override
+                            ),
+                        ),
+                    )
+    return catrefs
+
+
+async def afind_datetimes(
+    source, find_start_datetime, find_end_datetime, override=False, session=None
+):
+    """Find the start and/or end datetimes for source.
+
+    Coroutine version of ``mc.find_datetimes()``. For sources with static urlpaths, the Dataset is opened in a separate thread since that does not use the asynchronous HTTP client.
+
+    Parameters
+    ----------
+    source : Intake source
+        Model source for which to find start and/or end datetimes
+    find_start_datetime : bool
+        True to calculate start_datetime, otherwise returns None
+    find_end_datetime : bool
+        True to calculate end_datetime, otherwise returns None
+    override : boolean, optional
+        Use `override=True` to find catrefs regardless of freshness, searching the whole catalog. Otherwise stale catrefs are updated by reading only the most recent and earliest parts of the catalog.
+    session : aiohttp.ClientSession, optional
+        Session from ``mc.async_session()`` to use.
+
+    Returns
+    -------
+    tuple
+        Contains 'start_datetime' and 'end_datetime' where each are strings or can be None if they didn't need to be found.
+    """
+
+    if "catloc" not in source.metadata:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            functools.partial(
+                mc.model_catalogs.find_datetimes,
+                source,
+                find_start_datetime,
+                find_end_datetime,
+                override=override,
+            ),
+        )
+
+    start = time.perf_counter()
+    filetype = _filetype(source)
+    catloc = source.metadata["catloc"]
+
+    async with _session_context(session) as session:
+        catrefs = await _acatrefs(source, override, session)
+
+        start_datetime, end_datetime = None, None
+        if find_start_datetime:
+            # first make sure the dates actually have model files available
+            search = _search_first_populated(len(catrefs))
+            filelocs = {}
+            try:
+                i = next(search)
+                while True:
+                    filelocs[i] = sorted(
+                        await afind_filelocs(
+                            catrefs[i], catloc, filetype, session=session
+                        )
+                    )
+                    i = search.send(len(filelocs[i]) > 0)
+            except StopIteration as stop:
+                start_datetime = _start_datetime(filelocs.get(stop.value, []))
+
+        if find_end_datetime:
+            filelocs = await afind_filelocs(
+                catrefs[-1], catloc, filetype, session=session
+            )
+            end_datetime = _end_datetime(filelocs)
+
+    await _in_thread(_save_datetimes, source, start_datetime, end_datetime)
+    _record_datetimes_misses(
+        find_start_datetime, find_end_datetime, time.perf_counter() - start
+    )
+
+    return start_datetime, end_datetime
+
+
+async def afind_availability_source(source, override=False, session=None):
+    """Find availabililty for source specifically.
+
+    Coroutine version of ``mc.model_catalogs.find_availability_source()``.
+
+    Parameters
+    ----------
+    source : Intake source
+        Source for which to find availability.
+    override : boolean, optional
+        Use `override=True` to find availability regardless of freshness.
+    session : aiohttp.ClientSession, optional
+        Session from ``mc.async_session()`` to use.
+
+    Returns
+    -------
+    Intake source
+        `start_datetime` and `end_datetime` are added to metadata of source.
+    """
+
+    async with _session_context(session) as session:
+
+        # if server is not working, return input source with None for new metadata
+        if not await _source_status(source, session):
+            _warn_server_not_working(source)
+            start_datetime, end_datetime = None, None
+
+        else:
+
+            start_datetime, end_datetime = await _in_thread(
+                _read_datetimes, source, override
+            )
+            _record_datetimes_hits(start_datetime, end_datetime)
+
+            if start_datetime is None or end_datetime is None:
+                async with mc.cache.alock("datetimes", source.cat.name, source.name):
+                    # another process may have found them while waiting for the lock
+                    start_datetime, end_datetime = await _in_thread(
+                        _read_datetimes, source, override
+                    )
+                    if start_datetime is None or end_datetime is None:
+                        start_temp, end_temp = await afind_datetimes(
+                            source,
+                            start_datetime is None,
+                            end_datetime is None,
+                            override=override,
+                            session=session,
+                        )
+                        start_datetime = (
+                            start_temp if start_datetime is None else start_datetime
+                        )
+                        end_datetime = (
+                            end_temp if end_datetime is None else end_datetime
+                        )
+
+    source.metadata["start_datetime"] = start_datetime
+    source.metadata["end_datetime"] = end_datetime
+
+    return source
+
+
+async def afind_availability(
+    cat_or_source, model_source=None, override=False, verbose=False, session=None
+):
+    """Find availability for Catalog or Source.
+
+    Coroutine version of ``mc.find_availability()``. For a Catalog, all model_sources are found at once.
+
+    Parameters
+    ----------
+    cat_or_source : Intake catalog or source
+        Catalog containing model_source sources for which to find availability, or single Source for which to find availability.
+    model_source : str, list of strings, optional
+        Specified model_source(s) for which to find the availability for a catalog. If unspecified and cat_or_source is a Catalog, find availability for all sources in catalog.
+    override : boolean, optional
+        Use `override=True` to find availability regardless of freshness.
+    verbose : boolean, optional
+        If True, `start_datetime` and `end_datetime` found for each Source will be printed.
+    session : aiohttp.ClientSession, optional
+        Session from ``mc.async_session()`` to use.
+
+    Returns
+    -------
+    Intake catalog or source
+        If a Catalog was input, a Catalog will be returned; if a Source was input, a Source will be returned. For the single input Source or all Sources in the input Catalog, `start_datetime` and `end_datetime` are added to metadata.
+
+    Examples
+    --------
+
+    >>> main_cat = mc.setup()
+    >>> cat = await mc.afind_availability(main_cat['CIOFS'])
+    """
+
+    _check_not_nested(cat_or_source)
+
+    async with _session_context(session) as session:
+
+        # if Catalog was input
+        if isinstance(cat_or_source, Catalog):
+            # if no model_source input, find all
+            model_sources = (
+                list(cat_or_source)
+                if model_source is None
+                else mc.astype(model_source, list)
+            )
+
+            async def find(model_source):
+                try:
+                    return await afind_availability_source(
+                        cat_or_source[model_source], override=override, session=session
+                    )
+                except requests.exceptions.RequestException:
+                    print(f"Found a server error with {model_source}")
+                    return cat_or_source[model_source]
+
+            sources = await asyncio.gather(*[find(ms) for ms in model_sources])
+            if verbose:
+                for source in sources:
+                    print(
+                        f"{source.name}: {source.metadata['start_datetime']} to {source.metadata['end_datetime']}"
+                    )
+
+            return _catalog_with_availability(cat_or_source, list(sources))
+
+        # if Source input
+        elif isinstance(cat_or_source, (OpenDapSource, DatasetTransform)):
+
+            # doesn't make sense to input a model_source and source
+            if model_source is not None:
+                raise ValueError(
+                    "A source was input, so `model_source` should be None."
+                )
+
+            source = await afind_availability_source(
+                cat_or_source, override=override, session=session
+            )
+
+            if verbose:
+                print(
+                    f"{source.name}: {source.metadata['start_datetime']} to  {source.metadata['end_datetime']}"
+                )
+
+            return _source_with_availability(cat_or_source, source)
+
+        else:
+            raise ValueError(
+                f"Either an Intake catalog or Intake source should be input, but found object of type {type(cat_or_source)}."
+            )
+
+
+async def aselect_date_range(
+    cat_or_source,
+    start_date,
+    end_date=None,
+    model_source=None,
+    use_forecast_files=None,
+    override=False,
+    session=None,
+):
+    """For NOAA OFS unaggregated models: Update `urlpath` locations in `Source`.
+
+    Coroutine version of ``mc.select_date_range()``; see there for details on the inputs and output. Each thredds catalog that is needed for days without fresh cached file locations is read once, and all of them at once.
+
+    Parameters
+    ----------
+    cat_or_source : Intake catalog or source
+        Catalog containing model_source sources, or single Source.
+    start_date: datetime-interpretable str or pd.Timestamp
+        Date (and possibly time) of start to desired model date range.
+    end_date: datetime-interpretable str, pd.Timestamp, or None; optional
+        Date (and possibly time) of end to desired model date range.
+    model_source: str, optional
+        Which model_source to use.
+    use_forecast_files : bool or None, optional
+        Only input `use_forecast_files=True` to read in a forecast from the past for a NOAA OFS model.
+    override : boolean, optional
+        Use `override=True` to find catrefs regardless of freshness, searching the whole catalog. Otherwise stale catrefs are updated by reading only the most recent and earliest parts of the catalog.
+    session : aiohttp.ClientSession, optional
+        Session from ``mc.async_session()`` to use.
+
+    Returns
+    -------
+    Intake Source
+        Intake `Source` associated with the catalog entry which now contains `source.metadata['start_date']` and `source.metadata['end_date']`, and updated `urlpath` for unaggregated NOAA OFS models.
+    """
+
+    _check_not_nested(cat_or_source)
+
+    (
+        start_date,
+        end_date,
+        start_date_sel,
+        end_date_sel,
+        end_date_loop,
+        use_forecast_files,
+    ) = _date_range_parameters(start_date, end_date, model_source, use_forecast_files)
+
+    async with _session_context(session) as session:
+
+        # if Catalog was input, determine which model_source to use to get to a source
+        if isinstance(cat_or_source, Catalog):
+
+            cat = cat_or_source
+
+            model_source, needs_availability = _check_model_source(cat, model_source)
+            if needs_availability:
+                warnings.warn(
+                    "`find_availability()` has not been run for this model — running now..."
+                )
+                cat = await afind_availability(cat, verbose=True, session=session)
+
+            model_source = _pick_model_source(
+                cat, model_source, start_date, end_date, use_forecast_files
+            )
+            source = cat[model_source]
+
+        # if Source input
+        elif isinstance(cat_or_source, (OpenDapSource, DatasetTransform)):
+
+            source = cat_or_source
+            model_source = source.name
+
+        # if server is not working, return input source with None for new metadata
+        if not await _source_status(source, session):
+            _warn_server_not_working(source)
+            return source
+
+        # catch the models that require aggregation
+        if "catloc" in source.metadata:
+
+            # check catalog
+            if not await astatus(source.metadata["catloc"], "", session=session):
+                _raise_catalog_not_working(source)
+
+            days = _aggregation_days(start_date, end_date_loop, use_forecast_files)
+            agg_filelocs = await _afind_agg_filelocs(
+                source, model_source, days, override, session
+            )
+            if agg_filelocs is None:
+                _warn_date_range_not_available(source)
+                return source
+
+            filelocs_urlpath = [
+                fileloc for day in days for fileloc in agg_filelocs[day]
+            ]
+            _update_source_urlpath(
+                source, filelocs_urlpath, start_date_sel, end_date_sel
+            )
+
+    _set_date_range(source, model_source, start_date_sel, end_date_sel)
+
+    return source
+
+
+async def _afind_agg_filelocs(source, model_source, days, override, session):
+    """Return aggregated file locations for each of days, or None if some of days are not in any catalog.
+
+    Coroutine version of ``mc.model_catalogs._find_agg_filelocs()``. The catalogs that need to be listed are all listed at once.
+    """
+
+    agg_filelocs = await _in_thread(
+        _known_agg_filelocs, source, model_source, days, override
+    )
+    if agg_filelocs is None:
+        return None
+    misses, start = len(days) - len(agg_filelocs), time.perf_counter()
+
+    catloc, filetype = source.metadata["catloc"], _filetype(source)
+    pattern = source.metadata.get("pattern")
+
+    # catalogs organized by day are listed once each, without finding the catrefs
+    if not override:
+        daily = await _in_thread(
+            _daily_catrefs,
+            source,
+            model_source,
+            [day for day in days if day not in agg_filelocs],
+        )
+        filelocs = await asyncio.gather(
+            *[
+                _afind_day_filelocs(catref, catloc, filetype, session)
+                for catref in daily.values()
+            ]
+        )
+        for day, day_filelocs in zip(daily, filelocs):
+            if day_filelocs is not None:
+                agg_filelocs.update(
+                    await _in_thread(
+                        _agg_for_days,
+                        source,
+                        model_source,
+                        [day],
+                        day_filelocs,
+                        filetype,
+                        pattern,
+                    )
+                )
+
+    missing = [day for day in days if day not in agg_filelocs]
+    if len(missing) > 0:
+        async with mc.cache.alock("file_locs", source.cat.name, model_source):
+            # another process may have found them while waiting for the lock
+            agg_filelocs.update(
+                await _in_thread(
+                    _fresh_agg_filelocs, source, model_source, missing, override
+                )
+            )
+            missing = [day for day in days if day not in agg_filelocs]
+            if len(missing) > 0:
+                catrefs = await _acatrefs(source, override, session)
+
+                plan = _plan_agg_filelocs(missing, catrefs)
+                if plan is None:
+                    await _in_thread(
+                        _save_no_catref, source, model_source, missing, catrefs
+                    )
+                    return None
+
+                # list each catalog once for all of its days, and all of them at once
+                filelocs = await asyncio.gather(
+                    *[
+                        afind_filelocs(catref, catloc, filetype, session=session)
+                        for catref in plan
+                    ]
+                )
+                for catref_days, catref_filelocs in zip(plan.values(), filelocs):
+                    agg_filelocs.update(
+                        await _in_thread(
+                            _agg_for_days,
+                            source,
+                            model_source,
+                            catref_days,
+                            catref_filelocs,
+                            filetype,
+                            pattern,
+                        )
+                    )
+
+    _record_agg_filelocs_misses(misses, time.perf_counter() - start)
+
+    return agg_filelocs
@@ -0,0 +1,1031 @@
+"""
+Store for information that is found about model sources so that it can be reused.
+
+Catrefs, start and end datetimes, and aggregated file locations of each day are saved as rows of one SQLite database at ``mc.CACHE_PATH_DB``, with values as JSON. Rows are keyed by category, model, model source, and a key such as the day, and remember when they were saved so they can be checked for freshness, and when they were last used so that the least recently used can be removed by ``cache_prune()``.
+
+Where rows are kept is set by ``mc.CACHE_BACKEND`` (see ``backend()``): the local database by default, a directory that several machines share, or an fsspec URL such as an object store, so that a fleet of workers finds information once. With a backend that is not local, compiled catalogs and boundaries are also saved to it with ``share()`` and written to the local directories with ``fetch()`` on other machines.
+
+Other files that are saved for the package, such as server statuses and boundaries, are written with ``dump()`` in the format of ``mc.CACHE_FORMAT`` and read with ``load()``, which also reads files saved as YAML by older versions. What is read is remembered in memory, up to ``mc.CACHE_MEMO_SIZE`` reads, and read again only once the file or database has changed. They are written with ``atomic_open()`` so they are never read partly written, and information that several processes might find at once is found by one of them while holding its ``lock()``.
+"""
+
+import abc
+import asyncio
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import fsspec
+import pandas as pd
+import yaml
+
+
+try:
+    import fcntl
+
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows
+    FCNTL_AVAILABLE = False
+
+try:
+    from yaml import CSafeDumper as YAMLDumper
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:  # PyYAML without libyaml
+    from yaml import SafeDumper as YAMLDumper
+    from yaml import SafeLoader as YAMLLoader
+
+import model_catalogs as mc
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    category TEXT NOT NULL,
+    model TEXT NOT NULL,
+    model_source TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    saved REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (category, model, model_source, key)
+) WITHOUT ROWID
+"""
+
+# categories of information saved by the package, where "missing" is information that was
+# recently looked for and not found, such as days without files or servers that are down
+CATEGORIES = ["catrefs", "start", "end", "file_locs", "file_template", "missing"]
+
+# one connection per thread, since sqlite connections can't be shared between threads
+_local = threading.local()
+
+# values read from files, by (path, inode, mtime_ns, size), as JSON text
+_FILES = OrderedDict()
+_FILES_LOCK = threading.Lock()
+
+# when rows read by this process were used, by (category, model, model_source, key), until
+# they are written with the next change to the database so that reading never writes
+_ACCESSED = {}
+_ACCESSED_LOCK = threading.Lock()
+
+
+def connection():
+    """Return connection to the cache database for the current thread.
+
+    The database is created if it doesn't exist yet, and the connection is opened again if ``mc.CACHE_PATH_DB`` changed.
+    """
+
+    path = mc.CACHE_PATH_DB
+    if getattr(_local, "path", None) != path:
+        if getattr(_local, "connection", None) is not None:
+            _local.connection.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(path, timeout=30)
+        # readers don't block the writer, and commits don't wait for the disk each time
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        # space of removed rows can be given back to the file system by cache_prune()
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        with con:
+            con.execute(SCHEMA)
+        _local.path, _local.connection = path, con
+        # rows read by this connection, by query, until the database changes
+        _local.rows, _local.version = OrderedDict(), None
+    return _local.connection
+
+
+def _remember(memo, key, value):
+    """Remember value for key in memo, forgetting the least recently used beyond ``mc.CACHE_MEMO_SIZE``."""
+
+    memo[key] = value
+    while len(memo) > mc.CACHE_MEMO_SIZE:
+        memo.popitem(last=False)
+
+
+def _json_dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _yaml_dumps(value):
+    return yaml.dump(value, Dumper=YAMLDumper, default_flow_style=False)
+
+
+def _yaml_loads(text):
+    return yaml.load(text, Loader=YAMLLoader)
+
+
+Codec = namedtuple("Codec", ["suffix", "dumps", "loads"])
+
+# formats that files can be saved in, by name for mc.CACHE_FORMAT. Rows of the database
+# are always JSON.
+CODECS = {
+    "json": Codec(".json", _json_dumps, json.loads),
+    "yaml": Codec(".yaml", _yaml_dumps, _yaml_loads),
+}
+
+
+def _encode(value):
+    return CODECS["json"].dumps(value)
+
+
+def _decode(value):
+    return CODECS["json"].loads(value)
+
+
+def suffix():
+    """Return suffix of files saved in the format of ``mc.CACHE_FORMAT``, e.g. ".json"."""
+
+    return CODECS[mc.CACHE_FORMAT].suffix
+
+
+def _codec(fname):
+    """Return codec for the suffix of fname."""
+
+    for codec in CODECS.values():
+        if fname.suffix == codec.suffix:
+            return codec
+    raise ValueError(f"No format for suffix of {fname}.")
+
+
+def find(fname):
+    """Return fname if it exists, or the file with its name saved in another format such as YAML, or None."""
+
+    fname = Path(fname)
+    fnames = [fname] + [
+        fname.with_suffix(codec.suffix)
+        for codec in CODECS.values()
+        if codec.suffix != fname.suffix
+    ]
+    for fname in fnames:
+        if fname.is_file():
+            return fname
+    return None
+
+
+def load(fname):
+    """Return value saved in fname, or in the file with its name saved in another format.
+
+    Parameters
+    ----------
+    fname : Path
+        File to read, usually with the suffix of ``mc.CACHE_FORMAT``. If it doesn't exist, the same file saved in another format (e.g. YAML by older versions) is read.
+
+    Returns
+    -------
+    object
+        Saved value.
+
+    Raises
+    ------
+    FileNotFoundError
+        If fname was not saved in any format.
+    ValueError
+        If the file can't be decoded.
+    """
+
+    found = find(fname)
+    if found is None:
+        raise FileNotFoundError(fname)
+    stat = found.stat()
+    key = (found, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    with _FILES_LOCK:
+        if key in _FILES:
+            _FILES.move_to_end(key)
+            return _decode(_FILES[key])
+
+    codec = _codec(found)
+    text = found.read_text()
+    try:
+        value = codec.loads(text)
+    except yaml.YAMLError as e:
+        raise ValueError(f"{found} could not be read.") from e
+
+    # remembered as JSON so that each read returns a new copy, decoded quickly
+    with _FILES_LOCK:
+        _remember(_FILES, key, text if codec is CODECS["json"] else _encode(value))
+    return value
+
+
+def dump(value, fname):
+    """Save value to fname in the format of its suffix, replacing it in one step with ``atomic_open()``."""
+
+    fname = Path(fname)
+    codec = _codec(fname)
+    text = codec.dumps(value)
+    with atomic_open(fname) as outfile:
+        outfile.write(text)
+
+    # remembered so that this process doesn't read it again
+    stat = fname.stat()
+    with _FILES_LOCK:
+        _remember(
+            _FILES,
+            (fname, stat.st_ino, stat.st_mtime_ns, stat.st_size),
+            text if codec is CODECS["json"] else _encode(value),
+        )
+
+
+class Backend(abc.ABC):
+    """Where rows of saved information are kept, set by ``mc.CACHE_BACKEND``.
+
+    Rows are values of a category, model, model_source, and key, as JSON text, with the time they were saved. Processes that use the same backend share what they found. Subclasses must implement ``get_range()``, ``put_many()``, ``delete()``, ``entries()``, and ``remove()``, and can be assigned to ``mc.CACHE_BACKEND`` as an instance.
+    """
+
+    @abc.abstractmethod
+    def get_range(self, category, model, model_source, first, last):
+        """Return (value, time saved) of the rows with keys from first to last, by key."""
+
+    @abc.abstractmethod
+    def put_many(self, category, model, model_source, values, saved):
+        """Save values by key, saved at time saved in seconds since the epoch, replacing the rows saved before."""
+
+    @abc.abstractmethod
+    def delete(self, category, model=None, model_source=None, key=None):
+        """Remove rows of category, only for model, model_source, and key if they are not None."""
+
+    @abc.abstractmethod
+    def entries(self):
+        """Return (category, model, model_source, key, size, last used) of all rows."""
+
+    @abc.abstractmethod
+    def remove(self, entries):
+        """Remove rows given as (category, model, model_source, key)."""
+
+    def lock_dir(self):
+        """Return directory of the files of ``lock()``, which lock out the processes that use it."""
+        return mc.CACHE_PATH_LOCKS
+
+    def prune(self, limits, now):
+        """Remove rows beyond limits for each category, as in ``cache_prune()``, and return how many for each."""
+
+        categories = {category: [] for category in CATEGORIES}
+        for category, *entry in self.entries():
+            categories.setdefault(category, []).append(tuple(entry))
+
+        removed = {}
+        for category, entries in categories.items():
+            evict = _evict(entries, limits, now)
+            self.remove([(category,) + entry[:3] for entry in evict])
+            removed[category] = len(evict)
+        return removed
+
+
+class LocalBackend(Backend):
+    """Rows kept in the SQLite database at ``mc.CACHE_PATH_DB``, the default.
+
+    Rows read are remembered in memory until the database changes, and the time each was last read is kept for ``cache_prune()``, to within ``mc.CACHE_LIMITS["access_interval"]``. Reading doesn't write to the database, which would make other processes read it again: the times rows were read are written with the next change of this process, or when it exits.
+    """
+
+    def _write_accessed(self, con):
+        """Write when rows read by this process were used, in the transaction of con."""
+
+        with _ACCESSED_LOCK:
+            accessed = list(_ACCESSED.items())
+            _ACCESSED.clear()
+        con.executemany(
+            "UPDATE entries SET accessed = ? WHERE category = ? AND model = ? AND model_source = ? AND key = ? AND accessed < ?",  # noqa: E501
+            [(used,) + row + (used,) for row, used in accessed],
+        )
+
+    def flush(self):
+        """Write when rows read by this process were used, if any were read."""
+
+        if len(_ACCESSED) > 0:
+            con = connection()
+            with con:
+                self._write_accessed(con)
+
+    def get_range(self, category, model, model_source, first, last):
+        where = (
+            "category = ? AND model = ? AND model_source = ? AND key BETWEEN ? AND ?"
+        )
+        parameters = (category, model, model_source, first, last)
+        con = connection()
+
+        # rows read before are used again until the database is changed, by another
+        # connection (data_version) or by this one (total_changes)
+        version = (con.execute("PRAGMA data_version").fetchone()[0], con.total_changes)
+        if version != _local.version:
+            _local.rows.clear()
+        if parameters in _local.rows:
+            _local.rows.move_to_end(parameters)
+            rows = _local.rows[parameters]
+        else:
+            # when rows were last used is only updated once they were not used for
+            # access_interval, and written later so that reading doesn't write
+            now = time.time()
+            used = (
+                now - pd.Timedelta(mc.CACHE_LIMITS["access_interval"]).total_seconds()
+            )
+            rows, stale = {}, []
+            for key, value, saved, accessed in con.execute(
+                f"SELECT key, value, saved, accessed FROM entries WHERE {where}",
+                parameters,
+            ):
+                rows[key] = (value, saved)
+                if accessed < used:
+                    stale.append((category, model, model_source, key))
+            with _ACCESSED_LOCK:
+                _ACCESSED.update(dict.fromkeys(stale, now))
+            _remember(_local.rows, parameters, rows)
+            version = (version[0], con.total_changes)
+        _local.version = version
+        return rows
+
+    def put_many(self, category, model, model_source, values, saved):
+        con = connection()
+        with con:
+            self._write_accessed(con)
+            con.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (category, model, model_source, key, value, saved, saved)
+                    for key, value in values.items()
+                ],
+            )
+
+    def delete(self, category, model=None, model_source=None, key=None):
+        columns = {"model": model, "model_source": model_source, "key": key}
+        where = " AND ".join(
+            ["category = ?"]
+            + [
+                f"{column} = ?"
+                for column, value in columns.items()
+                if value is not None
+            ]
+        )
+        parameters = [category] + [v for v in columns.values() if v is not None]
+        con = connection()
+        with con:
+            con.execute(f"DELETE FROM entries WHERE {where}", parameters)
+
+    def entries(self):
+        self.flush()
+        return (
+            connection()
+            .execute(
+                "SELECT category, model, model_source, key, length(value), accessed FROM entries"
+            )
+            .fetchall()
+        )
+
+    def remove(self, entries):
+        con = connection()
+        with con:
+            con.executemany(
+                "DELETE FROM entries WHERE category = ? AND model = ? AND model_source = ? AND key = ?",  # noqa: E501
+                entries,
+            )
+
+    def prune(self, limits, now):
+        removed = super().prune(limits, now)
+        connection().execute("PRAGMA incremental_vacuum").fetchall()
+        return removed
+
+
+@atexit.register
+def _write_accessed_at_exit():
+    """Write when rows read by this process were used, when it exits."""
+
+    with contextlib.suppress(sqlite3.Error):
+        LocalBackend().flush()
+
+
+class FsspecBackend(Backend):
+    """Rows kept as one file each under an fsspec URL, such as "s3://bucket/model_catalogs".
+
+    Each row is a file "rows/category/model/model_source/key.json" under the URL, with the time it was saved on the first line and the value after it, so that many machines can share what they found through an object store. Rows are read from the store every time, and the time a row was saved counts as when it was last used for ``cache_prune()``. Locks only apply to the processes of one machine, so two machines might find the same information at the same time.
+
+    Parameters
+    ----------
+    url : str
+        fsspec URL of the directory to keep rows in. Protocols other than "file" and "memory" need their fsspec implementation installed, e.g. ``s3fs`` for "s3://".
+    storage_options : dict, optional
+        Passed to the fsspec filesystem, e.g. credentials.
+    """
+
+    def __init__(self, url, **storage_options):
+        self.url = str(url)
+        self.fs, self.root = fsspec.core.url_to_fs(self.url, **storage_options)
+
+    @staticmethod
+    def _part(name):
+        """Return name escaped for a path, with "_" for an empty name."""
+        return quote(name, safe="") or "_"
+
+    @staticmethod
+    def _name(part):
+        """Return name of the escaped path part."""
+        return "" if part == "_" else unquote(part)
+
+    def _dir(self, *names):
+        return "/".join([self.root, "rows"] + [self._part(name) for name in names])
+
+    def _path(self, category, model, model_source, key):
+        return f"{self._dir(category, model, model_source)}/{self._part(key)}.json"
+
+    def _write(self, contents):
+        """Write contents, by path."""
+        self.fs.pipe(contents)
+
+    def get_range(self, category, model, model_source, first, last):
+        if first == last:
+            paths = [self._path(category, model, model_source, first)]
+        else:
+            try:
+                paths = self.fs.ls(
+                    self._dir(category, model, model_source), detail=False
+                )
+            except FileNotFoundError:
+                return {}
+            paths = [
+                path
+                for path in paths
+                if first <= self._name(path.rsplit("/", 1)[-1][: -len(".json")]) <= last
+            ]
+
+        try:
+            contents = self.fs.cat(paths, on_error="omit") if len(paths) > 0 else {}
+        except FileNotFoundError:
+            return {}
+
+        rows = {}
+        for path, content in contents.items():
+            saved, _, value = content.decode().partition("\n")
+            rows[self._name(path.rsplit("/", 1)[-1][: -len(".json")])] = (
+                value,
+                float(saved),
+            )
+        return rows
+
+    def put_many(self, category, model, model_source, values, saved):
+        self._write(
+            {
+                self._path(
+                    category, model, model_source, key
+                ): f"{saved!r}\n{value}".encode()
+                for key, value in values.items()
+            }
+        )
+
+    def delete(self, category, model=None, model_source=None, key=None):
+        parts = [
+            "*" if name is None else self._part(name)
+            for name in [category, model, model_source]
+        ]
+        pattern = "/".join([self.root, "rows"] + parts)
+        pattern += "/*.json" if key is None else f"/{self._part(key)}.json"
+        paths = self.fs.glob(pattern)
+        if len(paths) > 0:
+            self.fs.rm(paths)
+
+    def entries(self):
+        try:
+            infos = self.fs.find(f"{self.root}/rows", detail=True)
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        for path, info in infos.items():
+            *names, key = path.rsplit("/", 4)[-4:]
+            entries.append(
+                tuple(self._name(name) for name in names)
+                + (self._name(key[: -len(".json")]), info["size"], _modified(info))
+            )
+        return entries
+
+    def remove(self, entries):
+        paths = [self._path(*entry) for entry in entries]
+        if len(paths) > 0:
+            self.fs.rm(paths)
+
+
+class DirectoryBackend(FsspecBackend):
+    """Rows kept as one file each in a directory that several machines share, such as on NFS.
+
+    Rows are laid out as for ``FsspecBackend``, and written with ``atomic_path()`` so they are never read partly written. Since file locks work on most shared file systems, the files of ``lock()`` are kept in the "locks" directory of path so that information is found by one process of all of the machines at a time.
+
+    Parameters
+    ----------
+    path : str, Path
+        Shared directory to keep rows in.
+    """
+
+    def __init__(self, path):
+        super().__init__(Path(path).expanduser().absolute())
+
+    def _write(self, contents):
+        for path, content in contents.items():
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_path(path) as tmp:
+                tmp.write_bytes(content)
+
+    def lock_dir(self):
+        return Path(self.root) / "locks"
+
+
+def _modified(info):
+    """Return time in seconds since the epoch that a file was modified, from its fsspec info."""
+
+    for field in ["mtime", "LastModified", "updated", "created"]:
+        value = info.get(field)
+        if isinstance(value, (int, float)):
+            return float(value)
+        if value is not None:
+            return pd.Timestamp(value).timestamp()
+    return time.time()
+
+
+# backends by mc.CACHE_BACKEND, so that a setting is only set up once
+_backends = {}
+
+
+def backend():
+    """Return the backend where rows of saved information are kept, for ``mc.CACHE_BACKEND``.
+
+    None is a ``LocalBackend``, a path or "file://" URL a ``DirectoryBackend``, other URLs a ``FsspecBackend``, and a ``Backend`` instance is used as is.
+    """
+
+    setting = mc.CACHE_BACKEND
+    if isinstance(setting, Backend):
+        return setting
+    if setting not in _backends:
+        if setting is None:
+            _backends[setting] = LocalBackend()
+        elif fsspec.core.split_protocol(str(setting))[0] in (None, "file"):
+            _backends[setting] = DirectoryBackend(
+                fsspec.core.strip_protocol(str(setting))
+            )
+        else:
+            _backends[setting] = FsspecBackend(setting)
+    return _backends[setting]
+
+
+def share(kind, name, fname):
+    """Save file fname of kind, "compiled" or "boundaries", for model name in a backend that is not local, for ``fetch()`` by other machines.
+
+    Files are kept as rows of category "files". With a ``LocalBackend`` the files are already where other processes of this machine read them, so nothing is done.
+    """
+
+    if isinstance(backend(), LocalBackend):
+        return
+    fname = Path(fname)
+    put("files", kind, name, {"suffix": fname.suffix, "text": fname.read_text()})
+
+
+def fetch(kind, name, fname, mu=None):
+    """Write file of kind for model name saved with ``share()`` to fname, if there is one fresh for mu.
+
+    The file gets the suffix it was saved with and the modification time of when it was saved, so it is fresh locally for as long as it is in the backend.
+
+    Returns
+    -------
+    Path
+        File that was written, or None if there isn't one fresh in the backend or the backend is local.
+    """
+
+    if isinstance(backend(), LocalBackend):
+        return None
+    rows = backend().get_range("files", kind, name, "", "")
+    if "" not in rows or rows[""][1] <= _since(mu):
+        return None
+
+    value, saved = _decode(rows[""][0]), rows[""][1]
+    fname = Path(fname).with_suffix(value["suffix"])
+    fname.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_open(fname) as outfile:
+        outfile.write(value["text"])
+    os.utime(fname, (saved, saved))
+    return fname
+
+
+def _since(mu):
+    """Return time in seconds since the epoch after which rows are fresh for freshness parameter mu."""
+
+    if mu is None:
+        return float("-inf")
+    return time.time() - mc.utils._timedelta_ns(mu) / 1e9
+
+
+def get(category, model, model_source, key="", mu=None):
+    """Return value saved for category, model, model_source, and key, or None.
+
+    Parameters
+    ----------
+    category : str
+        Type of information, e.g. "catrefs" or "file_locs".
+    model, model_source : str
+        Names of catalog and source the information is about.
+    key : str, optional
+        Which of the category's values for the source, e.g. a day. Defaults to "".
+    mu : str, optional
+        pandas Timedelta-interpretable string for how long values are fresh. Values that were saved longer ago than that are not returned. Defaults to None, for values saved at any time.
+
+    Returns
+    -------
+    object
+        Saved value, or None if there isn't a fresh one.
+    """
+
+    return get_range(category, model, model_source, key, key, mu).get(key)
+
+
+def get_range(category, model, model_source, first, last, mu=None):
+    """Return values saved for category, model, and model_source with keys from first to last.
+
+    Keys are compared as strings, so this is one query on the index of the database for keys that sort by date.
+
+    Parameters
+    ----------
+    category : str
+        Type of information, e.g. "file_locs".
+    model, model_source : str
+        Names of catalog and source the information is about.
+    first, last : str
+        Smallest and largest keys to return, inclusive.
+    mu : str, optional
+        pandas Timedelta-interpretable string for how long values are fresh. Defaults to None, for values saved at any time.
+
+    Returns
+    -------
+    dict
+        Saved value for each key that has a fresh one.
+    """
+
+    rows = backend().get_range(category, model, model_source, first, last)
+    since = _since(mu)
+    return {
+        key: _decode(value) for key, (value, saved) in rows.items() if saved > since
+    }
+
+
+def put(category, model, model_source, value, key=""):
+    """Save value for category, model, model_source, and key, replacing any that was saved before."""
+
+    put_many(category, model, model_source, {key: value})
+
+
+def put_many(category, model, model_source, values):
+    """Save values of several keys for category, model, and model_source at once, in one transaction for the local database.
+
+    Parameters
+    ----------
+    values : dict
+        Value to save for each key.
+    """
+
+    saved = time.time()
+    backend().put_many(
+        category,
+        model,
+        model_source,
+        {key: _encode(value) for key, value in values.items()},
+        saved,
+    )
+    _prune_in_background(saved)
+
+
+def _prune_stamp():
+    """Return file whose modification time is when ``cache_prune()`` last ran, for all processes that use ``mc.CACHE_PATH_DB``."""
+
+    return mc.CACHE_PATH_DB.with_name(f"{mc.CACHE_PATH_DB.name}.pruned")
+
+
+def _last_pruned():
+    """Return when ``cache_prune()`` last ran in any process, in seconds since the epoch, or -inf if it never ran."""
+
+    try:
+        return _prune_stamp().stat().st_mtime
+    except FileNotFoundError:
+        return float("-inf")
+
+
+def _prune_due(now):
+    """Return whether ``cache_prune()`` last ran more than ``mc.CACHE_LIMITS["prune_interval"]`` before now, in any process."""
+
+    interval = mc.CACHE_LIMITS["prune_interval"]
+    return (
+        interval is not None
+        and now - _last_pruned() > pd.Timedelta(interval).total_seconds()
+    )
+
+
+def _prune_if_due():
+    """Run ``cache_prune()`` if it is due, unless another process or thread is pruning already.
+
+    Returns
+    -------
+    dict or None
+        Output of ``cache_prune()``, or None if it didn't run.
+    """
+
+    with lock("prune", blocking=False) as acquired:
+        # another process may have just pruned while this one checked
+        if acquired and _prune_due(time.time()):
+            return _prune()
+    return None
+
+
+# thread of this process that runs _prune_if_due() after information is saved
+_prune_thread = None
+_prune_thread_lock = threading.Lock()
+
+
+def _prune_in_background(now):
+    """Start ``_prune_if_due()`` in a separate thread if pruning is due, so that saving information doesn't wait for it."""
+
+    global _prune_thread
+
+    if not _prune_due(now):
+        return
+    with _prune_thread_lock:
+        if _prune_thread is None or not _prune_thread.is_alive():
+            _prune_thread = threading.Thread(
+                target=_prune_if_due, name="model_catalogs-prune", daemon=True
+            )
+            _prune_thread.start()
+
+
+def _finish_pruning():
+    """Wait for pruning in the background of this process, and then run ``_prune_if_due()``, for processes that are about to exit."""
+
+    thread = _prune_thread
+    if thread is not None:
+        thread.join()
+    return _prune_if_due()
+
+
+def delete(category, model=None, model_source=None, key=None):
+    """Remove values saved for category, only for model, model_source, and key if they are input."""
+
+    backend().delete(category, model, model_source, key)
+
+
+def _files():
+    """Return saved files of each category, as lists of (files, size, last used) for each entry.
+
+    The two files of a response saved in ``mc.CACHE_PATH_HTTP`` are one entry. Files are used when they are saved or read, as far as the access times of the file system tell.
+    """
+
+    categories = {
+        "compiled": mc.CACHE_PATH_COMPILED,
+        "http": mc.CACHE_PATH_HTTP,
+        "status": mc.CACHE_PATH_STATUS,
+    }
+    files = {}
+    for category, path in categories.items():
+        entries = {}
+        for fname in path.glob("*"):
+            try:
+                stat = fname.stat()
+            except FileNotFoundError:
+                continue
+            fnames, size, used = entries.get(fname.stem, ([], 0, 0.0))
+            entries[fname.stem] = (
+                fnames + [fname],
+                size + stat.st_size,
+                max(used, stat.st_atime, stat.st_mtime),
+            )
+        files[category] = list(entries.values())
+    return files
+
+
+def _evict(entries, limits, now):
+    """Return which of entries to remove for limits, given as (size, last used) after an identifier.
+
+    Entries not used for max_age are removed, then the least recently used ones beyond max_entries or max_size.
+    """
+
+    max_age = limits["max_age"]
+    oldest = (
+        float("-inf")
+        if max_age is None
+        else now - pd.Timedelta(max_age).total_seconds()
+    )
+    max_entries = limits["max_entries"]
+    max_size = limits["max_size"]
+
+    evict = []
+    count, total = 0, 0
+    for entry in sorted(entries, key=lambda entry: entry[-1], reverse=True):
+        size, used = entry[-2:]
+        count, total = count + 1, total + size
+        if (
+            used < oldest
+            or (max_entries is not None and count > max_entries)
+            or (max_size is not None and total > max_size)
+        ):
+            evict.append(entry)
+            count, total = count - 1, total - size
+    return evict
+
+
+def cache_prune(limits=None):
+    """Remove saved information beyond the limits for each category.
+
+    Rows of ``backend()`` are limited by category (e.g. "file_locs"), and the files in ``mc.CACHE_PATH_COMPILED``, ``mc.CACHE_PATH_HTTP``, and ``mc.CACHE_PATH_STATUS`` as categories "compiled", "http", and "status". Anything not used for "max_age" is removed, then the least recently used until there are at most "max_entries" taking at most "max_size" bytes. One process at a time prunes. This also runs automatically in a separate thread after information is saved, and at the end of ``mc.warm_cache()``, at most once per ``mc.CACHE_LIMITS["prune_interval"]`` for all processes, since when it last ran is saved next to ``mc.CACHE_PATH_DB``. Automatic pruning is skipped while another process is pruning.
+
+    Parameters
+    ----------
+    limits : dict, optional
+        Limits to use instead of those in ``mc.CACHE_LIMITS``, with the same keys. Keys that are not given are taken from ``mc.CACHE_LIMITS``.
+
+    Returns
+    -------
+    dict
+        Number of entries removed for each category.
+    """
+
+    with lock("prune"):
+        return _prune(limits)
+
+
+def _prune(limits=None):
+    """Remove saved information beyond limits, as ``cache_prune()`` while holding its lock."""
+
+    limits = {**mc.CACHE_LIMITS, **(limits or {})}
+    now = time.time()
+    # saved first, so that other processes don't also start pruning
+    stamp = _prune_stamp()
+    stamp.parent.mkdir(parents=True, exist_ok=True)
+    stamp.touch()
+    os.utime(stamp, (now, now))
+
+    removed = backend().prune(limits, now)
+
+    for category, entries in _files().items():
+        evict = _evict(entries, limits, now)
+        for fnames, _, _ in evict:
+            for fname in fnames:
+                fname.unlink(missing_ok=True)
+        removed[category] = len(evict)
+
+    return removed
+
+
+def cache_info():
+    """Return summary of saved information for each category.
+
+    Returns
+    -------
+    dict
+        For each category, the number of "entries", their "size" in bytes, and when the least and most recently used ones were last used as "oldest" and "newest" UTC Timestamps (None if there are no entries). Categories are those of ``cache_prune()``.
+    """
+
+    def summary(entries):
+        used = [entry[-1] for entry in entries]
+        return {
+            "entries": len(entries),
+            "size": sum(entry[-2] for entry in entries),
+            "oldest": pd.Timestamp(min(used), unit="s", tz="UTC") if used else None,
+            "newest": pd.Timestamp(max(used), unit="s", tz="UTC") if used else None,
+        }
+
+    categories = {category: [] for category in CATEGORIES}
+    for category, *_, size, used in backend().entries():
+        categories.setdefault(category, []).append((size, used))
+
+    info = {category: summary(entries) for category, entries in categories.items()}
+    info.update({category: summary(entries) for category, entries in _files().items()})
+    return info
+
+
+@contextlib.contextmanager
+def atomic_path(fname):
+    """Yield a temporary path to write to instead of fname, which then replaces fname.
+
+    fname is only replaced if no error is raised, in one step, so that other processes and threads read either the old or the new file and never a partly written one.
+    """
+
+    fname = Path(fname)
+    tmp = fname.with_name(f".{fname.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, fname)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+@contextlib.contextmanager
+def atomic_open(fname, mode="w"):
+    """Open a file to write to that replaces fname once it is closed without error, as in ``atomic_path()``."""
+
+    with atomic_path(fname) as tmp:
+        with open(tmp, mode) as outfile:
+            yield outfile
+
+
+# locks of this process by name, for when fcntl is not available
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def lock(category, model="", model_source="", blocking=True):
+    """Hold the lock of category, model, and model_source, waiting while another process or thread holds it.
+
+    This is used so that information that is not saved yet is found by one process, while the others wait and then read it. Locks are advisory ``fcntl.flock`` locks on files in the ``lock_dir()`` of the backend, ``mc.CACHE_PATH_LOCKS`` unless the backend is a shared directory. Where fcntl is not available (Windows), only the threads of the current process are locked out. Whether the lock was acquired is yielded, which is always True unless `blocking` is False, in which case the lock is not waited for.
+    """
+
+    name = f"{category}_{model}_{model_source}"
+    if not FCNTL_AVAILABLE:
+        with _thread_locks_lock:
+            thread_lock = _thread_locks.setdefault(name, threading.Lock())
+        if not thread_lock.acquire(blocking=blocking):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            thread_lock.release()
+        return
+
+    path = backend().lock_dir()
+    path.mkdir(parents=True, exist_ok=True)
+    fname = path / f"{hashlib.sha1(name.encode()).hexdigest()}.lock"
+    with open(fname, "a") as stream:
+        try:
+            fcntl.flock(
+                stream, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            )
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(stream, fcntl.LOCK_UN)
+
+
+# locks of each event loop by name, so that one coroutine at a time waits for a lock in a thread
+_async_locks = weakref.WeakKeyDictionary()
+
+
+@contextlib.asynccontextmanager
+async def alock(category, model="", model_source=""):
+    """Coroutine version of ``lock()``, which waits for and releases the lock in a separate thread, since its files might be on a shared file system.
+
+    Coroutines of the same event loop first wait for each other without a thread, so that at most one thread of the executor per lock is waiting for another process, and the coroutine holding the lock can still run in the others.
+    """
+
+    loop = asyncio.get_running_loop()
+    name = f"{category}_{model}_{model_source}"
+    async with _async_locks.setdefault(loop, {}).setdefault(name, asyncio.Lock()):
+        async with _alock(loop, category, model, model_source):
+            yield
+
+
+@contextlib.asynccontextmanager
+async def _alock(loop, category, model, model_source):
+    """Hold ``lock()`` of category, model, and model_source, waiting for and releasing it in a thread of loop's executor."""
+
+    stack = contextlib.ExitStack()
+    acquired = loop.run_in_executor(
+        None, stack.enter_context, lock(category, model, model_source)
+    )
+    try:
+        await asyncio.shield(acquired)
+    except asyncio.CancelledError:
+        # release the lock once it is acquired
+        acquired.add_done_callback(lambda _: stack.close())
+        raise
+    try:
+        yield
+    finally:
+        await loop.run_in_executor(None, stack.close)
+
+
+def compute_once(key, read, compute):
+    """Return saved information, or compute it in one process at a time.
+
+    Parameters
+    ----------
+    key : tuple
+        Category, model, and model_source of the information, for ``lock()``.
+    read : function
+        Returns the saved information, or None if it needs to be computed.
+    compute : function
+        Computes, saves, and returns the information.
+
+    Returns
+    -------
+    object
+        Output of read if it isn't None, otherwise of compute. Processes that wait for the lock of key while another computes the information read it after all.
+    """
+
+    value = read()
+    if value is None:
+        with lock(*key):
+            value = read()
+            if value is None:
+                value = compute()
+    return value
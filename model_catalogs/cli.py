@@ -0,0 +1,99 @@
+"""
+Command line interface, installed as ``model-catalogs``.
+"""
+
+import argparse
+import sys
+
+import model_catalogs as mc
+
+
+def warm(args):
+    """Run ``mc.warm_cache()`` for command line arguments, print its summary, and return the exit code."""
+
+    summary = mc.warm_cache(
+        locs=args.locs if len(args.locs) > 1 else args.locs[0],
+        models=args.models,
+        model_sources=args.model_sources,
+        days=args.days,
+        override=not args.no_override,
+        max_workers=args.max_workers,
+        boundaries=not args.no_boundaries,
+        verbose=args.verbose,
+    )
+
+    print(summary.to_string())
+    failed = int((summary["status"] == "failed").sum())
+    print(
+        f"{len(summary) - failed} of {len(summary)} sources refreshed, {failed} failed."
+    )
+
+    if args.metrics is not None:
+        mc.metrics_prometheus(args.metrics)
+
+    return 1 if failed > 0 else 0
+
+
+def main(argv=None):
+    """Run the ``model-catalogs`` command with argv, and return its exit code."""
+
+    parser = argparse.ArgumentParser(
+        prog="model-catalogs", description="Catalogs for known models."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_warm = subparsers.add_parser(
+        "warm",
+        help="refresh saved information for models",
+        description="Refresh compiled catalogs, boundaries, catrefs, start/end datetimes, and the file locations of the last days of models, for example from cron. Exits with status 1 if any source failed.",  # noqa: E501
+    )
+    parser_warm.add_argument(
+        "--locs",
+        nargs="+",
+        default=["mc_"],
+        help="catalog prefixes or files, as for mc.setup() (default: mc_)",
+    )
+    parser_warm.add_argument(
+        "--models", nargs="+", help="models to refresh (default: all)"
+    )
+    parser_warm.add_argument(
+        "--model-sources", nargs="+", help="model sources to refresh (default: all)"
+    )
+    parser_warm.add_argument(
+        "--days",
+        type=int,
+        default=1,
+        help="number of last days to find file locations for (default: 1)",
+    )
+    parser_warm.add_argument(
+        "--max-workers",
+        type=int,
+        default=4,
+        help="maximum number of sources to refresh at once (default: 4)",
+    )
+    parser_warm.add_argument(
+        "--no-override",
+        action="store_true",
+        help="only refresh information that is not fresh",
+    )
+    parser_warm.add_argument(
+        "--no-boundaries",
+        action="store_true",
+        help="don't calculate missing boundaries",
+    )
+    parser_warm.add_argument(
+        "--verbose", action="store_true", help="print each source when refreshed"
+    )
+    parser_warm.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="save mc.metrics() of the run to FILE in the Prometheus text format",
+    )
+    parser_warm.set_defaults(function=warm)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
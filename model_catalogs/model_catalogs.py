@@ -2,17 +2,19 @@
 Everything dealing with the catalogs.
 """
 
+import time
 import warnings
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path, PurePath
 
 import cf_xarray  # noqa
 import intake
 import intake.source.derived
+import numpy as np
 import pandas as pd
 import requests
-import yaml
 
 from datetimerange import DateTimeRange
 from dateutil.parser import parse
@@ -118,7 +120,8 @@ def make_catalog(
 
     # save catalog
     if save_catalog:
-        cat.save(cat_path.with_suffix(".yaml"))
+        with mc.cache.atomic_path(cat_path.with_suffix(".yaml")) as tmp:
+            cat.save(str(tmp))
 
     if return_cat:
         return cat
@@ -161,19 +164,24 @@ def open_catalog(
         cat_orig = intake.open_catalog(cat_loc)
 
     if boundaries:
-        if mc.FILE_PATH_BOUNDARIES(cat_orig.name.lower()).is_file() and not override:
+        fname = mc.FILE_PATH_BOUNDARIES(cat_orig.name.lower())
+        if not override and (
+            mc.cache.find(fname) is not None
+            or mc.cache.fetch("boundaries", cat_orig.name.lower(), fname) is not None
+        ):
             # add previously-saved boundary info
             # this was calculated with mc.calculate_boundaries()
-            with open(mc.FILE_PATH_BOUNDARIES(cat_orig.name.lower()), "r") as stream:
-                boundary = yaml.safe_load(stream)
+            boundary = mc.cache.load(fname)
+            mc.utils._record_cache("boundaries", hits=1)
         else:
             boundary = mc.calculate_boundaries(
                 cat_orig, save_files=save_boundaries, return_boundaries=True
-            )[cat_orig.name]
+            ).get(cat_orig.name)
 
-        # add to cat_orig metadata
-        cat_orig.metadata["bounding_box"] = boundary["bbox"]
-        cat_orig.metadata["geospatial_bounds"] = boundary["wkt"]
+        # add to cat_orig metadata, unless no server was working to calculate them
+        if boundary is not None:
+            cat_orig.metadata["bounding_box"] = boundary["bbox"]
+            cat_orig.metadata["geospatial_bounds"] = boundary["wkt"]
 
     # get transform of each original catalog file, which points to
     # original file but applies metadata from original catalog file
@@ -277,6 +285,30 @@ def setup(locs="mc_", override=False, boundaries=True):
         # now cats is a list of Catalog(s)
         initial_cats.extend(cats)
 
+    # calculate any missing boundaries for all catalogs together so that server
+    # status can be checked for all of their sources at once
+    def missing_boundaries():
+        return [
+            cat
+            for cat in initial_cats
+            if (override or not mc.is_fresh(mc.FILE_PATH_COMPILED(cat.name)))
+            and mc.cache.find(mc.FILE_PATH_BOUNDARIES(cat.name.lower())) is None
+            # they may have been calculated on another machine that shares the backend
+            and mc.cache.fetch(
+                "boundaries",
+                cat.name.lower(),
+                mc.FILE_PATH_BOUNDARIES(cat.name.lower()),
+            )
+            is None
+        ]
+
+    if boundaries and len(missing_boundaries()) > 0:
+        with mc.cache.lock("boundaries"):
+            # another process may have calculated them while waiting for the lock
+            cats_boundaries = missing_boundaries()
+            if len(cats_boundaries) > 0:
+                mc.calculate_boundaries(cats_boundaries, save_files=True)
+
     cat_transform_locs = []
     for cat in list(initial_cats):
 
@@ -288,15 +320,34 @@ def setup(locs="mc_", override=False, boundaries=True):
         # re-compile together catalog file if user wants to override possibly
         # existing file or if is not fresh
         if override or not mc.is_fresh(mc.FILE_PATH_COMPILED(name)):
-            # override for open_catalog is about calculating boundaries
-            open_catalog(
-                cat,
-                return_cat=False,
-                save_catalog=True,
-                boundaries=boundaries,
-                save_boundaries=True,
-                override=False,
-            )
+            with mc.cache.lock("compiled", name):
+                # another process may have compiled it while waiting for the lock, or
+                # another machine that shares the backend
+                if override or not (
+                    mc.is_fresh(mc.FILE_PATH_COMPILED(name))
+                    or mc.cache.fetch(
+                        "compiled",
+                        name,
+                        mc.FILE_PATH_COMPILED(name),
+                        mc.FRESH["compiled"],
+                    )
+                    is not None
+                ):
+                    # override for open_catalog is about calculating boundaries
+                    with mc.utils._timed_cache("compiled"):
+                        open_catalog(
+                            cat,
+                            return_cat=False,
+                            save_catalog=True,
+                            boundaries=boundaries,
+                            save_boundaries=True,
+                            override=False,
+                        )
+                    mc.cache.share("compiled", name, mc.FILE_PATH_COMPILED(name))
+                else:
+                    mc.utils._record_cache("compiled", hits=1)
+        else:
+            mc.utils._record_cache("compiled", hits=1)
         cat_transform_locs.append(mc.FILE_PATH_COMPILED(name))
 
     # have to read these from disk in order to make them type
@@ -337,7 +388,7 @@ def find_datetimes(source, find_start_datetime, find_end_datetime, override=Fals
     find_end_datetime : bool
         True to calculate end_datetime, otherwise returns None
     override : boolean, optional
-        Use `override=True` to find catrefs regardless of freshness. This is passed in from
+        Use `override=True` to find catrefs regardless of freshness, searching the whole catalog. Otherwise stale catrefs are updated by reading only the most recent and earliest parts of the catalog. This is passed in from
         ``find_availability()`` so has the same value as input there.
 
     Returns
@@ -346,6 +397,8 @@ def find_datetimes(source, find_start_datetime, find_end_datetime, override=Fals
         Contains 'start_datetime' and 'end_datetime' where each are strings or can be None if they didn't need to be found.
     """
 
+    start = time.perf_counter()
+
     # For any model/model_source pairs with static links or known file address,
     # which is all non-OFS models and OFS models that are already aggregated
     if "catloc" not in source.metadata:
@@ -362,55 +415,26 @@ def find_datetimes(source, find_start_datetime, find_end_datetime, override=Fals
     # for when we need to aggregate which is for model_source: ncei-archive-noagg and coops-forecast-noagg
     else:
 
-        if "filetype" not in source.cat.metadata:
-            raise KeyError(
-                "If your model requires aggregation, it also requires `filetype` in the catalog-level metadata."
-            )
-        else:
-            filetype = source.cat.metadata["filetype"]
+        filetype = _filetype(source)
 
-        if not override and mc.is_fresh(
-            mc.FILE_PATH_CATREFS(source.cat.name, source.name), source
-        ):
-            with open(
-                mc.FILE_PATH_CATREFS(source.cat.name, source.name), "r"
-            ) as stream:
-                catrefs = yaml.safe_load(stream)["catrefs"]
-        else:
-            catrefs = mc.find_catrefs(source.metadata["catloc"])
-            catrefs = sorted(catrefs)  # earliest first, most recent last
-            with open(
-                mc.FILE_PATH_CATREFS(source.cat.name, source.name), "w"
-            ) as outfile:
-                yaml.dump({"catrefs": catrefs}, outfile, default_flow_style=False)
+        catrefs = _find_catrefs(source, override)
 
         if find_start_datetime:
             # Getting start date #
             # first make sure the dates actually have model files available
-            filelocs = []
-            i = 0
-            while len(filelocs) == 0:
-                # print(catrefs[i])
-                filelocs = sorted(
-                    mc.find_filelocs(
-                        catrefs[i], source.metadata["catloc"], filetype=filetype
+            search = _search_first_populated(len(catrefs))
+            filelocs = {}
+            try:
+                i = next(search)
+                while True:
+                    filelocs[i] = sorted(
+                        mc.find_filelocs(
+                            catrefs[i], source.metadata["catloc"], filetype=filetype
+                        )
                     )
-                )
-                i += 1
-
-            # second make sure we only count when dates are consecutive, since servers tend to have some
-            # spotty model output at the earliest dates get dates from file names
-            df = mc.filedates2df(filelocs)
-
-            # which differences in consecutive dates are over 1 day
-            ddf = pd.Series(df.index).diff() > pd.Timedelta("1 day")
-            if ddf.any():
-                # first date after last jump in dates is desired start day
-                start_datetime = str(df.index.where(ddf).dropna()[-1])
-
-            # all dates were fine, so just use earliest fileloc
-            else:
-                start_datetime = str(df.index[0])
+                    i = search.send(len(filelocs[i]) > 0)
+            except StopIteration as stop:
+                start_datetime = _start_datetime(filelocs.get(stop.value, []))
         else:
             start_datetime = None
 
@@ -419,24 +443,204 @@ def find_datetimes(source, find_start_datetime, find_end_datetime, override=Fals
             filelocs = mc.find_filelocs(
                 catrefs[-1], source.metadata["catloc"], filetype=filetype
             )
-            df = mc.filedates2df(filelocs)
-            end_datetime = str(df.index[-1])
+            end_datetime = _end_datetime(filelocs)
         else:
             end_datetime = None
 
-    # save start/end to files
-    if find_start_datetime:
-        with open(mc.FILE_PATH_START(source.cat.name, source.name), "w") as outfile:
-            yaml.dump(
-                {"start_datetime": start_datetime}, outfile, default_flow_style=False
-            )
-    if find_end_datetime:
-        with open(mc.FILE_PATH_END(source.cat.name, source.name), "w") as outfile:
-            yaml.dump({"end_datetime": end_datetime}, outfile, default_flow_style=False)
+    _save_datetimes(source, start_datetime, end_datetime)
+    _record_datetimes_misses(
+        find_start_datetime, find_end_datetime, time.perf_counter() - start
+    )
 
     return start_datetime, end_datetime
 
 
+def _record_datetimes_misses(find_start_datetime, find_end_datetime, seconds):
+    """Count start/end datetimes that were found again for ``mc.metrics()``, which took seconds together."""
+
+    for parameter, found in [
+        ("start", find_start_datetime),
+        ("end", find_end_datetime),
+    ]:
+        if found:
+            mc.utils._record_cache(parameter, misses=1, seconds=seconds)
+
+
+def _record_datetimes_hits(start_datetime, end_datetime):
+    """Count saved start/end datetimes that were fresh for ``mc.metrics()``."""
+
+    mc.utils._record_cache("start", hits=start_datetime is not None)
+    mc.utils._record_cache("end", hits=end_datetime is not None)
+
+
+def _filetype(source):
+    """Return filetype for source that requires aggregation."""
+
+    if "filetype" not in source.cat.metadata:
+        raise KeyError(
+            "If your model requires aggregation, it also requires `filetype` in the catalog-level metadata."
+        )
+    return source.cat.metadata["filetype"]
+
+
+def _load_catrefs(source, mu=None):
+    """Return catrefs saved for source that are fresh for freshness parameter mu, or None if there aren't any."""
+
+    catrefs = mc.cache.get("catrefs", source.cat.name, source.name, mu=mu)
+    if catrefs is None:
+        return None
+    return [tuple(catref) for catref in catrefs]
+
+
+def _read_catrefs(source, override=False):
+    """Return previously-found catrefs for source if fresh, otherwise None."""
+
+    if override:
+        return None
+    catrefs = _load_catrefs(source, mc.utils.fresh_parameter("catrefs", source))
+    mc.utils._record_cache("catrefs", hits=catrefs is not None)
+    return catrefs
+
+
+def _previous_catrefs(source, override=False):
+    """Return previously-found catrefs for source to update, or None for finding them all.
+
+    Stale catrefs are updated instead of searching the whole catalog, unless `override` is True.
+    """
+
+    return None if override else _load_catrefs(source)
+
+
+def _save_catrefs(source, catrefs):
+    """Sort and save catrefs for source, and return them."""
+
+    catrefs = sorted(catrefs)  # earliest first, most recent last
+    mc.cache.put(
+        "catrefs",
+        source.cat.name,
+        source.name,
+        [list(catref) for catref in catrefs],
+    )
+    return catrefs
+
+
+def _find_catrefs(source, override=False):
+    """Return catrefs for source, read if fresh, otherwise updated or found from its catalog and saved.
+
+    Only one process at a time finds the catrefs of a source, and the others wait for them to be saved and then read them.
+    """
+
+    def find():
+        with mc.utils._timed_cache("catrefs"):
+            return _save_catrefs(
+                source,
+                mc.find_catrefs(
+                    source.metadata["catloc"],
+                    catrefs=_previous_catrefs(source, override),
+                ),
+            )
+
+    return mc.cache.compute_once(
+        ("catrefs", source.cat.name, source.name),
+        lambda: _read_catrefs(source, override),
+        find,
+    )
+
+
+def _search_first_populated(n):
+    """Search for the first of n catrefs that has model output files.
+
+    Catrefs are checked at indices 0, 1, 3, 7, ... until one has files, then the first one with files is found by bisection between that and the last one without. This assumes that catrefs without files come before those with files, as for an archive with an empty beginning. Spotty catrefs before a later one with files might be skipped, but their dates would come before a gap in dates that ``_start_datetime()`` skips anyway.
+
+    This is a generator so that the catrefs can be checked synchronously or asynchronously: it yields the index of the next catref to check, is sent whether that catref has files, and returns the index of the first catref with files or None if there isn't one.
+    """
+
+    empty = -1  # largest index known to not have files
+    populated = None  # smallest index known to have files
+    step = 1
+    i = 0
+    while i < n:
+        if (yield i):
+            populated = i
+            break
+        empty, i, step = i, i + step, step * 2
+
+    if populated is None:
+        if empty == n - 1 or not (yield n - 1):
+            return None
+        populated = n - 1
+
+    while populated - empty > 1:
+        middle = (empty + populated) // 2
+        if (yield middle):
+            populated = middle
+        else:
+            empty = middle
+
+    return populated
+
+
+def _start_datetime(filelocs):
+    """Return start datetime from the earliest file locations with model output, or None if there aren't any."""
+
+    if len(filelocs) == 0:
+        return None
+
+    # make sure we only count when dates are consecutive, since servers tend to have some
+    # spotty model output at the earliest dates get dates from file names
+    index = mc.FileDates(filelocs).index
+
+    # which differences in consecutive dates are over 1 day
+    jumps = np.flatnonzero(np.diff(index) > pd.Timedelta("1 day"))
+    if len(jumps) > 0:
+        # first date after last jump in dates is desired start day
+        return str(index[jumps[-1] + 1])
+
+    # all dates were fine, so just use earliest fileloc
+    return str(index[0])
+
+
+def _end_datetime(filelocs):
+    """Return end datetime from the most recent file locations."""
+
+    return str(mc.FileDates(filelocs).index[-1])
+
+
+def _save_datetimes(source, start_datetime, end_datetime):
+    """Save start/end datetimes for source, for those that are not None."""
+
+    for parameter, value in [("start", start_datetime), ("end", end_datetime)]:
+        if value is not None:
+            mc.cache.put(parameter, source.cat.name, source.name, value)
+
+
+def _read_datetimes(source, override=False):
+    """Return previously-found start/end datetimes for source, with None for any that are not fresh."""
+
+    # check if already know the times and they are not stale
+    if override:
+        return None, None
+    return tuple(
+        mc.cache.get(
+            parameter,
+            source.cat.name,
+            source.name,
+            mu=mc.utils.fresh_parameter(parameter, source),
+        )
+        for parameter in ["start", "end"]
+    )
+
+
+def _warn_server_not_working(source):
+    """Warn that the server for source is not working, and if its circuit breaker is open."""
+
+    urlpath = mc.astype(source.urlpath, list)[0]
+    message = f"Server for source {source.cat.name}, {source.name}, is not working. Urlpath checked was {urlpath}."
+    if mc.circuit_open(urlpath):
+        message += f" The circuit breaker for this server is open after repeated failures, so requests to it fail fast for {mc.HTTP['circuit_cooldown']}."
+    warnings.warn(message, RuntimeWarning)
+
+
 def find_availability_source(source, override=False):
     """Find availabililty for source specifically.
 
@@ -456,45 +660,30 @@ def find_availability_source(source, override=False):
     # if server is not working, return input source with None for new metadata
     if not source.status:
         # raise RuntimeError(f"Server for source {source.cat.name}, {source.name}, is not working. Urlpath checked was {mc.astype(source.urlpath, list)[0]}.")
-        warnings.warn(
-            f"Server for source {source.cat.name}, {source.name}, is not working. Urlpath checked was {mc.astype(source.urlpath, list)[0]}.",
-            RuntimeWarning,
-        )
+        _warn_server_not_working(source)
         start_datetime, end_datetime = None, None
 
     else:
 
-        # check if start and end datetime files already exist and are new enough to use
-        # check if already know the time and not stale
-        # file times are given in UTC
-        # If files are not stale, read in info from there
-        if not override and mc.is_fresh(
-            mc.FILE_PATH_START(source.cat.name, source.name), source
-        ):
-            with open(mc.FILE_PATH_START(source.cat.name, source.name), "r") as stream:
-                start_datetime = yaml.safe_load(stream)["start_datetime"]
-            find_start_datetime = False
-        else:
-            find_start_datetime = True  # need to still find the start_datetime
-
-        if not override and mc.is_fresh(
-            mc.FILE_PATH_END(source.cat.name, source.name), source
-        ):
-            with open(mc.FILE_PATH_END(source.cat.name, source.name), "r") as stream:
-                end_datetime = yaml.safe_load(stream)["end_datetime"]
-            find_end_datetime = False
-        else:
-            find_end_datetime = True  # need to still find the end_datetime
-
-        # start and end temp could be None, depending on values of
-        # find_start_datetime, find_end_datetime
-        if find_start_datetime or find_end_datetime:
-            start_temp, end_temp = find_datetimes(
-                source, find_start_datetime, find_end_datetime, override=override
-            )
-
-        start_datetime = start_temp if find_start_datetime else start_datetime
-        end_datetime = end_temp if find_end_datetime else end_datetime
+        start_datetime, end_datetime = _read_datetimes(source, override)
+        _record_datetimes_hits(start_datetime, end_datetime)
+
+        # start and end temp could be None, depending on which need to be found
+        if start_datetime is None or end_datetime is None:
+            with mc.cache.lock("datetimes", source.cat.name, source.name):
+                # another process may have found them while waiting for the lock
+                start_datetime, end_datetime = _read_datetimes(source, override)
+                if start_datetime is None or end_datetime is None:
+                    start_temp, end_temp = find_datetimes(
+                        source,
+                        start_datetime is None,
+                        end_datetime is None,
+                        override=override,
+                    )
+                    start_datetime = (
+                        start_temp if start_datetime is None else start_datetime
+                    )
+                    end_datetime = end_temp if end_datetime is None else end_datetime
 
     source.metadata["start_datetime"] = start_datetime
     source.metadata["end_datetime"] = end_datetime
@@ -502,6 +691,48 @@ def find_availability_source(source, override=False):
     return source
 
 
+def _check_not_nested(cat_or_source):
+    """Raise error if a nested catalog was input instead of a model catalog or source."""
+
+    # Check in case user input main_catalog which is not correct
+    # if both the input obj and the items one layer down, contained in obj, are both catalogs, then
+    # a nested catalog was input which is not correct
+    if isinstance(cat_or_source, Catalog) and isinstance(
+        cat_or_source[list(cat_or_source)[0]], Catalog
+    ):
+        raise ValueError(
+            "A nested catalog was input, but should be either a catalog that contains sources instead of catalogs, or a source. For example, try `main_cat['CBOFS']` or `main_cat['CBOFS']['coops-forecast-agg']`."
+        )
+
+
+def _catalog_with_availability(cat, sources):
+    """Make new catalog from sources to remember their new availability metadata."""
+
+    return mc.make_catalog(
+        sources,
+        full_cat_name=cat.name,
+        full_cat_description=cat.description,
+        full_cat_metadata=cat.metadata,
+        cat_driver=[source._entry._driver for source in list(sources)],
+        cat_path=None,
+        save_catalog=False,
+    )
+
+
+def _source_with_availability(source_in, source):
+    """Make new catalog to remember the new availability metadata of source, then extract source."""
+
+    return mc.make_catalog(
+        [source],
+        full_cat_name=source_in.cat.name,
+        full_cat_description=source_in.cat.description,
+        full_cat_metadata=source_in.cat.metadata,
+        cat_driver=source_in._entry._driver,
+        cat_path=None,
+        save_catalog=False,
+    )[source.name]
+
+
 def find_availability(cat_or_source, model_source=None, override=False, verbose=False):
     """Find availability for Catalog or Source.
 
@@ -541,15 +772,7 @@ def find_availability(cat_or_source, model_source=None, override=False, verbose=
     coops-forecast-noagg: 2022-08-22 13:00:00 to  2022-09-25 12:00:00
     """
 
-    # Check in case user input main_catalog which is not correct
-    # if both the input obj and the items one layer down, contained in obj, are both catalogs, then
-    # a nested catalog was input which is not correct
-    if isinstance(cat_or_source, Catalog) and isinstance(
-        cat_or_source[list(cat_or_source)[0]], Catalog
-    ):
-        raise ValueError(
-            "A nested catalog was input, but should be either a catalog that contains sources instead of catalogs, or a source. For example, try `main_cat['CBOFS']` or `main_cat['CBOFS']['coops-forecast-agg']`."
-        )
+    _check_not_nested(cat_or_source)
 
     # if Catalog was input
     if isinstance(cat_or_source, Catalog):
@@ -559,13 +782,17 @@ def find_availability(cat_or_source, model_source=None, override=False, verbose=
             if model_source is None
             else mc.astype(model_source, list)
         )
+
+        # check server status for all sources at once before looping over them
+        mc.status_many([cat_or_source[model_source] for model_source in model_sources])
+
         sources = []
         for model_source in model_sources:
             try:
                 source = find_availability_source(
                     source=cat_or_source[model_source], override=override
                 )
-            except requests.exceptions.HTTPError:
+            except requests.exceptions.RequestException:
                 print(f"Found a server error with {model_source}")
                 source = cat_or_source[model_source]
             # source = find_availability_source(
@@ -577,18 +804,7 @@ def find_availability(cat_or_source, model_source=None, override=False, verbose=
                     f"{source.name}: {source.metadata['start_datetime']} to {source.metadata['end_datetime']}"
                 )
 
-        # Make new catalog to remember the new metadata
-        new_user_cat = mc.make_catalog(
-            sources,
-            full_cat_name=cat_or_source.name,
-            full_cat_description=cat_or_source.description,
-            full_cat_metadata=cat_or_source.metadata,
-            cat_driver=[source._entry._driver for source in list(sources)],
-            cat_path=None,
-            save_catalog=False,
-        )
-
-        return new_user_cat
+        return _catalog_with_availability(cat_or_source, sources)
 
     # if Source input
     elif isinstance(cat_or_source, (OpenDapSource, DatasetTransform)):
@@ -604,18 +820,7 @@ def find_availability(cat_or_source, model_source=None, override=False, verbose=
                 f"{source.name}: {source.metadata['start_datetime']} to  {source.metadata['end_datetime']}"
             )
 
-        # Make new catalog to remember the new metadata, then extract source immediately
-        out_source = mc.make_catalog(
-            [source],
-            full_cat_name=cat_or_source.cat.name,
-            full_cat_description=cat_or_source.cat.description,
-            full_cat_metadata=cat_or_source.cat.metadata,
-            cat_driver=cat_or_source._entry._driver,
-            cat_path=None,
-            save_catalog=False,
-        )[source.name]
-
-        return out_source
+        return _source_with_availability(cat_or_source, source)
 
     else:
         raise ValueError(
@@ -671,7 +876,7 @@ def select_date_range(
 
     For other models, set up so that `start_date` and `end_date` are used to filter resulting Dataset in time. For all models, save `start_date` and `end_date` in the `Source` metadata.
 
-    NOAA OFS model sources that require aggregation (currently for model_sources "coops-forecast-noagg" and "ncei-archive-noagg") need to have the specific file paths found for each file that will be read in. This function does that, based on the desired date range, and returns a `Source` with file locations in the `urlpath`. This function can also be used with any model that does not require this (because the model paths are either static or deterministic) but in those cases it does not need to be used; they will have the start and end dates applied to filter the resulting model output after ``to_dask()`` is called.
+    NOAA OFS model sources that require aggregation (currently for model_sources "coops-forecast-noagg" and "ncei-archive-noagg") need to have the specific file paths found for each file that will be read in. This function does that, based on the desired date range, and returns a `Source` with file locations in the `urlpath`. For catalogs organized by day, the catalog of each day is listed directly, without first searching the catalog for its catrefs. This function can also be used with any model that does not require this (because the model paths are either static or deterministic) but in those cases it does not need to be used; they will have the start and end dates applied to filter the resulting model output after ``to_dask()`` is called.
 
     Parameters
     ----------
@@ -693,7 +898,7 @@ def select_date_range(
     use_forecast_files : bool or None, optional
         This parameter is typically set by the code and is not used by the user. However, in one use case the user can input `use_forecast_files=True`: when they want to read in a forecast from the past for a NOAA OFS model. Otherwise do not use this parameter directly.
     override : boolean, optional
-        Use `override=True` to find catrefs regardless of freshness.
+        Use `override=True` to find catrefs regardless of freshness, searching the whole catalog. Otherwise stale catrefs are updated by reading only the most recent and earliest parts of the catalog.
 
     Returns
     -------
@@ -715,15 +920,144 @@ def select_date_range(
 
     """
 
-    # Check in case user input main_catalog which is not correct
-    # if both the input obj and the items one layer down, contained in obj, are both catalogs, then
-    # a nested catalog was input which is not correct
-    if isinstance(cat_or_source, Catalog) and isinstance(
-        cat_or_source[list(cat_or_source)[0]], Catalog
-    ):
-        raise ValueError(
-            "A nested catalog was input, but should be either a catalog that contains sources instead of catalogs, or a source. For example, try `main_cat['CBOFS']` or `main_cat['CBOFS']['coops-forecast-agg']`."
+    _check_not_nested(cat_or_source)
+
+    (
+        start_date,
+        end_date,
+        start_date_sel,
+        end_date_sel,
+        end_date_loop,
+        use_forecast_files,
+    ) = _date_range_parameters(start_date, end_date, model_source, use_forecast_files)
+
+    # if Catalog was input, determine which model_source to use to get to a source
+    if isinstance(cat_or_source, Catalog):
+
+        cat = cat_or_source
+
+        model_source, needs_availability = _check_model_source(cat, model_source)
+        if needs_availability:
+            warnings.warn(
+                "`find_availability()` has not been run for this model — running now..."
+            )
+            cat = mc.find_availability(cat, verbose=True)
+            # raise KeyError(
+            #     "Run `mc.find_availability()` for this model before running this command. Otherwise input model_source that contains desired date range."  # noqa: E501
+            # )
+
+        model_source = _pick_model_source(
+            cat, model_source, start_date, end_date, use_forecast_files
         )
+        source = cat[model_source]
+
+    # if Source input
+    elif isinstance(cat_or_source, (OpenDapSource, DatasetTransform)):
+
+        source = cat_or_source
+        model_source = source.name
+
+    # if server is not working, return input source with None for new metadata
+    if not source.status:
+        # raise RuntimeError(f"Server for source {source.cat.name}, {source.name}, is not working. Urlpath checked was {mc.astype(source.urlpath, list)[0]}.")
+        _warn_server_not_working(source)
+        return source
+
+    # catch the models that require aggregation
+    if "catloc" in source.metadata:
+
+        # check catalog
+        if not mc.status(source.metadata["catloc"], ""):
+            _raise_catalog_not_working(source)
+
+        days = _aggregation_days(start_date, end_date_loop, use_forecast_files)
+        agg_filelocs = _find_agg_filelocs(source, model_source, days, override)
+        if agg_filelocs is None:
+            _warn_date_range_not_available(source)
+            return source
+
+        filelocs_urlpath = [fileloc for day in days for fileloc in agg_filelocs[day]]
+        _update_source_urlpath(source, filelocs_urlpath, start_date_sel, end_date_sel)
+
+    _set_date_range(source, model_source, start_date_sel, end_date_sel)
+
+    return source
+
+
+def _find_agg_filelocs(source, model_source, days, override=False):
+    """Return aggregated file locations for each of days, read if fresh, otherwise listed from the catalogs of source and saved.
+
+    The catalog of each day is listed directly for catalogs organized by day, and otherwise the catrefs of source are found to plan which catalogs to list.
+
+    Returns
+    -------
+    dict
+        Aggregated file locations for each (date, is_forecast) day, or None if some of days are not in any catalog.
+    """
+
+    agg_filelocs = _known_agg_filelocs(source, model_source, days, override)
+    if agg_filelocs is None:
+        return None
+    misses, start = len(days) - len(agg_filelocs), time.perf_counter()
+
+    catloc, filetype = source.metadata["catloc"], _filetype(source)
+    pattern = source.metadata.get("pattern")
+
+    # catalogs organized by day are listed once each, without finding the catrefs
+    if not override:
+        unknown = [day for day in days if day not in agg_filelocs]
+        for day, catref in _daily_catrefs(source, model_source, unknown).items():
+            filelocs = _find_day_filelocs(catref, catloc, filetype)
+            if filelocs is not None:
+                agg_filelocs.update(
+                    _agg_for_days(
+                        source, model_source, [day], filelocs, filetype, pattern
+                    )
+                )
+
+    missing = [day for day in days if day not in agg_filelocs]
+    if len(missing) > 0:
+        with mc.cache.lock("file_locs", source.cat.name, model_source):
+            # another process may have found them while waiting for the lock
+            agg_filelocs.update(
+                _fresh_agg_filelocs(source, model_source, missing, override)
+            )
+            missing = [day for day in days if day not in agg_filelocs]
+            if len(missing) > 0:
+                catrefs = _find_catrefs(source, override)
+
+                plan = _plan_agg_filelocs(missing, catrefs)
+                if plan is None:
+                    _save_no_catref(source, model_source, missing, catrefs)
+                    return None
+
+                # list each catalog once for all of its days
+                for catref, catref_days in plan.items():
+                    filelocs = mc.find_filelocs(catref, catloc, filetype)
+                    agg_filelocs.update(
+                        _agg_for_days(
+                            source,
+                            model_source,
+                            catref_days,
+                            filelocs,
+                            filetype,
+                            pattern,
+                        )
+                    )
+
+    _record_agg_filelocs_misses(misses, time.perf_counter() - start)
+
+    return agg_filelocs
+
+
+def _date_range_parameters(start_date, end_date, model_source, use_forecast_files):
+    """Check and interpret user inputs to `select_date_range()`.
+
+    Returns
+    -------
+    tuple
+        `start_date` and `end_date` as Timestamps (or None for `end_date`), `start_date_sel` and `end_date_sel` to select times from the resulting Dataset, `end_date_loop` which is the last day to aggregate files for, and `use_forecast_files`.
+    """
 
     # save these to determine if user input dates with times or not
     start_date_input, end_date_input = start_date, end_date
@@ -802,187 +1136,385 @@ def select_date_range(
         end_date_loop = end_date
         use_forecast_files = True
 
-    # if Catalog was input, determine which model_source to use to get to a source
-    if isinstance(cat_or_source, Catalog):
+    return (
+        start_date,
+        end_date,
+        start_date_sel,
+        end_date_sel,
+        end_date_loop,
+        use_forecast_files,
+    )
 
-        cat = cat_or_source
 
-        # if there is only one model_source, use it
-        if model_source is None and len(list(cat)) == 1:
-            model_source = list(cat)[0]
+def _check_model_source(cat, model_source):
+    """Check input model_source against Catalog.
 
-        # is model_source was input, make sure it is in the Catalog
-        if model_source is not None and model_source not in list(cat):
-            raise KeyError(
-                f"User input model_source {model_source} but it is not a source in catalog {cat.name}."  # noqa: E501
-            )
+    Returns
+    -------
+    tuple
+        model_source, which is filled in if cat only has one, and whether `find_availability()` needs to be run on cat to choose a model_source.
+    """
 
-        elif model_source is None and any(
-            [
-                "start_datetime" not in cat[model_source].metadata
-                or "end_datetime" not in cat[model_source].metadata
-                for model_source in list(cat)
-            ]
-        ):
-            warnings.warn(
-                "`find_availability()` has not been run for this model — running now..."
-            )
-            cat = mc.find_availability(cat, verbose=True)
-            # raise KeyError(
-            #     "Run `mc.find_availability()` for this model before running this command. Otherwise input model_source that contains desired date range."  # noqa: E501
-            # )
+    # if there is only one model_source, use it
+    if model_source is None and len(list(cat)) == 1:
+        model_source = list(cat)[0]
 
-        # which source to use from catalog for desired date range
-        if model_source is None:
-            user_range = DateTimeRange(start_date, end_date)
+    # is model_source was input, make sure it is in the Catalog
+    if model_source is not None and model_source not in list(cat):
+        raise KeyError(
+            f"User input model_source {model_source} but it is not a source in catalog {cat.name}."  # noqa: E501
+        )
 
-            for model_source in list(cat):
-                model_source_range = DateTimeRange(
-                    cat[model_source].metadata["start_datetime"],
-                    cat[model_source].metadata["end_datetime"],
-                )
-                try:  # use this model_source if it is in the date range
-                    if user_range in model_source_range:
-                        break
-                except TypeError:
-                    continue
-            else:
-                raise ValueError(
-                    "date range does not fully fit into any model model_sources"
-                )
+    needs_availability = model_source is None and any(
+        [
+            "start_datetime" not in cat[model_source].metadata
+            or "end_datetime" not in cat[model_source].metadata
+            for model_source in list(cat)
+        ]
+    )
 
-        if use_forecast_files and model_source == "ncei-archive-noagg":
-            raise KeyError(
-                "model_source 'ncei-archive-noagg' does not have forecast files, so `use_forecast_files` should be False."
-            )
+    return model_source, needs_availability
 
-        source = cat[model_source]
 
-    # if Source input
-    elif isinstance(cat_or_source, (OpenDapSource, DatasetTransform)):
+def _pick_model_source(cat, model_source, start_date, end_date, use_forecast_files):
+    """Return model_source in cat to use for desired date range."""
 
-        source = cat_or_source
-        model_source = source.name
+    # which source to use from catalog for desired date range
+    if model_source is None:
+        user_range = DateTimeRange(start_date, end_date)
 
-    # if server is not working, return input source with None for new metadata
-    if not source.status:
-        # raise RuntimeError(f"Server for source {source.cat.name}, {source.name}, is not working. Urlpath checked was {mc.astype(source.urlpath, list)[0]}.")
-        warnings.warn(
-            f"Server for source {source.cat.name}, {source.name}, is not working. Urlpath checked was {mc.astype(source.urlpath, list)[0]}.",
-            RuntimeWarning,
+        for model_source in list(cat):
+            model_source_range = DateTimeRange(
+                cat[model_source].metadata["start_datetime"],
+                cat[model_source].metadata["end_datetime"],
+            )
+            try:  # use this model_source if it is in the date range
+                if user_range in model_source_range:
+                    break
+            except TypeError:
+                continue
+        else:
+            raise ValueError(
+                "date range does not fully fit into any model model_sources"
+            )
+
+    if use_forecast_files and model_source == "ncei-archive-noagg":
+        raise KeyError(
+            "model_source 'ncei-archive-noagg' does not have forecast files, so `use_forecast_files` should be False."
         )
-        return source
 
-    # catch the models that require aggregation
-    if "catloc" in source.metadata:
-        pattern = source.metadata["pattern"] if "pattern" in source.metadata else None
+    return model_source
 
-        # check catalog
-        if not mc.status(source.metadata["catloc"], suffix=""):
-            raise RuntimeError(
-                f"Catalog {source.metadata['catloc']} for source {source.cat.name}, {source.name}, is not working."
-            )
-            # warnings.warn(
-            #     f"Catalog {source.metadata['catloc']} for source {source.cat.name}, {source.name}, is not working.",
-            #     RuntimeWarning,
-            # )
-            # return None
 
-        if not override and mc.is_fresh(
-            mc.FILE_PATH_CATREFS(source.cat.name, source.name), source
-        ):
-            with open(
-                mc.FILE_PATH_CATREFS(source.cat.name, source.name), "r"
-            ) as stream:
-                catrefs = yaml.safe_load(stream)["catrefs"]
-        else:
-            try:
-                catrefs = mc.find_catrefs(source.metadata["catloc"])
-            except Exception as e:
-                print(e)
-            catrefs = sorted(catrefs)  # earliest first, most recent last
-            with open(
-                mc.FILE_PATH_CATREFS(source.cat.name, source.name), "w"
-            ) as outfile:
-                yaml.dump({"catrefs": catrefs}, outfile, default_flow_style=False)
-
-        # loop over dates
-        filelocs_urlpath = []
+def _raise_catalog_not_working(source):
+    """Raise error for source whose thredds catalog is not working."""
+
+    raise RuntimeError(
+        f"Catalog {source.metadata['catloc']} for source {source.cat.name}, {source.name}, is not working."
+    )
+    # warnings.warn(
+    #     f"Catalog {source.metadata['catloc']} for source {source.cat.name}, {source.name}, is not working.",
+    #     RuntimeWarning,
+    # )
+    # return None
+
+
+def _warn_date_range_not_available(source):
+    """Warn that the date range requested is not available for source."""
+
+    warnings.warn(
+        f"Probably the time range requested is not available for model {source.cat.name}, model_source {source.name}. Returning source now.",
+        RuntimeWarning,
+    )
+
+
+def _aggregation_days(start_date, end_date_loop, use_forecast_files):
+    """Return list of (date, is_forecast) to aggregate files for."""
+
+    return [
+        (
+            date,
+            True
+            if date.date() == end_date_loop.date() and use_forecast_files
+            else False,
+        )
         for date in pd.date_range(
             start=start_date.normalize(), end=end_date_loop, freq="1D"
-        ):
-            is_forecast = (
-                True
-                if date.date() == end_date_loop.date() and use_forecast_files
-                else False
-            )
+        )
+    ]
 
-            fname = mc.FILE_PATH_AGG_FILE_LOCS(
-                source.cat.name, model_source, date, is_forecast
-            )
 
-            if not override and mc.is_fresh(fname, source):
-                with open(fname, "r") as stream:
-                    agg_filelocs = yaml.safe_load(stream)["agg_filelocs"]
-
-            else:
-                # translate date to catrefs to select which catref to use
-                if len(catrefs[0]) == 3:
-                    cat_ref_to_match = (
-                        date.strftime("%Y"),
-                        date.strftime("%m"),
-                        date.strftime("%d"),
-                    )
-                elif len(catrefs[0]) == 2:
-                    cat_ref_to_match = (date.strftime("%Y"), date.strftime("%m"))
+def _catref_for_date(date, catrefs):
+    """Return catref in catrefs that contains date, or None if there isn't one."""
 
-                if cat_ref_to_match in catrefs:
-                    ind = catrefs.index(cat_ref_to_match)
-                else:
-                    warnings.warn(
-                        f"Probably the time range requested is not available for model {source.cat.name}, model_source {source.name}. Returning source now.",
-                        RuntimeWarning,
-                    )
-                    return source
+    # translate date to catrefs to select which catref to use
+    if len(catrefs[0]) == 3:
+        cat_ref_to_match = (
+            date.strftime("%Y"),
+            date.strftime("%m"),
+            date.strftime("%d"),
+        )
+    elif len(catrefs[0]) == 2:
+        cat_ref_to_match = (date.strftime("%Y"), date.strftime("%m"))
 
-                filelocs = mc.find_filelocs(
-                    catrefs[ind],
-                    source.metadata["catloc"],
-                    source.cat.metadata["filetype"],
-                )
+    if cat_ref_to_match in catrefs:
+        return catrefs[catrefs.index(cat_ref_to_match)]
+    return None
 
-                agg_filelocs = mc.agg_for_date(
-                    date,
-                    filelocs,
-                    source.cat.metadata["filetype"],
-                    is_forecast,
-                    pattern,
-                )
 
-                with open(fname, "w") as outfile:
-                    yaml.dump(
-                        {"agg_filelocs": agg_filelocs},
-                        outfile,
-                        default_flow_style=False,
-                    )
+def _day_key(date, is_forecast):
+    """Return key of aggregated file locations for date in ``mc.cache``, which sorts by date."""
+
+    return f"{date:%Y-%m-%d}_is-forecast_{is_forecast}"
+
+
+def _saved_days(category, source, model_source, days):
+    """Return values of category saved for each of days that are fresh, read with one range query from the first to the last of days."""
+
+    if len(days) == 0:
+        return {}
+
+    saved = mc.cache.get_range(
+        category,
+        source.cat.name,
+        model_source,
+        _day_key(days[0][0], False),
+        _day_key(days[-1][0], True),
+        mu=mc.utils.fresh_parameter(category, source),
+    )
+    return {day: saved[_day_key(*day)] for day in days if _day_key(*day) in saved}
+
+
+def _fresh_agg_filelocs(source, model_source, days, override=False):
+    """Return previously-found aggregated file locations for each of days that are fresh.
+
+    Days that were recently found to have no files, within ``mc.FRESH["missing"]``, have no file locations.
+    """
+
+    if override:
+        return {}
+
+    agg_filelocs = _saved_days("file_locs", source, model_source, days)
+    unknown = [day for day in days if day not in agg_filelocs]
+    for day, reason in _missing_days(source, model_source, unknown).items():
+        if reason == "no files":
+            agg_filelocs[day] = []
+    return agg_filelocs
+
+
+def _known_agg_filelocs(source, model_source, days, override=False):
+    """Return fresh aggregated file locations for days, as ``_fresh_agg_filelocs()``, or None if some of the others were recently found to not be in any catalog."""
+
+    agg_filelocs = _fresh_agg_filelocs(source, model_source, days, override)
+    mc.utils._record_cache("file_locs", hits=len(agg_filelocs))
+
+    # days recently found to not be in any catalog are not looked for again
+    unknown = [day for day in days if day not in agg_filelocs]
+    if "no catref" in _missing_days(source, model_source, unknown, override).values():
+        return None
+    return agg_filelocs
+
+
+def _record_agg_filelocs_misses(misses, seconds):
+    """Count days whose aggregated file locations were found again for ``mc.metrics()``, which took seconds together."""
+
+    if misses > 0:
+        mc.utils._record_cache("file_locs", misses=misses, seconds=seconds)
+
+
+def _missing_days(source, model_source, days, override=False):
+    """Return why each of days recently had no aggregated file locations, for those within ``mc.FRESH["missing"]``.
 
-            filelocs_urlpath.extend(agg_filelocs)
+    The reason is "no catref" for days that are not in any catalog, and "no files" for days without files in their catalog.
+    """
+
+    if override:
+        return {}
+    return _saved_days("missing", source, model_source, days)
+
+
+def _save_missing_days(source, model_source, days, reason):
+    """Save that days have no aggregated file locations for reason, see ``_missing_days()``."""
+
+    if len(days) > 0:
+        mc.cache.put_many(
+            "missing",
+            source.cat.name,
+            model_source,
+            {_day_key(*day): reason for day in days},
+        )
+
+
+def _plan_agg_filelocs(days, catrefs):
+    """Plan which catalogs to list to find aggregated file locations for days.
+
+    Returns
+    -------
+    dict
+        Each catref that needs to be listed to the days it contains, in order. None if a day is not in any catref.
+    """
+
+    plan = {}
+    for day in days:
+        catref = _catref_for_date(day[0], catrefs)
+        if catref is None:
+            return None
+        plan.setdefault(catref, []).append(day)
 
-        # df is sorted and deduplicated
-        df = mc.filedates2df(filelocs_urlpath)
+    return plan
 
-        # Narrow the files used to the actual requested datetime range
-        files_to_use = df[start_date_sel:end_date_sel]
 
-        # get only unique files and change to list
-        files_to_use = list(pd.unique(files_to_use["filenames"]))
+def _save_no_catref(source, model_source, days, catrefs):
+    """Save which of days are not in any of catrefs as missing."""
 
-        # This is how we input the newly found urlpaths in so they will be used
-        # in the processing of the dataset, and overwrite the old urlpath
-        source._captured_init_kwargs["transform_kwargs"]["urlpath"] = files_to_use
+    _save_missing_days(
+        source,
+        model_source,
+        [day for day in days if _catref_for_date(day[0], catrefs) is None],
+        "no catref",
+    )
+
+
+def _agg_for_days(source, model_source, days, filelocs, filetype, pattern=None):
+    """Select and save aggregated file locations for several days from one catalog listing.
+
+    The file locations are parsed once with the compiled file pattern, and then the files of each day are selected as in ``mc.agg_for_date()``.
+
+    Returns
+    -------
+    dict
+        Aggregated file locations for each (date, is_forecast) day.
+    """
+
+    file_pattern = mc.utils.file_pattern(filetype, pattern)
+    table = file_pattern.parse(filelocs)
+
+    agg_filelocs = {day: file_pattern.select(table, *day) for day in days}
+    _save_agg_filelocs(source, model_source, agg_filelocs)
+
+    # the latest nowcast day is the template that shows how catalogs are organized
+    nowcast_days = [day for day in days if not day[1]]
+    if len(nowcast_days) > 0:
+        _save_file_template(
+            source, model_source, nowcast_days[-1][0], agg_filelocs[nowcast_days[-1]]
+        )
 
-        # Then run the transform for urlpath to pass that info on
-        source.update_urlpath()
+    return agg_filelocs
+
+
+def _file_template(filelocs, date):
+    """Return file locations of date as templates for other dates, or None if they can't be.
+
+    The date in the file names and the year, month, and day directories of the file locations are replaced by ``str.format`` fields of `date`, e.g. "{date:%Y%m%d}".
+    """
+
+    name_date = date.strftime("%Y%m%d")
+    dirs = [
+        (date.strftime("/%Y/%m/%d/"), "/{date:%Y}/{date:%m}/{date:%d}/"),
+        (date.strftime("/%Y/%m/"), "/{date:%Y}/{date:%m}/"),
+    ]
+
+    templates = []
+    for fileloc in filelocs:
+        path, name = fileloc.replace("{", "{{").replace("}", "}}").rsplit("/", 1)
+        path += "/"
+        for old, new in dirs:
+            if path.endswith(old):
+                path = path[: -len(old)] + new
+                break
+        else:
+            return None
+        if name.count(name_date) != 1:
+            return None
+        templates.append(path + name.replace(name_date, "{date:%Y%m%d}"))
+
+    return templates
+
+
+def _read_file_template(source, model_source):
+    """Return template of nowcast file locations for a day of source, or None if there isn't one."""
+
+    return mc.cache.get("file_template", source.cat.name, model_source)
+
+
+def _save_file_template(source, model_source, date, filelocs):
+    """Save nowcast file locations of date as the template for other days of source.
+
+    A template with fewer files than the saved one is not saved, so that a day with missing files does not become the template.
+    """
+
+    templates = _file_template(filelocs, date)
+    previous = _read_file_template(source, model_source)
+    if not templates or (previous is not None and len(templates) < len(previous)):
+        return
+
+    mc.cache.put("file_template", source.cat.name, model_source, templates)
+
+
+def _daily_catrefs(source, model_source, days):
+    """Return the catref of each of days for sources whose catalogs are organized by day, from their dates.
+
+    The file template of source shows whether its catalogs are organized by day, in which case the catalog of a day can be listed without finding the catrefs of source first. Otherwise listing one catalog finds the files of many days, so no catrefs are returned.
+    """
+
+    templates = _read_file_template(source, model_source)
+    if templates is None or not all(
+        "/{date:%d}/" in template for template in templates
+    ):
+        return {}
+
+    return {day: tuple(day[0].strftime("%Y %m %d").split()) for day in days}
+
+
+def _find_day_filelocs(catref, catloc, filetype):
+    """Return file locations of the catalog of one day, or None if it is not found."""
+
+    try:
+        return mc.find_filelocs(catref, catloc, filetype)
+    except (KeyError, requests.exceptions.RequestException):
+        return None
+
+
+def _save_agg_filelocs(source, model_source, agg_filelocs):
+    """Save aggregated file locations for each (date, is_forecast) day, in one transaction.
+
+    Days without files are saved as missing instead, so that they are looked for again after ``mc.FRESH["missing"]``.
+    """
+
+    mc.cache.put_many(
+        "file_locs",
+        source.cat.name,
+        model_source,
+        {
+            _day_key(*day): filelocs
+            for day, filelocs in agg_filelocs.items()
+            if len(filelocs) > 0
+        },
+    )
+    _save_missing_days(
+        source,
+        model_source,
+        [day for day, filelocs in agg_filelocs.items() if len(filelocs) == 0],
+        "no files",
+    )
+
+
+def _update_source_urlpath(source, filelocs_urlpath, start_date_sel, end_date_sel):
+    """Update source urlpath with the file locations in the selected date range."""
+
+    # Narrow the files used to the actual requested datetime range, each file once
+    files_to_use = mc.FileDates(filelocs_urlpath).select(start_date_sel, end_date_sel)
+
+    # This is how we input the newly found urlpaths in so they will be used
+    # in the processing of the dataset, and overwrite the old urlpath
+    source._captured_init_kwargs["transform_kwargs"]["urlpath"] = files_to_use
+
+    # Then run the transform for urlpath to pass that info on
+    source.update_urlpath()
+
+
+def _set_date_range(source, model_source, start_date_sel, end_date_sel):
+    """Save selected date range to source."""
 
     # Pass start and end dates to the transform so they can be implemented
     # there for static and deterministic model files (includes RTOFS) as well
@@ -1000,4 +1532,133 @@ def select_date_range(
     # Add original overall model catalog metadata to this next version
     source.metadata.update(source.cat.metadata)
 
-    return source
+
+def warm_cache(
+    locs="mc_",
+    models=None,
+    model_sources=None,
+    days=1,
+    override=True,
+    max_workers=4,
+    boundaries=True,
+    verbose=False,
+):
+    """Refresh saved information for models so that later calls don't need to find it.
+
+    Compiled catalogs and any missing boundaries are refreshed with ``setup()``. Then for each model source, catrefs and start/end datetimes are refreshed with ``find_availability()``, and for sources that require aggregation, the file locations of the last `days` days with ``select_date_range()``. Sources are refreshed in parallel, at most `max_workers` at a time. Afterward, saved information is pruned with ``mc.cache_prune()`` if it is due. This is also run from the command line with ``model-catalogs warm``, for example from cron.
+
+    Parameters
+    ----------
+    locs : str, Path, list, optional
+        Catalogs to set up, as for ``setup()``.
+    models : str, list of strings, optional
+        Models to refresh, e.g. "CBOFS". Defaults to all models of the catalogs.
+    model_sources : str, list of strings, optional
+        Model sources to refresh, e.g. "coops-forecast-noagg". Defaults to all model sources of each model.
+    days : int, optional
+        Number of days up to the `end_datetime` of each source, or up to today for sources with an `end_datetime` in the future such as forecasts, to find file locations for. Use 0 to not find file locations. Defaults to 1.
+    override : boolean, optional
+        Use `override=True` (default) to refresh information regardless of freshness. Otherwise only information that is not fresh is found.
+    max_workers : int, optional
+        Maximum number of sources to refresh at once. Defaults to 4.
+    boundaries : boolean, optional
+        If True, calculate boundaries that are missing, as in ``setup()``.
+    verbose : boolean, optional
+        If True, print each source when it has been refreshed.
+
+    Returns
+    -------
+    DataFrame
+        Summary indexed by model and model_source: "status" is "ok" or "failed", which includes sources for which no file locations were found for the last days, with the `start_datetime` and `end_datetime` found, the number of "file_locs" found for the last days, the "seconds" it took, and the "error" of sources that failed.
+
+    Examples
+    --------
+
+    Refresh availability and the file locations of the last 2 days of the sources of CBOFS:
+
+    >>> summary = mc.warm_cache(models="CBOFS", days=2)
+    """
+
+    main_cat = setup(locs, override=override, boundaries=boundaries)
+    models = list(main_cat) if models is None else mc.astype(models, list)
+    model_sources = None if model_sources is None else mc.astype(model_sources, list)
+
+    sources = {
+        (model, model_source): main_cat[model][model_source]
+        for model in models
+        for model_source in list(main_cat[model])
+        if model_sources is None or model_source in model_sources
+    }
+
+    # check server status for all sources at once
+    mc.status_many(list(sources.values()))
+
+    def warm(key):
+        source = sources[key]
+        start = time.perf_counter()
+        row = {
+            "model": key[0],
+            "model_source": key[1],
+            "status": "ok",
+            "start_datetime": None,
+            "end_datetime": None,
+            "file_locs": None,
+            "seconds": None,
+            "error": None,
+        }
+        try:
+            source = find_availability(source, override=override)
+            row["start_datetime"] = source.metadata["start_datetime"]
+            row["end_datetime"] = source.metadata["end_datetime"]
+            if row["end_datetime"] is None:
+                raise RuntimeError(
+                    "Availability was not found, the server may not be working."
+                )
+
+            if "catloc" in source.metadata and days > 0:
+                # forecasts end in the future, where there are no files to find yet
+                end_date = min(pd.Timestamp(row["end_datetime"]), pd.Timestamp.today())
+                source = select_date_range(
+                    source,
+                    start_date=end_date.normalize() - pd.Timedelta(days - 1, "D"),
+                    end_date=end_date,
+                    override=override,
+                )
+                # the source is returned without a selected date range if the days
+                # are not available
+                if "start_date" in source.metadata:
+                    row["file_locs"] = len(mc.astype(source.urlpath, list))
+                else:
+                    row["file_locs"] = 0
+                if row["file_locs"] == 0:
+                    raise RuntimeError(
+                        f"No file locations were found for the {days} days up to {end_date}."
+                    )
+        except Exception as e:
+            row["status"] = "failed"
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["seconds"] = round(time.perf_counter() - start, 1)
+
+        if verbose:
+            print(f"{row['model']}, {row['model_source']}: {row['status']}")
+        return row
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(warm, sources))
+
+    # this process may exit before pruning in the background would finish
+    mc.cache._finish_pruning()
+
+    return pd.DataFrame(
+        rows,
+        columns=[
+            "model",
+            "model_source",
+            "status",
+            "start_datetime",
+            "end_datetime",
+            "file_locs",
+            "seconds",
+            "error",
+        ],
+    ).set_index(["model", "model_source"])
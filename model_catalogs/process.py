@@ -66,14 +66,18 @@ class DatasetTransform(GenericTransform):
         """
 
         if not hasattr(self, "_status"):
-
-            if self.target.describe()["driver"][0] == "opendap":
-                suffix = ".das"
-            else:
-                suffix = ""
-            self._status = mc.status(mc.astype(self.urlpath, list)[0], suffix=suffix)
+            self._status = mc.status(*self._status_request())
         return self._status
 
+    def _status_request(self):
+        """urlpath and suffix to request to check status of server for source."""
+
+        if self.target.describe()["driver"][0] == "opendap":
+            suffix = ".das"
+        else:
+            suffix = ""
+        return mc.astype(self.urlpath, list)[0], suffix
+
     @property
     def dates(self):
         """Dates associated with urlpath files
@@ -87,10 +91,8 @@ class DatasetTransform(GenericTransform):
         """
 
         if "catloc" in self.metadata:
-            dates = []
-            for url in self.urlpath:
-                dates.extend(mc.astype(mc.file2dt(url), list))
-            self._dates = dates
+            dates, _ = mc.files2dt(self.urlpath)
+            self._dates = list(pd.DatetimeIndex(dates))
         else:
             self._dates = None
 
@@ -152,6 +154,12 @@ class DatasetTransform(GenericTransform):
         # but make it easy to check urlpath
         self._urlpath = kwargs["urlpath"]
 
+    def _open(self):
+        """Open the Dataset of the target source, timed for ``mc.metrics()``."""
+
+        with mc.utils._timed_request("opendap"):
+            return self._source.to_dask()
+
     def to_dask(self):
         """Makes it so can read in model output.
 
@@ -171,7 +179,7 @@ class DatasetTransform(GenericTransform):
                 and self._kwargs["skip_dask_processing"]
             ):
                 return self._transform(
-                    self._source.to_dask(),
+                    self._open(),
                     metadata=self.metadata,
                 )
 
@@ -246,7 +254,7 @@ class DatasetTransform(GenericTransform):
 
             # This sends the metadata to `add_attributes()`
             self._ds = self._transform(
-                self._source.to_dask(),
+                self._open(),
                 metadata=self.metadata,
             )
 
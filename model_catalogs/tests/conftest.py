@@ -28,3 +28,180 @@ def pytest_collection_modifyitems(config, items):
     for item in items:
         if "slow" in item.keywords:
             item.add_marker(skip_slow)
+
+
+THREDDS_DAYS = ["20220130", "20220131", "20220201", "20220202", "20220301"]
+
+
+def thredds_catalog_xml(path, missing=()):
+    """Return thredds catalog xml for path of local test server, or None.
+
+    File names in missing are left out of the catalogs.
+    """
+
+    header = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<catalog xmlns="http://www.unidata.ucar.edu/namespaces/thredds/InvCatalog/v1.0" '
+        'xmlns:xlink="http://www.w3.org/1999/xlink" version="1.0.1">\n'
+        '<service name="all" serviceType="Compound" base="">\n'
+        '<service name="odap" serviceType="OpenDAP" base="/thredds/dodsC/" />\n'
+        "</service>\n"
+    )
+
+    def catref(title):
+        return f'<catalogRef xlink:href="{title}/catalog.xml" xlink:title="{title}" name="" />\n'
+
+    # "model-test" has year and month catalogs, "model-test-daily" also has day catalogs
+    root, *dirs = path.strip("/").split("/")[2:-1]  # relative to "/thredds/catalog/"
+    if root not in ["model-test", "model-test-daily"]:
+        return None
+    depth = 3 if root == "model-test-daily" else 2
+    days = {
+        day: [day[:4], day[4:6], day[6:]][:depth]
+        for day in THREDDS_DAYS
+        if [day[:4], day[4:6], day[6:]][: len(dirs)] == dirs
+    }
+    if len(days) == 0 or len(dirs) > depth:
+        return None
+
+    if len(dirs) < depth:
+        body = "".join(
+            catref(title)
+            for title in sorted(set(day_dirs[len(dirs)] for day_dirs in days.values()))
+        )
+        if len(dirs) == 0:
+            body += catref("docs")
+    else:
+        body = '<dataset name="files">\n'
+        body += '<metadata inherited="true"><serviceName>all</serviceName></metadata>\n'
+        for day in days:
+            for cycle in ["00", "06", "12", "18"]:
+                names = [
+                    f"nos.test.fields.n00{i}.{day}.t{cycle}z.nc" for i in range(1, 7)
+                ]
+                names += [f"nos.test.stations.nowcast.{day}.t{cycle}z.nc"]
+                for name in names:
+                    if name in missing:
+                        continue
+                    url_path = "/".join([root, *dirs, name])
+                    body += f'<dataset name="{name}" ID="{url_path}" urlPath="{url_path}" />\n'
+        body += "</dataset>\n"
+
+    return header + body + "</catalog>\n"
+
+
+def thredds_file_exists(path, missing=()):
+    """Return whether OPeNDAP path of local test server is a file in its catalogs, or another path."""
+
+    root = path.split("/")[3:4]  # relative to "/thredds/dodsC/"
+    if root not in [["model-test"], ["model-test-daily"]]:
+        return True
+    url_path = path.split("/", 3)[-1]
+    catalog_path = (
+        path.rsplit("/", 1)[0].replace("/dodsC/", "/catalog/") + "/catalog.xml"
+    )
+    xml = thredds_catalog_xml(catalog_path, missing)
+    return xml is not None and f'urlPath="{url_path}"' in xml
+
+
+class ThreddsServer(str):
+    """Base url of local thredds server, with a list of (path, status code) of requests to it, and a set of file names that are missing from it."""
+
+    requests = None
+    missing = None
+
+
+@pytest.fixture
+def thredds_server(tmp_path, monkeypatch):
+    """Serve a small thredds catalog of NOAA OFS-style files on localhost.
+
+    Yields base url of the server. Paths ending in ".das" are reachable for files in the catalogs, file names added to its ``missing`` are left out, and paths under "model-down" are a server error. Catalogs have an ETag so they can be requested conditionally, and saved responses go to a temporary directory.
+    """
+
+    import hashlib
+    import threading
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import model_catalogs as mc
+
+    path = tmp_path / "CACHE_PATH_HTTP"
+    path.mkdir()
+    monkeypatch.setattr(mc, "CACHE_PATH_HTTP", path)
+
+    requests = []
+    missing = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if "/model-down/" in self.path:
+                requests.append((self.path, 503))
+                self.send_error(503)
+                return
+            if self.path.endswith(".das"):
+                if not thredds_file_exists(self.path[: -len(".das")], missing):
+                    requests.append((self.path, 404))
+                    self.send_error(404)
+                    return
+                content, content_type = b"Attributes {\n}\n", "text/plain"
+            else:
+                xml = thredds_catalog_xml(self.path, missing)
+                if xml is None:
+                    requests.append((self.path, 404))
+                    self.send_error(404)
+                    return
+                content, content_type = xml.encode(), "application/xml"
+
+            etag = f'"{hashlib.md5(content).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                requests.append((self.path, 304))
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            requests.append((self.path, 200))
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(content)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = ThreddsServer(f"http://127.0.0.1:{server.server_port}")
+    url.requests = requests
+    url.missing = missing
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_paths(tmp_path, monkeypatch):
+    """Use a temporary cache directory, and database in it, for information that is saved by the package."""
+
+    import model_catalogs as mc
+
+    monkeypatch.setattr(mc, "CACHE_PATH", tmp_path)
+    for name, dirname in [
+        ("CACHE_PATH_COMPILED", "compiled"),
+        ("CACHE_PATH_STATUS", "status"),
+        ("CACHE_PATH_HTTP", "http"),
+        ("CAT_PATH_BOUNDARIES", "boundaries"),
+    ]:
+        (tmp_path / dirname).mkdir(exist_ok=True)
+        monkeypatch.setattr(mc, name, tmp_path / dirname)
+    monkeypatch.setattr(mc, "CACHE_PATH_DB", tmp_path / "cache.sqlite")
+    monkeypatch.setattr(mc, "CACHE_PATH_LOCKS", tmp_path / "CACHE_PATH_LOCKS")
+    monkeypatch.setitem(mc.CACHE_LIMITS, "prune_interval", None)
+    mc.status_cache_clear()
+    mc.catalog_cache_clear()
+    yield tmp_path
+    mc.status_cache_clear()
+    mc.catalog_cache_clear()
@@ -2,20 +2,30 @@
 Make sure catalogs work correctly. If this doesn't run once, try again since the servers can be finnicky.
 """
 
+import asyncio
+import contextlib
+import os
 import pathlib
+import sqlite3
+import threading
+import time
 import warnings
 
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 import intake
 import numpy as np
 import pandas as pd
 import pytest
+import requests
 import xarray as xr
+import yaml
 
 from intake.catalog import Catalog
 from intake_xarray.opendap import OpenDapSource
 from pandas import Timestamp
+from siphon.http_util import session_manager
 
 import model_catalogs as mc
 
@@ -43,6 +53,59 @@ def test_setup():
     # assert main_cat["CBOFS"].metadata["geospatial_bounds"]
 
 
+def test_agg_for_date():
+    """Select nowcast files of a day, and forecast files of the timing cycle with the most files."""
+
+    strings = [
+        f"nos.test.{filetype}.{kind}00{hour}.2022092{day}.t{cycle}z.nc"
+        for filetype in ["fields", "regulargrid"]
+        for day in [0, 1]
+        for cycle in ["00", "06", "12", "18"]
+        for kind in ["n", "f"]
+        for hour in range(1, 7 if kind == "n" or cycle != "18" else 3)
+    ]
+
+    fnames = mc.agg_for_date("2022-09-21", strings, "fields")
+    assert fnames == [
+        f"nos.test.fields.n00{hour}.20220921.t{cycle}z.nc"
+        for cycle in ["00", "06", "12", "18"]
+        for hour in range(1, 7)
+    ]
+
+    # forecast files of cycle 18 aren't all available yet, so cycle 12 is used
+    fnames_fore = mc.agg_for_date("2022-09-21", strings, "fields", is_forecast=True)
+    assert (
+        fnames_fore
+        == [
+            f"nos.test.fields.{kind}00{hour}.20220921.t12z.nc"
+            for kind in ["n", "f"]
+            for hour in range(1, 7)
+        ]
+        + fnames
+    )
+
+    # pattern from catalog, which is not evaluated
+    strings = [
+        f"nos.nyofs.fields.{kind}.2022092{day}.t{cycle}z.nc"
+        for day in [0, 1]
+        for cycle in ["05", "11"]
+        for kind in ["nowcast", "forecast"]
+    ]
+    pattern = "*.nyofs.{filetype}.n*.{date.year}{str(date.month).zfill(2)}{str(date.day).zfill(2)}.t??z.*"  # noqa: E501
+    assert mc.agg_for_date("2022-09-20", strings, "fields", pattern=pattern) == [
+        "nos.nyofs.fields.nowcast.20220920.t05z.nc",
+        "nos.nyofs.fields.nowcast.20220920.t11z.nc",
+    ]
+    assert mc.agg_for_date(
+        "2022-09-20",
+        strings,
+        "fields",
+        pattern="*.nyofs.{filetype}.n*.{date:%Y%m%d}.t??z.*",
+    ) == mc.agg_for_date("2022-09-20", strings, "fields", pattern=pattern)
+    with pytest.raises(ValueError):
+        mc.agg_for_date("2022-09-20", strings, "fields", pattern="*{__import__('os')}*")
+
+
 # @pytest.mark.slow
 def test_find_availability():
     """Test find_availability.
@@ -67,9 +130,11 @@ def test_find_availability():
                 f"Running model {model} with model_source {model_source} in `find_availability()` did not result in `start_datetime` in the catalog metadata.",  # noqa: E501
                 RuntimeWarning,
             )
-        fname = mc.FILE_PATH_START(model, model_source)
-        if not mc.is_fresh(fname, cat[model_source]):
-            warnings.warn(f"Filename {fname} is not found as fresh.", RuntimeWarning)
+        if mc.model_catalogs._read_datetimes(cat[model_source])[0] is None:
+            warnings.warn(
+                f"Start datetime of {model}, {model_source} is not found as fresh.",
+                RuntimeWarning,
+            )
 
         # make sure catalog output since catalog was input
         assert isinstance(cat, Catalog)
@@ -122,6 +187,18 @@ def test_boundaries():
     assert "geospatial_bounds" in main_cat["GOFS"].metadata
 
 
+def test_boundaries_servers_down(thredds_server, cache_paths, tmp_path):
+    """Boundaries are not calculated for a catalog whose servers are all down."""
+
+    thredds_test_catalog(tmp_path, thredds_server, root="model-down")
+    cat = intake.open_catalog(tmp_path / "test_catalog.yaml")
+    with pytest.warns(RuntimeWarning, match="Boundaries of TEST were not calculated"):
+        boundaries = mc.calculate_boundaries(
+            cat, save_files=False, return_boundaries=True
+        )
+    assert boundaries == {}
+
+
 # @pytest.mark.slow
 # this test continues to be too brittle with CO-OPS servers breaking constantly but in different ways each time
 # def test_select_date_range():
@@ -508,6 +585,33 @@ def test_file2dt():
     assert mc.file2dt(fname) == date
 
 
+def test_files2dt():
+    """Datetimes of many files at once are the same as one at a time."""
+
+    fnames = [
+        "https://www.ncei.noaa.gov/thredds/dodsC/model-cbofs-files/2022/09/nos.cbofs.fields.n001.20220913.t00z.nc",  # noqa: E501
+        "nos.cbofs.fields.f001.20220914.t12z.nc",
+        "nos.creofs.fields.n000.20220920.t15z.nc",
+        "glofs.loofs.fields.nowcast.20220919.t00z.nc",
+        "nos.nyofs.fields.forecast.20220920.t17z.nc",
+        "nos.wcofs.fields.n024.20220920.t03z.nc",
+        "nos.wcofs.fields.f003.20220920.t03z.nc",
+    ]
+
+    # also one name that doesn't follow the usual patterns
+    for fnames in [fnames, fnames + ["nos.test.fields.20220920.t03z.nc"]]:
+        dates, index = mc.files2dt(fnames)
+        assert dates.dtype == "datetime64[ns]"
+        known_dates = [mc.astype(mc.file2dt(fname), list) for fname in fnames]
+        assert list(dates) == [date for dates_ in known_dates for date in dates_]
+        assert list(index) == [
+            i for i, dates_ in enumerate(known_dates) for date in dates_
+        ]
+
+    dates, index = mc.files2dt([])
+    assert len(dates) == len(index) == 0
+
+
 def test_filedates2df():
     """Checking sorting and deduplicating indices."""
 
@@ -543,6 +647,17 @@ def test_filedates2df():
 
     assert ordered_fnames == list(df["filenames"].values)
 
+    # same from the arrays, also selecting ranges
+    filedates = mc.FileDates(fnames[::-1])
+    assert len(filedates) == len(ordered_fnames)
+    assert filedates.select() == ordered_fnames
+    assert filedates.select("2022-09-20") == ordered_fnames
+    assert filedates.select(end="2022-09-20 09:00") == ordered_fnames[:1]
+    assert (
+        filedates.select("2022-09-20 15:00", "2022-09-20 16:00") == ordered_fnames[6:8]
+    )
+    assert filedates.select("2022-09-21") == []
+
 
 # @pytest.mark.slow
 def test_urlpath_after_select():
@@ -633,3 +748,1241 @@ def test_wrong_time_range(mock_open_dataset, mock_open_mfdataset):
     )
     with pytest.raises(RuntimeError):
         source0.to_dask()
+
+
+def test_get_session(cache_paths):
+    """Status checks and siphon catalogs share the same connection pools."""
+
+    session = mc.get_session()
+    assert mc.get_session() is session
+    assert session_manager.create_session().adapters is session.adapters
+
+    with mock.patch.object(
+        session, "get", side_effect=requests.exceptions.ConnectTimeout
+    ):
+        assert not mc.status("https://example.com/thredds/dodsC/file.nc")
+    mc.status_cache_clear()
+
+    resp = mock.Mock(status_code=200)
+    with mock.patch.object(session, "get", return_value=resp) as mock_get:
+        assert mc.status("https://example.com/thredds/dodsC/file.nc")
+    mock_get.assert_called_once_with("https://example.com/thredds/dodsC/file.nc.das")
+
+
+def test_status_many():
+    """Servers are checked concurrently and status is filled in for sources."""
+
+    import time
+
+    def slow_status(urlpath, suffix=".das"):
+        time.sleep(0.2)
+        return "down" not in urlpath
+
+    urls = [f"https://example{i}.com/file.nc" for i in range(5)]
+    source = mock.Mock(spec=["_status_request"])
+    source._status_request.return_value = ("https://down.com/file.nc", ".das")
+
+    with mock.patch("model_catalogs.utils.status", side_effect=slow_status) as mstatus:
+        start = time.perf_counter()
+        statuses = mc.status_many(urls + [source, urls[0]], max_workers=10)
+        elapsed = time.perf_counter() - start
+
+    assert statuses == [True] * 5 + [False, True]
+    assert source._status is False
+    # duplicate url is only checked once, and all are checked at once
+    assert mstatus.call_count == 6
+    assert elapsed < 0.6
+
+
+def test_status_cache(cache_paths, tmp_path, monkeypatch):
+    """Server status is shared by host and endpoint, in memory and on disk."""
+
+    monkeypatch.setattr(mc, "CACHE_PATH_STATUS", tmp_path)
+    monkeypatch.setattr(mc, "STATUS_CACHE_DISK", True)
+    mc.status_cache_clear()
+    session = mc.get_session()
+
+    resp = mock.Mock(status_code=200)
+    with mock.patch.object(session, "get", return_value=resp) as mock_get:
+        assert mc.status("https://example.com/thredds/dodsC/CBOFS/file1.nc")
+        assert mc.status("https://example.com/thredds/dodsC/DBOFS/file2.nc")
+        assert mc.status("https://example.com/thredds/catalog/catalog.xml", "")
+    assert mock_get.call_count == 2
+    info = mc.status_cache_info()
+    assert (info["hits"], info["misses"]) == (1, 2)
+    assert info["servers"] == {
+        "example.com/thredds/dodsC": True,
+        "example.com/thredds/catalog": True,
+    }
+
+    # a new process would read status from disk
+    mc.status_cache_clear()
+    with mock.patch.object(session, "get") as mock_get:
+        assert mc.status("https://example.com/thredds/dodsC/CBOFS/file3.nc")
+    mock_get.assert_not_called()
+    assert mc.status_cache_info()["hits"] == 1
+
+    # stale entries are checked again
+    monkeypatch.setitem(mc.FRESH, "status", "0 seconds")
+    with mock.patch.object(session, "get", return_value=resp) as mock_get:
+        assert mc.status("https://example.com/thredds/dodsC/CBOFS/file3.nc")
+    mock_get.assert_called_once()
+    mc.status_cache_clear()
+
+
+def test_circuit_breaker(monkeypatch):
+    """Requests to a host fail fast after repeated failures."""
+
+    monkeypatch.setitem(mc.HTTP, "circuit_failures", 2)
+    monkeypatch.setattr(mc, "HTTP_CACHE_DISK", False)
+    url = "https://down.example.com/thredds/catalog/catalog.xml"
+    session = mc.get_session()
+
+    with mock.patch(
+        "requests.adapters.HTTPAdapter.send",
+        side_effect=requests.exceptions.ConnectTimeout,
+    ) as mock_send:
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectTimeout):
+                session.get(url)
+        assert mc.circuit_open(url)
+        with pytest.raises(mc.CircuitOpenError):
+            session.get(url)
+        assert mock_send.call_count == 2
+        # timeouts from mc.HTTP are used
+        assert mock_send.call_args.kwargs["timeout"] == (
+            mc.HTTP["connect_timeout"],
+            mc.HTTP["read_timeout"],
+        )
+
+    # after the cooldown a request is let through, and success closes the circuit
+    monkeypatch.setitem(mc.HTTP, "circuit_cooldown", "0 seconds")
+    assert not mc.circuit_open(url)
+    with mock.patch(
+        "requests.adapters.HTTPAdapter.send", return_value=mock.Mock(status_code=200)
+    ):
+        session.adapters["https://"].send(requests.Request("GET", url).prepare())
+    monkeypatch.setitem(mc.HTTP, "circuit_cooldown", "5 minutes")
+    assert not mc.circuit_open(url)
+
+    # an open circuit is reported when the server status is False
+    source = mock.Mock(urlpath=url)
+    source.cat.name, source.name = "CBOFS", "ncei-archive-noagg"
+    with mock.patch("model_catalogs.utils._circuit_allow", return_value=False):
+        with pytest.warns(RuntimeWarning, match="circuit breaker"):
+            mc.model_catalogs._warn_server_not_working(source)
+
+
+def thredds_test_catalog(tmp_path, server, root="model-test"):
+    """Catalog with a source that requires aggregation from the local thredds server."""
+
+    fname = tmp_path / "test_catalog.yaml"
+    dirs = "2022/01/30" if root == "model-test-daily" else "2022/01"
+    catalog_text = f"""
+    name: TEST
+    metadata:
+        filetype: fields
+    sources:
+        ncei-archive-noagg:
+            args:
+                engine: netcdf4
+                urlpath:
+                    - {server}/thredds/dodsC/{root}/{dirs}/nos.test.fields.n001.20220130.t00z.nc
+            description: ''
+            driver: opendap
+            metadata:
+                catloc: {server}/thredds/catalog/{root}/catalog.xml
+                axis:
+                    T: ocean_time
+    """
+    with open(fname, "w") as fp:
+        fp.write(catalog_text)
+    return mc.open_catalog(fname)
+
+
+def test_afind_catrefs(thredds_server):
+    """Coroutine finds the same catrefs as ``find_catrefs()``."""
+
+    catloc = f"{thredds_server}/thredds/catalog/model-test/catalog.xml"
+    catrefs = asyncio.run(mc.afind_catrefs(catloc))
+    assert catrefs == [("2022", "01"), ("2022", "02"), ("2022", "03")]
+    assert catrefs == mc.find_catrefs(catloc)
+
+    filelocs = asyncio.run(mc.aio.afind_filelocs(catrefs[0], catloc))
+    assert sorted(filelocs) == sorted(mc.find_filelocs(catrefs[0], catloc))
+    assert len(filelocs) == 2 * 4 * 6
+    assert not any("stations" in fileloc for fileloc in filelocs)
+
+
+def test_afind_availability(thredds_server, cache_paths, tmp_path):
+    """Coroutine finds the same availability as ``find_availability()``."""
+
+    cat = mc.find_availability(thredds_test_catalog(tmp_path, thredds_server))
+    with mc.cache.connection() as con:
+        con.execute("DELETE FROM entries")
+    acat = asyncio.run(
+        mc.afind_availability(thredds_test_catalog(tmp_path, thredds_server))
+    )
+
+    metadata = cat["ncei-archive-noagg"].metadata
+    ametadata = acat["ncei-archive-noagg"].metadata
+    assert ametadata["start_datetime"] == metadata["start_datetime"]
+    assert ametadata["end_datetime"] == metadata["end_datetime"]
+    assert ametadata["end_datetime"] == "2022-03-01 18:00:00"
+
+
+def test_aselect_date_range(thredds_server, cache_paths, tmp_path):
+    """Coroutine selects the same files as ``select_date_range()``."""
+
+    day = "2022-1-31"
+    source = mc.select_date_range(
+        thredds_test_catalog(tmp_path, thredds_server)["ncei-archive-noagg"],
+        start_date=day,
+        end_date=day,
+    )
+    with mc.cache.connection() as con:
+        con.execute("DELETE FROM entries")
+
+    with mock.patch(
+        "model_catalogs.aio.afind_filelocs", wraps=mc.aio.afind_filelocs
+    ) as mock_filelocs:
+        asource = asyncio.run(
+            mc.aselect_date_range(
+                thredds_test_catalog(tmp_path, thredds_server)["ncei-archive-noagg"],
+                start_date=day,
+                end_date=day,
+            )
+        )
+    # the two days that are aggregated are in different monthly catalogs
+    assert mock_filelocs.call_count == 2
+
+    assert asource.urlpath == source.urlpath
+    assert len(asource.urlpath) == 24
+    assert asource.metadata["start_date"] == source.metadata["start_date"]
+    assert asource.metadata["end_date"] == source.metadata["end_date"]
+
+
+def test_aselect_date_range_small_executor(thredds_server, cache_paths, tmp_path):
+    """More coroutines waiting for the same locks than the executor has threads don't block the one holding them."""
+
+    day = "2022-1-31"
+    cat = thredds_test_catalog(tmp_path, thredds_server)
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(2))
+        return await asyncio.gather(
+            *[
+                mc.aselect_date_range(
+                    cat["ncei-archive-noagg"], start_date=day, end_date=day
+                )
+                for _ in range(6)
+            ]
+        )
+
+    sources = []
+    thread = threading.Thread(
+        target=lambda: sources.extend(asyncio.run(main())), daemon=True
+    )
+    thread.start()
+    thread.join(60)
+    assert not thread.is_alive()
+    assert [len(source.urlpath) for source in sources] == [24] * 6
+
+
+def test_cache(cache_paths):
+    """Information about sources is saved in one database, fresh for its freshness parameter."""
+
+    mc.cache.put("catrefs", "model", "source", [["2022", "01"]])
+    assert mc.cache.get("catrefs", "model", "source") == [["2022", "01"]]
+    assert mc.cache.get("catrefs", "model", "other") is None
+    with mc.cache.connection() as con:
+        con.execute("UPDATE entries SET saved = saved - 3600")
+    assert mc.cache.get("catrefs", "model", "source", mu="30 minutes") is None
+    assert mc.cache.get("catrefs", "model", "source", mu="2 hours") == [["2022", "01"]]
+
+    # file locations of 90 days are read with one range query
+    source = mock.Mock(metadata={})
+    source.cat.name = "model"
+    days = mc.model_catalogs._aggregation_days(
+        pd.Timestamp("2022-1-1"), pd.Timestamp("2022-3-31"), True
+    )
+    agg_filelocs = {day: [f"{day[0]:%Y%m%d}.nc"] for day in days}
+    mc.model_catalogs._save_agg_filelocs(source, "source", agg_filelocs)
+    mc.cache.put("file_locs", "model", "source", ["x"], "2022-04-01_is-forecast_False")
+    with mock.patch(
+        "model_catalogs.cache.connection", wraps=mc.cache.connection
+    ) as mock_connection:
+        assert (
+            mc.model_catalogs._fresh_agg_filelocs(source, "source", days)
+            == agg_filelocs
+        )
+    assert len(days) == 90
+    assert mock_connection.call_count == 1
+    assert mc.model_catalogs._fresh_agg_filelocs(source, "source", days[1:3]) == {
+        day: agg_filelocs[day] for day in days[1:3]
+    }
+    assert mc.model_catalogs._fresh_agg_filelocs(source, "source", days, True) == {}
+
+    source.metadata = {"freshness": {"file_locs": "30 minutes"}}
+    with mc.cache.connection() as con:
+        con.execute("UPDATE entries SET saved = saved - 3600")
+    assert mc.model_catalogs._fresh_agg_filelocs(source, "source", days) == {}
+
+
+def test_fresh_parameter(cache_paths, tmp_path):
+    """Freshness parameters of files and sources, and deprecated paths of older versions."""
+
+    source = mock.Mock(metadata={"freshness": {"end": "1 hour"}})
+    assert mc.fresh_parameter("end", source) == "1 hour"
+    assert mc.fresh_parameter("start", source) == mc.FRESH["start"]
+    assert mc.get_fresh_parameter(mc.FILE_PATH_COMPILED("TEST")) == mc.FRESH["compiled"]
+    with pytest.raises(ValueError):
+        mc.get_fresh_parameter(tmp_path / "other.yaml")
+
+    # paths of files saved by older versions are deprecated, and the files are left as is
+    with pytest.warns(DeprecationWarning):
+        fname = mc.FILE_PATH_AGG_FILE_LOCS("TEST", "source", "2022-1-1", False)
+    assert (
+        fname
+        == tmp_path / "file_locs" / "TEST_source_2022-01-01_is-forecast_False.yaml"
+    )
+    with pytest.warns(DeprecationWarning):
+        assert mc.FILE_PATH_START("TEST", "source").parent == mc.CACHE_PATH_AVAILABILITY
+    for old in [fname, mc._FILE_PATH_START("TEST", "source")]:
+        old.parent.mkdir()
+        old.write_text("old")
+    with pytest.warns(DeprecationWarning):
+        assert mc.is_fresh(fname, source)
+    with pytest.warns(DeprecationWarning):
+        assert mc.get_fresh_parameter(mc._FILE_PATH_END("TEST", "source"), source) == (
+            "1 hour"
+        )
+    with pytest.warns(DeprecationWarning):
+        assert mc.get_fresh_parameter(fname, source) == mc.FRESH["file_locs"]
+    assert mc.cache.get("start", "TEST", "source") is None
+    assert fname.read_text() == "old"
+    with pytest.raises(AttributeError):
+        mc.FILE_PATH_OTHER
+
+
+def test_cache_prune(cache_paths, tmp_path, monkeypatch):
+    """Saved information beyond the limits of its category is removed, least recently used first."""
+
+    for name in ["CACHE_PATH_COMPILED", "CACHE_PATH_HTTP", "CACHE_PATH_STATUS"]:
+        path = tmp_path / name
+        path.mkdir()
+        monkeypatch.setattr(mc, name, path)
+
+    values = {f"2022-01-0{day}_is-forecast_False": ["a" * 98] for day in range(1, 6)}
+    mc.cache.put_many("file_locs", "model", "source", values)
+    mc.cache.put("catrefs", "model", "source", [["2022", "01"]])
+    (mc.CACHE_PATH_COMPILED / "old.yaml").write_text("old")
+    (mc.CACHE_PATH_COMPILED / "new.yaml").write_text("new")
+    os.utime(mc.CACHE_PATH_COMPILED / "old.yaml", (0, 0))
+    (mc.CACHE_PATH_HTTP / "response.xml").write_text("<catalog />")
+    (mc.CACHE_PATH_HTTP / "response.yaml").write_text("{}")
+
+    # the first days were used longest ago
+    with mc.cache.connection() as con:
+        con.execute(
+            "UPDATE entries SET accessed = 0 WHERE key BETWEEN '2' AND '2022-01-04'"
+        )
+    assert mc.cache.get("file_locs", "model", "source", "2022-01-05_is-forecast_False")
+    with mc.cache.connection() as con:
+        con.execute(
+            "UPDATE entries SET accessed = accessed - 3600 WHERE key = '2022-01-04_is-forecast_False'"
+        )
+
+    info = mc.cache_info()
+    assert info["file_locs"]["entries"] == 5
+    assert info["file_locs"]["size"] == 5 * 102
+    assert info["file_locs"]["oldest"] == pd.Timestamp(0, tz="UTC")
+    assert info["catrefs"]["entries"] == 1
+    assert info["compiled"]["entries"] == 2
+    assert info["http"] == {
+        "entries": 1,
+        "size": 13,
+        "oldest": info["http"]["newest"],
+        "newest": info["http"]["newest"],
+    }
+    assert info["status"] == {"entries": 0, "size": 0, "oldest": None, "newest": None}
+
+    assert mc.cache_prune({"max_age": "1 day", "max_entries": 2}) == {
+        "catrefs": 0,
+        "start": 0,
+        "end": 0,
+        "file_locs": 3,
+        "file_template": 0,
+        "missing": 0,
+        "compiled": 1,
+        "http": 0,
+        "status": 0,
+    }
+    assert not (mc.CACHE_PATH_COMPILED / "old.yaml").exists()
+    keys = mc.cache.connection().execute(
+        "SELECT key FROM entries WHERE category = 'file_locs' ORDER BY key"
+    )
+    assert [key for key, in keys] == [
+        "2022-01-04_is-forecast_False",
+        "2022-01-05_is-forecast_False",
+    ]
+
+    # the least recently used are removed for size, and the rest for age
+    assert mc.cache_prune({"max_age": None, "max_size": 150})["file_locs"] == 1
+    assert mc.cache.get("file_locs", "model", "source", "2022-01-05_is-forecast_False")
+    assert mc.cache_prune({"max_age": "0 seconds"})["http"] == 1
+    assert mc.cache_info()["file_locs"]["entries"] == 0
+    assert list(mc.CACHE_PATH_HTTP.glob("*")) == []
+
+    # reading rows doesn't write, and when they were used is written once they were not
+    # used for access_interval, with the next change
+    mc.cache.put("end", "model", "source", "2022-01-02")
+    with mc.cache.connection() as con:
+        con.execute("UPDATE entries SET accessed = 0")
+    statements = []
+    mc.cache.connection().set_trace_callback(statements.append)
+    try:
+        assert mc.cache.get("end", "model", "source") == "2022-01-02"
+        assert not any(statement.startswith("UPDATE") for statement in statements)
+        mc.cache.put("end", "model", "other", "2022-01-03")
+        assert any(statement.startswith("UPDATE") for statement in statements)
+    finally:
+        mc.cache.connection().set_trace_callback(None)
+    used = dict(
+        mc.cache.connection().execute(
+            "SELECT model_source, accessed FROM entries WHERE category = 'end'"
+        )
+    )
+    assert used["source"] > 0
+
+    # pruning runs automatically in a thread after information is saved, at most once per
+    # interval for all processes, including ones that only just started
+    monkeypatch.setitem(mc.CACHE_LIMITS, "prune_interval", "1 hour")
+    monkeypatch.setitem(mc.CACHE_LIMITS, "max_entries", 1)
+    mc.cache._prune_stamp().unlink(missing_ok=True)
+    mc.cache.put("start", "model", "source", "2022-01-01")
+    mc.cache._prune_thread.join()
+    assert mc.cache._last_pruned() > time.time() - 60
+    mc.cache.put("start", "model", "other", "2022-01-02")
+    mc.cache._prune_thread.join()
+    assert mc.cache_info()["start"]["entries"] == 2
+
+    # and not while another process is pruning
+    os.utime(mc.cache._prune_stamp(), (0, 0))
+    with mc.cache.lock("prune"):
+        mc.cache.put("start", "model", "third", "2022-01-03")
+        mc.cache._prune_thread.join()
+    assert mc.cache_info()["start"]["entries"] == 3
+    assert mc.cache._finish_pruning()["start"] == 2
+    assert mc.cache_info()["start"]["entries"] == 1
+
+
+def test_cache_lock(cache_paths, tmp_path):
+    """Missing information is computed once while others wait, and files are replaced whole."""
+
+    computed = []
+
+    def compute():
+        time.sleep(0.2)
+        computed.append(threading.get_ident())
+        mc.cache.put("start", "model", "source", "2022-01-01")
+        return "2022-01-01"
+
+    def find(_):
+        return mc.cache.compute_once(
+            ("start", "model", "source"),
+            lambda: mc.cache.get("start", "model", "source"),
+            compute,
+        )
+
+    with ThreadPoolExecutor(4) as executor:
+        assert list(executor.map(find, range(4))) == ["2022-01-01"] * 4
+    assert len(computed) == 1
+
+    async def hold(name):
+        async with mc.cache.alock("start", "model", "source"):
+            computed.append(name)
+            await asyncio.sleep(0.1)
+            computed.append(name)
+
+    async def main():
+        await asyncio.gather(hold("a"), hold("b"))
+
+    asyncio.run(main())
+    assert computed[1:] in [["a", "a", "b", "b"], ["b", "b", "a", "a"]]
+
+    fname = tmp_path / "file.yaml"
+    fname.write_text("old")
+    with pytest.raises(ValueError):
+        with mc.cache.atomic_open(fname) as outfile:
+            outfile.write("new")
+            raise ValueError
+    assert fname.read_text() == "old"
+    with mc.cache.atomic_open(fname) as outfile:
+        outfile.write("new")
+    assert fname.read_text() == "new"
+    assert list(tmp_path.glob(".*")) == []
+
+
+def test_cache_codecs(tmp_path, monkeypatch):
+    """Files are saved in the format of ``mc.CACHE_FORMAT``, and files saved as YAML are still read."""
+
+    value = {"bbox": [-76.5, 36.5, -75.5, 39.5], "wkt": "POLYGON ((...))"}
+    fname = tmp_path / f"cbofs{mc.cache.suffix()}"
+    assert fname.suffix == ".json"
+    mc.cache.dump(value, fname)
+    assert fname.read_text().startswith('{"bbox":')
+    assert mc.cache.load(fname) == value
+
+    # a file saved as YAML by an older version
+    legacy = tmp_path / "dbofs.yaml"
+    with open(legacy, "w") as outfile:
+        yaml.dump(value, outfile, default_flow_style=False)
+    assert mc.cache.find(tmp_path / "dbofs.json") == legacy
+    assert mc.cache.load(tmp_path / "dbofs.json") == value
+    assert mc.cache.find(tmp_path / "other.json") is None
+    with pytest.raises(FileNotFoundError):
+        mc.cache.load(tmp_path / "other.json")
+    legacy.write_text("bbox: [")
+    with pytest.raises(ValueError):
+        mc.cache.load(tmp_path / "dbofs.json")
+
+    monkeypatch.setattr(mc, "CACHE_FORMAT", "yaml")
+    assert mc.FILE_PATH_BOUNDARIES("dbofs").suffix == ".yaml"
+    mc.cache.dump(value, legacy)
+    assert yaml.safe_load(legacy.read_text()) == value
+
+
+def test_cache_memo(cache_paths, tmp_path):
+    """Saved information is read again only once it changed."""
+
+    fname = tmp_path / "status.json"
+    mc.cache.dump({"status": True}, fname)
+    with mock.patch.object(pathlib.Path, "read_text") as mock_read:
+        assert mc.cache.load(fname) == {"status": True}
+    mock_read.assert_not_called()
+    value = mc.cache.load(fname)
+    value["status"] = None
+    assert mc.cache.load(fname) == {"status": True}
+
+    # changed by another process
+    fname.write_text('{"status":false,"other":1}')
+    assert mc.cache.load(fname) == {"status": False, "other": 1}
+
+    mc.cache.put("start", "model", "source", "2022-01-01")
+    assert mc.cache.get("start", "model", "source") == "2022-01-01"
+    statements = []
+    mc.cache.connection().set_trace_callback(statements.append)
+    try:
+        assert mc.cache.get("start", "model", "source") == "2022-01-01"
+        assert mc.cache.get("start", "model", "source", mu="1 hour") == "2022-01-01"
+        assert statements == ["PRAGMA data_version"] * 2
+
+        # changed by another connection, and by this one
+        with contextlib.closing(sqlite3.connect(mc.CACHE_PATH_DB)) as con, con:
+            con.execute("UPDATE entries SET value = '\"2022-01-02\"'")
+        assert mc.cache.get("start", "model", "source") == "2022-01-02"
+        mc.cache.put("start", "model", "source", "2022-01-03")
+        assert mc.cache.get("start", "model", "source") == "2022-01-03"
+    finally:
+        mc.cache.connection().set_trace_callback(None)
+
+    # reads of other connections, such as of other processes, don't change the database
+    with mc.cache.connection() as con:
+        con.execute("UPDATE entries SET accessed = 0")
+    version = mc.cache.connection().execute("PRAGMA data_version").fetchone()
+    thread = threading.Thread(target=mc.cache.get, args=("start", "model", "source"))
+    thread.start()
+    thread.join()
+    assert mc.cache.connection().execute("PRAGMA data_version").fetchone() == version
+
+
+def test_warm_cache(thredds_server, cache_paths, tmp_path, monkeypatch, capsys):
+    """Saved information of sources is refreshed, with a summary that reports failures."""
+
+    from model_catalogs.cli import main
+
+    path = tmp_path / "CACHE_PATH_COMPILED"
+    path.mkdir()
+    monkeypatch.setattr(mc, "CACHE_PATH_COMPILED", path)
+
+    fname = tmp_path / "test_catalog.yaml"
+    fname.write_text(
+        f"""
+name: TEST
+metadata:
+    filetype: fields
+sources:
+    ncei-archive-noagg:
+        args:
+            urlpath:
+                - {thredds_server}/thredds/dodsC/model-test/2022/01/nos.test.fields.n001.20220130.t00z.nc
+        driver: opendap
+        metadata:
+            catloc: {thredds_server}/thredds/catalog/model-test/catalog.xml
+    missing:
+        args:
+            urlpath:
+                - {thredds_server}/thredds/dodsC/model-test/2022/01/nos.test.fields.n001.20220130.t00z.nc
+        driver: opendap
+        metadata:
+            catloc: {thredds_server}/thredds/catalog/missing/catalog.xml
+"""
+    )
+
+    summary = mc.warm_cache(fname, days=2, max_workers=2, boundaries=False)
+    assert sorted(summary.index) == [
+        ("TEST", "missing"),
+        ("TEST", "ncei-archive-noagg"),
+    ]
+    ok = summary.loc[("TEST", "ncei-archive-noagg")]
+    assert ok["status"] == "ok"
+    assert ok["start_datetime"] == "2022-01-29 19:00:00"
+    assert ok["end_datetime"] == "2022-03-01 18:00:00"
+    assert ok["file_locs"] == 24
+    assert summary.loc[("TEST", "missing"), "status"] == "failed"
+    assert "404" in summary.loc[("TEST", "missing"), "error"]
+
+    # later calls read what was saved
+    source = mc.setup(fname, boundaries=False)["TEST"]["ncei-archive-noagg"]
+    assert mc.model_catalogs._read_catrefs(source) is not None
+    thredds_server.requests.clear()
+    source = mc.select_date_range(source, "2022-3-1", "2022-3-1")
+    assert not any(path.endswith(".xml") for path, _ in thredds_server.requests)
+
+    args = ["warm", "--locs", str(fname), "--model-sources", "ncei-archive-noagg"]
+    metrics = tmp_path / "metrics.prom"
+    assert (
+        main(args + ["--no-boundaries", "--days", "0", "--metrics", str(metrics)]) == 0
+    )
+    assert "1 of 1 sources refreshed, 0 failed." in capsys.readouterr().out
+    assert "model_catalogs_cache_hits_total" in metrics.read_text()
+    assert main(args[:3] + ["--no-boundaries", "--no-override"]) == 1
+    assert "1 of 2 sources refreshed, 1 failed." in capsys.readouterr().out
+
+    # a forecast ends in the future, so the days up to today are refreshed, and a source
+    # without file locations for them fails
+    find_availability = mc.model_catalogs.find_availability
+
+    def forecast(source, override=False):
+        source = find_availability(source, override=override)
+        end = pd.Timestamp.today() + pd.Timedelta("2 days")
+        source.metadata["end_datetime"] = str(end)
+        return source
+
+    with mock.patch.object(
+        mc.model_catalogs, "find_availability", side_effect=forecast
+    ), mock.patch.object(
+        mc.model_catalogs, "select_date_range", wraps=mc.select_date_range
+    ) as mock_select:
+        summary = mc.warm_cache(
+            fname, model_sources="ncei-archive-noagg", boundaries=False
+        )
+    assert mock_select.call_args.kwargs["end_date"] <= pd.Timestamp.today()
+    assert summary.loc[("TEST", "ncei-archive-noagg"), "status"] == "failed"
+    assert "No file locations" in summary.loc[("TEST", "ncei-archive-noagg"), "error"]
+
+
+def test_metrics(thredds_server, cache_paths, tmp_path):
+    """Saved information used and found again, and network requests, are counted and timed."""
+
+    mc.metrics_clear()
+    mc.status_cache_clear()
+    mc.catalog_cache_clear()
+    cat = thredds_test_catalog(tmp_path, thredds_server)
+
+    source = mc.find_availability(cat["ncei-archive-noagg"])
+    mc.find_availability(cat["ncei-archive-noagg"])
+    metrics = mc.metrics()
+    for category in ["catrefs", "start", "end"]:
+        assert metrics["cache"][category]["misses"] == 1
+        assert metrics["cache"][category]["seconds"]["count"] == 1
+    # catrefs are not needed once the datetimes are saved
+    assert metrics["cache"]["catrefs"]["hits"] == 0
+    assert metrics["cache"]["start"]["hits"] == metrics["cache"]["end"]["hits"] == 1
+    assert metrics["network"]["status"]["requests"] == 1
+    assert metrics["network"]["status"]["errors"] == 0
+    catalog = metrics["network"]["catalog"]
+    assert catalog["requests"] > 0
+    assert catalog["seconds"]["count"] == catalog["requests"]
+    assert catalog["seconds"]["buckets"][float("inf")] == catalog["requests"]
+    assert list(catalog["seconds"]["buckets"])[:-1] == mc.METRICS_BUCKETS
+
+    mc.select_date_range(source, "2022-1-30", "2022-2-1")
+    mc.select_date_range(source, "2022-1-30", "2022-2-1")
+    assert mc.metrics()["cache"]["catrefs"]["hits"] == 1
+    file_locs = mc.metrics()["cache"]["file_locs"]
+    assert file_locs["hits"] == file_locs["misses"] > 0
+    assert file_locs["seconds"]["count"] == 1
+
+    # the copy returned is not changed
+    metrics["cache"]["start"]["hits"] = 100
+    assert mc.metrics()["cache"]["start"]["hits"] == 1
+
+    text = mc.metrics_prometheus(tmp_path / "metrics.prom")
+    assert (tmp_path / "metrics.prom").read_text() == text
+    lines = text.splitlines()
+    assert "# TYPE model_catalogs_cache_misses_total counter" in lines
+    misses = file_locs["misses"]
+    assert (
+        f'model_catalogs_cache_misses_total{{category="file_locs"}} {misses}' in lines
+    )
+    # the catalog server was also checked
+    assert 'model_catalogs_network_requests_total{operation="status"} 2' in lines
+    assert 'model_catalogs_network_errors_total{operation="status"} 0' in lines
+    assert "# TYPE model_catalogs_network_seconds histogram" in lines
+    assert 'model_catalogs_cache_seconds_bucket{category="end",le="+Inf"} 1' in lines
+    assert 'model_catalogs_cache_seconds_count{category="compiled"} 0' in lines
+
+    mc.metrics_clear()
+    assert mc.metrics()["cache"]["file_locs"]["hits"] == 0
+
+
+def test_missing(thredds_server, cache_paths, tmp_path, monkeypatch):
+    """Days without catref or files and servers that are down are remembered for a short time."""
+
+    cat = thredds_test_catalog(tmp_path, thredds_server)
+    source = cat["ncei-archive-noagg"]
+
+    # days that are not in any catalog
+    with pytest.warns(RuntimeWarning, match="not available"):
+        mc.select_date_range(source, "2023-1-1", "2023-1-2")
+    assert len(thredds_server.requests) > 0
+    thredds_server.requests.clear()
+    with pytest.warns(RuntimeWarning, match="not available"):
+        mc.select_date_range(source, "2023-1-1", "2023-1-2")
+    assert thredds_server.requests == []
+
+    # days without files in their catalog
+    source = mc.select_date_range(source, "2022-2-2", "2022-2-3")
+    assert len(source.urlpath) > 0
+    assert (
+        mc.cache.get("file_locs", "TEST", source.name, "2022-02-03_is-forecast_False")
+        is None
+    )
+    assert (
+        mc.cache.get("missing", "TEST", source.name, "2022-02-03_is-forecast_False")
+        == "no files"
+    )
+    with mock.patch.object(mc, "find_filelocs") as mock_find_filelocs:
+        mc.select_date_range(source, "2022-2-2", "2022-2-3")
+    mock_find_filelocs.assert_not_called()
+
+    # and they are looked for again once they are not fresh
+    monkeypatch.setitem(mc.FRESH, "missing", "0 seconds")
+    with mock.patch.object(
+        mc, "find_filelocs", wraps=mc.find_filelocs
+    ) as mock_find_filelocs:
+        mc.select_date_range(source, "2022-2-2", "2022-2-3")
+    mock_find_filelocs.assert_called()
+    monkeypatch.setitem(mc.FRESH, "missing", "5 minutes")
+
+    # a file that is not found doesn't mean that its server is down
+    up = "model-test/2022/01/nos.test.fields.n001.20220130.t00z.nc"
+    url = f"{thredds_server}/thredds/dodsC/model-test/2099/01/file.nc"
+    mc.utils._HEALTH.clear()
+    assert not mc.status(url, use_cache=False)
+    assert mc.cache.get("missing", *mc.utils._health_key(url), key="server") is None
+    thredds_server.requests.clear()
+    assert mc.status(f"{thredds_server}/thredds/dodsC/{up}")
+    assert len(thredds_server.requests) == 1
+    mc.utils._HEALTH.clear()
+    urls = [f"{thredds_server}/thredds/dodsC/{up}", url]
+    assert mc.status_many(urls) == [True, False]
+
+    # a server that is down is not checked again by other processes
+    url = f"{thredds_server}/thredds/dodsC/model-down/file.nc"
+    assert not mc.status(url, use_cache=False)
+    assert (
+        mc.cache.get("missing", *mc.utils._health_key(url), key="server") == "503 error"
+    )
+    mc.utils._HEALTH.clear()
+    thredds_server.requests.clear()
+    assert not mc.status(url)
+    assert thredds_server.requests == []
+
+    # until it is found to be up
+    assert mc.status(f"{thredds_server}/thredds/dodsC/{up}", use_cache=False)
+    mc.utils._HEALTH.clear()
+    assert mc.status(url) is False and len(thredds_server.requests) == 2
+
+
+def test_catalog_cache(thredds_server, monkeypatch):
+    """Thredds catalog pages are only read once while fresh."""
+
+    catloc = f"{thredds_server}/thredds/catalog/model-test/catalog.xml"
+    mc.catalog_cache_clear()
+
+    # root, year, and first month are read
+    catrefs = mc.find_catrefs(catloc)
+    assert mc.catalog_cache_info() == {
+        "hits": 0,
+        "misses": 3,
+        "size": 3,
+        "maxsize": mc.CATALOG_CACHE_SIZE,
+    }
+
+    # all catalogs on the way to the first month are already cached, and the files
+    # in the first month are cached separately
+    with mock.patch("model_catalogs.utils.TDSCatalog") as mock_catalog:
+        filelocs = mc.find_filelocs(catrefs[0], catloc)
+    mock_catalog.assert_not_called()
+    assert len(filelocs) == 2 * 4 * 6
+    assert mc.catalog_cache_info()["hits"] == 2
+    assert mc.find_filelocs(catrefs[0], catloc) == filelocs
+    assert mc.catalog_cache_info()["hits"] == 5
+
+    # least recently used catalogs are evicted when full
+    monkeypatch.setattr(mc, "CATALOG_CACHE_SIZE", 3)
+    mc.find_filelocs(catrefs[1], catloc)
+    assert mc.catalog_cache_info()["size"] == 3
+    assert catloc in mc.utils._CATALOGS
+    assert catrefs[1][1] in list(mc.utils._CATALOGS)[-1][1]
+
+    # catalogs are read again once they are not fresh
+    monkeypatch.setitem(mc.FRESH, "catalog", "0 seconds")
+    misses = mc.catalog_cache_info()["misses"]
+    mc.find_filelocs(catrefs[1], catloc)
+    assert mc.catalog_cache_info()["misses"] == misses + 3
+
+    mc.catalog_cache_clear()
+    assert mc.catalog_cache_info()["size"] == 0
+
+
+def test_find_catrefs_fan_out(thredds_server, capsys):
+    """Catalogs on a level are read concurrently and each is read once."""
+
+    catloc = f"{thredds_server}/thredds/catalog/model-test/catalog.xml"
+    mc.catalog_cache_clear()
+
+    with mock.patch(
+        "model_catalogs.utils.TDSCatalog", wraps=mc.utils.TDSCatalog
+    ) as mock_catalog, mock.patch(
+        "model_catalogs.utils.ThreadPoolExecutor", wraps=mc.utils.ThreadPoolExecutor
+    ) as mock_executor:
+        catrefs = mc.find_catrefs(catloc, max_workers=4, progress=True)
+
+    assert catrefs == [("2022", "01"), ("2022", "02"), ("2022", "03")]
+    urls = [call.args[0] for call in mock_catalog.call_args_list]
+    assert len(urls) == len(set(urls)) == 3
+    mock_executor.assert_called_once_with(max_workers=1)
+    assert "Level 1: read 1 of 1 catalogs" in capsys.readouterr().out
+
+    # with a level of day catalogs, each month catalog is also read once
+    catloc = f"{thredds_server}/thredds/catalog/model-test-daily/catalog.xml"
+    with mock.patch(
+        "model_catalogs.utils.TDSCatalog", wraps=mc.utils.TDSCatalog
+    ) as mock_catalog:
+        catrefs = mc.find_catrefs(catloc)
+    assert catrefs == [
+        ("2022", "01", "30"),
+        ("2022", "01", "31"),
+        ("2022", "02", "01"),
+        ("2022", "02", "02"),
+        ("2022", "03", "01"),
+    ]
+    urls = [call.args[0] for call in mock_catalog.call_args_list]
+    assert len(urls) == len(set(urls)) == 5
+    assert catrefs == asyncio.run(mc.afind_catrefs(catloc))
+
+
+def test_find_catrefs_incremental(thredds_server, cache_paths, tmp_path):
+    """Previously-found catrefs are updated by reading the edges of the catalog."""
+
+    # 2021 is no longer on the server, and months 02 and 03 are new
+    catloc = f"{thredds_server}/thredds/catalog/model-test/catalog.xml"
+    previous = [["2021", "12"], ["2022", "01"]]
+    with mock.patch(
+        "model_catalogs.utils.TDSCatalog", wraps=mc.utils.TDSCatalog
+    ) as mock_catalog:
+        catrefs = mc.find_catrefs(catloc, catrefs=previous)
+    assert catrefs == [("2022", "01"), ("2022", "02"), ("2022", "03")]
+    urls = [call.args[0] for call in mock_catalog.call_args_list]
+    assert urls == [catloc, catloc.replace("catalog.xml", "2022/catalog.xml")]
+
+    # month 02 is between the earliest and latest months, so its days are not read again
+    catloc = f"{thredds_server}/thredds/catalog/model-test-daily/catalog.xml"
+    previous = [
+        ("2021", "12", "31"),
+        ("2022", "01", "30"),
+        ("2022", "02", "01"),
+        ("2022", "03", "01"),
+    ]
+    mc.catalog_cache_clear()
+    with mock.patch(
+        "model_catalogs.utils.TDSCatalog", wraps=mc.utils.TDSCatalog
+    ) as mock_catalog:
+        catrefs = mc.find_catrefs(catloc, catrefs=previous)
+    expected = [
+        ("2022", "01", "30"),
+        ("2022", "01", "31"),
+        ("2022", "02", "01"),
+        ("2022", "03", "01"),
+    ]
+    assert catrefs == expected
+    urls = [call.args[0] for call in mock_catalog.call_args_list]
+    assert len(urls) == 4
+    assert not any("2022/02" in url for url in urls)
+    assert asyncio.run(mc.afind_catrefs(catloc, catrefs=previous)) == expected
+
+    # stale catrefs saved for a source are updated unless override is True
+    source = thredds_test_catalog(tmp_path, thredds_server)["ncei-archive-noagg"]
+    source = mc.select_date_range(source, start_date="2022-1-31", end_date="2022-1-31")
+    assert mc.model_catalogs._read_catrefs(source) == [
+        ("2022", "01"),
+        ("2022", "02"),
+        ("2022", "03"),
+    ]
+    with mc.cache.connection() as con:
+        con.execute("UPDATE entries SET saved = 0 WHERE category = 'catrefs'")
+    with mock.patch(
+        "model_catalogs.find_catrefs", wraps=mc.utils.find_catrefs
+    ) as mock_find:
+        mc.model_catalogs.find_datetimes(source, True, False)
+        mc.model_catalogs.find_datetimes(source, True, False, override=True)
+    assert mock_find.call_args_list[0].kwargs["catrefs"] == [
+        ("2022", "01"),
+        ("2022", "02"),
+        ("2022", "03"),
+    ]
+    assert mock_find.call_args_list[1].kwargs["catrefs"] is None
+
+
+@pytest.mark.parametrize("n_empty", [0, 1, 2, 5, 6, 99, 100])
+def test_search_first_populated(n_empty):
+    """First catref with files is found with a logarithmic number of checks."""
+
+    n = 100
+    search = mc.model_catalogs._search_first_populated(n)
+    checked = []
+    try:
+        i = next(search)
+        while True:
+            checked.append(i)
+            i = search.send(i >= n_empty)
+    except StopIteration as stop:
+        found = stop.value
+
+    assert found == (n_empty if n_empty < n else None)
+    assert len(checked) == len(set(checked))
+    assert len(checked) <= 2 * np.log2(n) + 2
+    if n_empty == 0:
+        assert checked == [0]
+
+
+def test_http_cache(thredds_server, monkeypatch):
+    """Catalogs that haven't changed on the server are not downloaded or parsed again."""
+
+    catloc = f"{thredds_server}/thredds/catalog/model-test/catalog.xml"
+    catref = ("2022", "01")
+    mc.catalog_cache_clear()
+    filelocs = mc.find_filelocs(catref, catloc)
+    assert [status for _, status in thredds_server.requests] == [200, 200, 200]
+    fname_content, fname_validators = mc.FILE_PATH_HTTP(catloc)
+    assert fname_content.is_file()
+    assert mc.utils._http_cache_headers(catloc)["If-None-Match"].startswith('"')
+    # the catalog listing the files is saved as it is parsed
+    from model_catalogs.tests.conftest import thredds_catalog_xml
+
+    files_catloc = f"{thredds_server}/thredds/catalog/model-test/2022/01/catalog.xml"
+    assert mc.FILE_PATH_HTTP(files_catloc)[0].read_text() == thredds_catalog_xml(
+        "/thredds/catalog/model-test/2022/01/catalog.xml"
+    )
+    assert list(mc.CACHE_PATH_HTTP.glob(".*")) == []
+
+    # catalogs held in memory are used again without being parsed
+    monkeypatch.setitem(mc.FRESH, "catalog", "0 seconds")
+    thredds_server.requests.clear()
+    with mock.patch("model_catalogs.utils.TDSCatalog") as mock_catalog:
+        assert mc.find_filelocs(catref, catloc) == filelocs
+    mock_catalog.assert_not_called()
+    assert [status for _, status in thredds_server.requests] == [304, 304, 304]
+
+    # a new process gets the saved catalog xml without downloading it
+    mc.catalog_cache_clear()
+    thredds_server.requests.clear()
+    assert mc.find_filelocs(catref, catloc) == filelocs
+    assert [status for _, status in thredds_server.requests] == [304, 304, 304]
+
+    # same for the coroutine version
+    mc.catalog_cache_clear()
+    thredds_server.requests.clear()
+    assert asyncio.run(mc.aio.afind_filelocs(catref, catloc)) == filelocs
+    assert asyncio.run(mc.aio.afind_filelocs(catref, catloc)) == filelocs
+    assert [status for _, status in thredds_server.requests] == [304] * 6
+
+    # a saved response that is removed after it was requested is requested again
+    http_cache_headers = mc.utils._http_cache_headers
+
+    def headers_then_remove(url):
+        headers = http_cache_headers(url)
+        for fname in mc.FILE_PATH_HTTP(url):
+            fname.unlink(missing_ok=True)
+        return headers
+
+    mc.catalog_cache_clear()
+    thredds_server.requests.clear()
+    with mock.patch(
+        "model_catalogs.utils._http_cache_headers", side_effect=headers_then_remove
+    ):
+        assert mc.find_filelocs(catref, catloc) == filelocs
+    assert [status for _, status in thredds_server.requests] == [304, 200] * 3
+
+    # a catalog that changed is read from the response to the conditional request
+    thredds_server.missing.add("nos.test.fields.n001.20220130.t00z.nc")
+    thredds_server.requests.clear()
+    assert len(mc.find_filelocs(catref, catloc)) == len(filelocs) - 1
+    assert [status for _, status in thredds_server.requests] == [304, 304, 200]
+    thredds_server.missing.clear()
+
+    # nothing is saved if turned off
+    monkeypatch.setattr(mc, "HTTP_CACHE_DISK", False)
+    mc.catalog_cache_clear()
+    thredds_server.requests.clear()
+    assert mc.find_filelocs(catref, catloc) == filelocs
+    assert [status for _, status in thredds_server.requests] == [200, 200, 200]
+
+
+def test_select_date_range_lists_catalogs_once(thredds_server, cache_paths, tmp_path):
+    """Each catalog is listed once for all the days in it."""
+
+    source = thredds_test_catalog(tmp_path, thredds_server)["ncei-archive-noagg"]
+    catloc = source.metadata["catloc"]
+    with mock.patch(
+        "model_catalogs.find_filelocs", wraps=mc.utils.find_filelocs
+    ) as mock_filelocs:
+        source = mc.select_date_range(
+            source, start_date="2022-1-30", end_date="2022-2-2"
+        )
+    assert [call.args[0] for call in mock_filelocs.call_args_list] == [
+        ("2022", "01"),
+        ("2022", "02"),
+    ]
+
+    # same files as selecting each day from the whole catalog listing
+    expected = []
+    for date in pd.date_range("2022-1-30", "2022-2-3"):
+        filelocs = mc.find_filelocs((date.strftime("%Y"), date.strftime("%m")), catloc)
+        expected.extend(mc.agg_for_date(date, filelocs, "fields"))
+    df = mc.filedates2df(expected)["2022-1-30":"2022-2-2"]
+    assert source.urlpath == list(pd.unique(df["filenames"]))
+
+
+def test_select_date_range_lists_days(thredds_server, cache_paths, tmp_path):
+    """Catalogs organized by day are listed once per day, without searching for the catrefs."""
+
+    root = "model-test-daily"
+    catloc = f"{thredds_server}/thredds/catalog/{root}/catalog.xml"
+
+    # days are listed the first time, and the latest nowcast day becomes the template
+    source = thredds_test_catalog(tmp_path, thredds_server, root)["ncei-archive-noagg"]
+    mc.select_date_range(source, start_date="2022-1-30", end_date="2022-1-30")
+    template = mc.model_catalogs._read_file_template(source, "ncei-archive-noagg")
+    assert len(template) == 4 * 6
+    assert (
+        template[0]
+        == f"{thredds_server}/thredds/dodsC/{root}/{{date:%Y}}/{{date:%m}}/{{date:%d}}/nos.test.fields.n001.{{date:%Y%m%d}}.t00z.nc"  # noqa: E501
+    )
+
+    # then the catalog of each day is listed once, and no file is requested
+    thredds_server.requests.clear()
+    source = thredds_test_catalog(tmp_path, thredds_server, root)["ncei-archive-noagg"]
+    source = mc.select_date_range(source, start_date="2022-2-1", end_date="2022-2-1")
+    assert not any(path.endswith(".das") for path, _ in thredds_server.requests)
+    assert [path for path, _ in thredds_server.requests if "/2022/02/0" in path] == [
+        f"/thredds/catalog/{root}/2022/02/01/catalog.xml",
+        f"/thredds/catalog/{root}/2022/02/02/catalog.xml",
+    ]
+
+    expected = []
+    for date in pd.date_range("2022-2-1", "2022-2-2"):
+        filelocs = mc.find_filelocs(tuple(date.strftime("%Y %m %d").split()), catloc)
+        expected.extend(mc.agg_for_date(date, filelocs, "fields"))
+    df = mc.filedates2df(expected)["2022-2-1":"2022-2-1"]
+    assert source.urlpath == list(pd.unique(df["filenames"]))
+
+    # the coroutine lists the same catalogs
+    with mc.cache.connection() as con:
+        con.execute("DELETE FROM entries WHERE key >= '2022-02-01'")
+    mc.catalog_cache_clear()
+    thredds_server.requests.clear()
+    source = thredds_test_catalog(tmp_path, thredds_server, root)["ncei-archive-noagg"]
+    source = asyncio.run(
+        mc.aselect_date_range(source, start_date="2022-2-1", end_date="2022-2-1")
+    )
+    assert not any(path.endswith(".das") for path, _ in thredds_server.requests)
+    assert sorted(
+        path for path, _ in thredds_server.requests if "/2022/02/0" in path
+    ) == [
+        f"/thredds/catalog/{root}/2022/02/01/catalog.xml",
+        f"/thredds/catalog/{root}/2022/02/02/catalog.xml",
+    ]
+    assert source.urlpath == list(pd.unique(df["filenames"]))
+
+    # a day with a missing file in the middle has the files that are listed
+    with mc.cache.connection() as con:
+        con.execute("DELETE FROM entries WHERE key >= '2022-02-01'")
+    thredds_server.missing.add("nos.test.fields.n003.20220201.t06z.nc")
+    mc.catalog_cache_clear()
+    thredds_server.requests.clear()
+    source = thredds_test_catalog(tmp_path, thredds_server, root)["ncei-archive-noagg"]
+    source = mc.select_date_range(source, start_date="2022-2-1", end_date="2022-2-1")
+    assert (
+        f"/thredds/catalog/{root}/2022/02/01/catalog.xml",
+        200,
+    ) in thredds_server.requests
+    assert not any("n003.20220201.t06z" in fileloc for fileloc in source.urlpath)
+    assert len(source.urlpath) == len(df["filenames"].unique()) - 1
+    thredds_server.missing.clear()
+
+    # a day that is not found is looked for in the catrefs instead
+    source = thredds_test_catalog(tmp_path, thredds_server, root)["ncei-archive-noagg"]
+    with pytest.warns(RuntimeWarning):
+        mc.select_date_range(source, start_date="2022-2-2", end_date="2022-2-2")
+    assert mc.model_catalogs._missing_days(
+        source, "ncei-archive-noagg", [(pd.Timestamp("2022-2-3"), False)]
+    ) == {(pd.Timestamp("2022-2-3"), False): "no catref"}
+
+
+def test_parse_thredds_catalog():
+    """Catalog xml is parsed into catalog references and filtered OPeNDAP locations."""
+
+    from model_catalogs.tests.conftest import thredds_catalog_xml
+
+    url = "https://example.com/thredds/catalog/model-test/2022/01/catalog.xml"
+    xml = thredds_catalog_xml("/thredds/catalog/model-test/2022/01/catalog.xml")
+
+    refs, datasets = mc.utils._parse_thredds_catalog(xml, url)
+    assert refs == {}
+    assert len(datasets) == 2 * 4 * 7
+    refs, datasets = mc.utils._parse_thredds_catalog(xml, url, "fields")
+    assert len(datasets) == 2 * 4 * 6
+    assert (
+        datasets["nos.test.fields.n001.20220130.t00z.nc"]
+        == "https://example.com/thredds/dodsC/model-test/2022/01/nos.test.fields.n001.20220130.t00z.nc"
+    )
+
+    # same as siphon
+    with mock.patch("siphon.catalog.session_manager.create_session") as mock_session:
+        mock_session.return_value.get.return_value = mock.Mock(
+            url=url, content=xml.encode(), headers={"content-type": "application/xml"}
+        )
+        cat = mc.utils.TDSCatalog(url)
+    assert list(datasets.values()) == [
+        cat.datasets[name].access_urls["OPENDAP"]
+        for name in cat.datasets
+        if mc.utils._is_model_output(name, "fields")
+    ]
+
+    # chunks of xml are parsed as they are read
+    chunks = [xml.encode()[i : i + 100] for i in range(0, len(xml), 100)]
+    assert mc.utils._parse_thredds_catalog(iter(chunks), url, "fields") == (
+        refs,
+        datasets,
+    )
+
+    # each dataset uses the OPeNDAP service of its own or inherited service name
+    xml = """<?xml version="1.0" encoding="UTF-8"?>
+    <catalog xmlns="http://www.unidata.ucar.edu/namespaces/thredds/InvCatalog/v1.0">
+      <service name="http" serviceType="HTTPServer" base="/thredds/fileServer/" />
+      <service name="odap" serviceType="OpenDAP" base="/thredds/dodsC/" />
+      <service name="all" serviceType="Compound" base="">
+        <service name="hdap" serviceType="HTTPServer" base="/thredds/fileServer/" />
+        <service name="dap2" serviceType="OPENDAP" base="/thredds/dap2/" />
+      </service>
+      <dataset name="files">
+        <metadata inherited="true"><serviceName>all</serviceName></metadata>
+        <dataset name="a.nc" urlPath="a.nc" />
+        <dataset name="b.nc" urlPath="b.nc"><serviceName>odap</serviceName></dataset>
+        <dataset name="c.nc" urlPath="c.nc" serviceName="http" />
+      </dataset>
+      <dataset name="d.nc" urlPath="d.nc" />
+    </catalog>
+    """
+    refs, datasets = mc.utils._parse_thredds_catalog(xml, url)
+    assert datasets == {
+        "a.nc": "https://example.com/thredds/dap2/a.nc",
+        "b.nc": "https://example.com/thredds/dodsC/b.nc",
+        "d.nc": "https://example.com/thredds/dodsC/d.nc",
+    }
+
+    url = "https://example.com/thredds/catalog/model-test/catalog.xml"
+    xml = thredds_catalog_xml("/thredds/catalog/model-test/catalog.xml")
+    refs, datasets = mc.utils._parse_thredds_catalog(xml, url)
+    assert refs == {
+        "2022": "https://example.com/thredds/catalog/model-test/2022/catalog.xml",
+        "docs": "https://example.com/thredds/catalog/model-test/docs/catalog.xml",
+    }
+    assert datasets == {}
+
+
+@pytest.mark.parametrize("kind", ["directory", "fsspec"])
+def test_cache_backend(kind, thredds_server, cache_paths, tmp_path, monkeypatch):
+    """Information found by one machine is used by others that share the backend."""
+
+    if kind == "directory":
+        setting = tmp_path / "shared"
+    else:
+        setting = f"memory://{tmp_path.name}"
+    monkeypatch.setattr(mc, "CACHE_BACKEND", setting)
+    backend = mc.cache.backend()
+    assert isinstance(
+        backend,
+        mc.cache.DirectoryBackend if kind == "directory" else mc.cache.FsspecBackend,
+    )
+
+    def other_machine(name):
+        path = tmp_path / name
+        monkeypatch.setattr(mc, "CACHE_PATH_DB", path / "cache.sqlite")
+        monkeypatch.setattr(mc, "CACHE_PATH_COMPILED", path / "compiled")
+        mc.status_cache_clear()
+        mc.catalog_cache_clear()
+        thredds_server.requests.clear()
+
+    other_machine("first")
+    fname = tmp_path / "test_catalog.yaml"
+    thredds_test_catalog(tmp_path, thredds_server)
+    source = mc.setup(fname, boundaries=False)["TEST"]["ncei-archive-noagg"]
+    source = mc.select_date_range(source, "2022-1-31", "2022-2-1")
+    assert len(thredds_server.requests) > 0
+    assert not mc.CACHE_PATH_DB.exists()
+    assert mc.cache.get("catrefs", "TEST", source.name) is not None
+
+    # a second machine doesn't compile the catalog or read thredds catalogs again
+    other_machine("second")
+    with mock.patch.object(mc.model_catalogs, "open_catalog") as mock_open_catalog:
+        source2 = mc.setup(fname, boundaries=False)["TEST"]["ncei-archive-noagg"]
+    mock_open_catalog.assert_not_called()
+    assert mc.is_fresh(mc.FILE_PATH_COMPILED("TEST"))
+    source2 = mc.select_date_range(source2, "2022-1-31", "2022-2-1")
+    assert source2.urlpath == source.urlpath
+    # only the status of the server is checked
+    assert [path for path, _ in thredds_server.requests if path.endswith(".xml")] == [
+        "/thredds/catalog/model-test/catalog.xml"
+    ]
+
+    # boundaries are shared too
+    boundaries = tmp_path / "boundaries.json"
+    mc.cache.dump({"bbox": [0, 1, 2, 3]}, boundaries)
+    mc.cache.share("boundaries", "test", boundaries)
+    boundaries2 = mc.cache.fetch("boundaries", "test", tmp_path / "second" / "test")
+    assert mc.cache.load(boundaries2) == {"bbox": [0, 1, 2, 3]}
+    assert mc.cache.fetch("boundaries", "other", tmp_path / "other") is None
+
+    info = mc.cache_info()
+    assert info["catrefs"]["entries"] == 1 and info["file_locs"]["entries"] == 3
+    assert info["files"]["entries"] == 2
+    mc.cache.delete("file_locs", "TEST")
+    assert mc.cache.get_range("file_locs", "TEST", source.name, "", "~") == {}
+    assert mc.cache_prune({"max_entries": 0})["catrefs"] == 1
+    assert backend.entries() == []
+    if kind == "directory":
+        assert (setting / "locks").is_dir()
+
+    # backends that don't implement all methods can't be made
+    class Incomplete(mc.cache.Backend):
+        def get_range(self, category, model, model_source, first, last):
+            return {}
+
+    with pytest.raises(TypeError, match="abstract"):
+        Incomplete()
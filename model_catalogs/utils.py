@@ -2,18 +2,31 @@
 Utilities to help with catalogs.
 """
 
+import contextlib
+import copy
 import fnmatch
+import functools
+import os
 import pathlib
 import re
+import threading
+import time
+import warnings
+
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+from xml.etree import ElementTree
 
 import cf_xarray  # noqa
 import numpy as np
 import pandas as pd
 import requests
-import yaml
 
 from intake.catalog import Catalog
+from requests.adapters import HTTPAdapter
 from siphon.catalog import TDSCatalog
+from siphon.http_util import session_manager
 
 import model_catalogs as mc
 
@@ -32,13 +45,596 @@ def astype(value, type_):
     return value
 
 
-def status(urlpath, suffix=".das"):
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Request was not sent because the circuit breaker for its host is open."""
+
+
+# circuit breaker state by host: [failures in a row, time circuit was opened]
+_CIRCUITS = {}
+_CIRCUITS_LOCK = threading.Lock()
+
+
+def _circuit_allow(host):
+    """Return False if requests to host should fail fast."""
+
+    cooldown = pd.Timedelta(mc.HTTP["circuit_cooldown"]).total_seconds()
+    with _CIRCUITS_LOCK:
+        failures, opened = _CIRCUITS.get(host, (0, None))
+        # after cooldown, let requests through again; one more failure reopens the circuit
+        return opened is None or time.time() - opened >= cooldown
+
+
+def _circuit_record(host, success):
+    """Record a successful or failed request to host."""
+
+    with _CIRCUITS_LOCK:
+        if success:
+            _CIRCUITS.pop(host, None)
+            return
+        failures, opened = _CIRCUITS.get(host, (0, None))
+        failures += 1
+        if failures >= mc.HTTP["circuit_failures"]:
+            opened = time.time()
+        _CIRCUITS[host] = (failures, opened)
+
+
+def circuit_open(urlpath):
+    """Check if the circuit breaker is open for the host of urlpath.
+
+    After ``mc.HTTP["circuit_failures"]`` failed requests in a row to a host (connection errors, timeouts, or server errors), requests to it fail fast with ``CircuitOpenError`` for ``mc.HTTP["circuit_cooldown"]``.
+
+    Parameters
+    ----------
+    urlpath : str
+        Location on the host to check.
+
+    Returns
+    -------
+    bool
+        If True, requests to the host currently fail fast.
+    """
+
+    return not _circuit_allow(urlsplit(urlpath).netloc)
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with default timeouts and a circuit breaker per host, whose connection pools outlive the sessions it is mounted on.
+
+    siphon creates a new ``requests.Session`` for every ``TDSCatalog`` and closes it when the catalog is garbage collected, so ``close`` is a no-op here to keep the shared pools alive.
+    """
+
+    def send(self, request, timeout=None, **kwargs):
+        """Send request, using the default timeouts if none are given.
+
+        A response already received for the url in this thread with ``_received()`` is returned instead of sending the request again.
+        """
+
+        received = getattr(_RECEIVED, "responses", {}).pop(request.url, None)
+        if received is not None:
+            return received
+
+        cacheable = request.method == "GET" and _http_cacheable(request.url)
+        if cacheable:
+            request.headers.update(_http_cache_headers(request.url))
+
+        resp = self._send(request, timeout, **kwargs)
+
+        if cacheable:
+            cached = _http_cache_update(request.url, resp.status_code, resp.headers)
+            if resp.status_code == 304 and cached is None:
+                # the saved response was removed after the request was made, such as by
+                # mc.cache_prune(), so it is requested again without the validators
+                resp.close()
+                for name in ["If-None-Match", "If-Modified-Since"]:
+                    request.headers.pop(name, None)
+                resp = self._send(request, timeout, **kwargs)
+
+            resp.not_modified = resp.status_code == 304
+            validators = _http_cache_validators(request.url, resp.headers)
+            if resp.status_code == 200 and validators is not None:
+                # the body is saved as it is read, instead of being read here
+                resp.raw = _CachingBody(resp.raw, request.url, validators)
+            # present the cached response as if it had been sent again
+            if resp.not_modified and cached is not None:
+                content, content_type = cached
+                resp.status_code, resp.reason = 200, "OK"
+                resp._content, resp._content_consumed = content, True
+                resp.headers["Content-Type"] = content_type
+                resp.headers["Content-Length"] = str(len(content))
+        return resp
+
+    def _send(self, request, timeout, **kwargs):
+        """Send request through the circuit breaker of its host."""
+
+        host = urlsplit(request.url).netloc
+        if not _circuit_allow(host):
+            raise CircuitOpenError(
+                f"Circuit breaker is open for {host} after repeated failures.",
+                request=request,
+            )
+
+        if timeout is None:
+            timeout = (mc.HTTP["connect_timeout"], mc.HTTP["read_timeout"])
+        try:
+            resp = super().send(request, timeout=timeout, **kwargs)
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ):
+            _circuit_record(host, success=False)
+            raise
+        _circuit_record(host, success=resp.status_code < 500)
+        return resp
+
+    def close(self):
+        """Keep connection pools open for other sessions."""
+        pass
+
+
+# responses by url that answer the next request of the url in each thread, see _received()
+_RECEIVED = threading.local()
+
+
+@contextlib.contextmanager
+def _received(url, resp):
+    """Answer the next request of url in this thread with resp, for example when siphon requests a catalog that was already downloaded."""
+
+    prepared = requests.PreparedRequest()
+    prepared.prepare_url(url, None)
+    _RECEIVED.responses = {prepared.url: resp}
+    try:
+        yield
+    finally:
+        _RECEIVED.responses = {}
+
+
+def _http_cacheable(url):
+    """Whether responses from url are saved with their validators: thredds catalog xml."""
+    return mc.HTTP_CACHE_DISK and urlsplit(url).path.endswith(".xml")
+
+
+def _http_cache_load(url):
+    """Return cached validators of url, or None if there is no cached response."""
+
+    fname_content, fname_validators = mc.FILE_PATH_HTTP(url)
+    if not fname_content.is_file():
+        return None
+    try:
+        return mc.cache.load(fname_validators)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _http_cache_headers(url):
+    """Return headers to request url conditionally on it having changed since cached."""
+
+    validators = _http_cache_load(url)
+    if validators is None:
+        return {}
+
+    headers = {}
+    if validators.get("etag") is not None:
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified") is not None:
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def _http_cache_validators(url, headers):
+    """Return validators to save with a response of url with headers, or None if it has none."""
+
+    validators = {
+        "url": url,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "content_type": headers.get("Content-Type", "application/xml"),
+    }
+    if validators["etag"] is None and validators["last_modified"] is None:
+        return None
+    return validators
+
+
+def _http_cache_save(url, validators, content):
+    """Save content of a response of url with its validators."""
+
+    fname_content, fname_validators = mc.FILE_PATH_HTTP(url)
+    with mc.cache.atomic_open(fname_content, "wb") as outfile:
+        outfile.write(content)
+    mc.cache.dump(validators, fname_validators)
+
+
+class _CachingBody:
+    """Body of a response that is saved with its validators as it is read, in place of ``requests.Response.raw``.
+
+    What is read is written to a temporary file, which replaces the saved content of url once the body has been read to the end, and is removed if it isn't.
+    """
+
+    def __init__(self, raw, url, validators):
+        self._raw, self._url, self._validators = raw, url, validators
+        self._fname = mc.FILE_PATH_HTTP(url)[0]
+        self._tmp = self._fname.with_name(
+            f".{self._fname.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        self._file = open(self._tmp, "wb")
+
+    def __getattr__(self, name):
+        """Return attribute of the body that is read."""
+        return getattr(self._raw, name)
+
+    def read(self, amt=None, decode_content=True, **kwargs):
+        """Read and save up to amt bytes of the body, decoded, or all of it."""
+
+        try:
+            data = self._raw.read(amt, decode_content=True, **kwargs)
+        except BaseException:
+            self._discard()
+            raise
+        if self._file is not None:
+            self._file.write(data)
+            if amt is None or len(data) == 0:
+                self._finish()
+        return data
+
+    def stream(self, amt=2**16, decode_content=True):
+        """Yield chunks of the body until it has been read, as ``urllib3.HTTPResponse.stream()``."""
+
+        while True:
+            data = self.read(amt)
+            if len(data) == 0:
+                break
+            yield data
+
+    def close(self):
+        """Close the body, without saving it if it wasn't read to the end."""
+        self._discard()
+        self._raw.close()
+
+    def _finish(self):
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp, self._fname)
+        mc.cache.dump(self._validators, mc.FILE_PATH_HTTP(self._url)[1])
+
+    def _discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._tmp.unlink(missing_ok=True)
+
+
+def _http_cache_update(url, status_code, headers, content=None):
+    """Update cached response of url with a response.
+
+    A 200 response is saved if it has validators and content is input; without content, as in ``_PooledHTTPAdapter``, it is saved by ``_CachingBody`` as it is read. For a 304 Not Modified response the cached files are touched, which refreshes their freshness.
+
+    Returns
+    -------
+    tuple or None
+        For a 304 response, cached content and its content type, otherwise None.
+    """
+
+    fname_content, fname_validators = mc.FILE_PATH_HTTP(url)
+
+    if status_code == 200:
+        validators = _http_cache_validators(url, headers)
+        if validators is not None and content is not None:
+            _http_cache_save(url, validators, content)
+
+    elif status_code == 304:
+        validators = _http_cache_load(url)
+        if validators is not None:
+            fname_content.touch()
+            # saved again rather than touched in case it was saved in an older format
+            mc.cache.dump(validators, fname_validators)
+            return fname_content.read_bytes(), validators["content_type"]
+
+    return None
+
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session():
+    """Return process-wide HTTP session.
+
+    The session keeps connections alive in a pool per host, so the handshake cost of each server is paid once per process. It accepts gzip-encoded responses and applies the timeouts and circuit breaker (see ``circuit_open()``) in ``mc.HTTP`` to every request. siphon is set up to mount the same connection pools on the sessions it creates for ``TDSCatalog``, so THREDDS catalog crawling shares them too.
+
+    Returns
+    -------
+    requests.Session
+        Session with pooled, keep-alive connections.
+    """
+
+    global _SESSION
+
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            adapter = _PooledHTTPAdapter(
+                pool_connections=mc.HTTP["pool_connections"],
+                pool_maxsize=mc.HTTP["pool_maxsize"],
+                max_retries=mc.HTTP["max_retries"],
+                pool_block=True,
+            )
+            session = requests.Session()
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+            # sessions siphon creates are given these attributes
+            session_manager.set_session_options(adapters=session.adapters)
+
+            _SESSION = session
+
+    return _SESSION
+
+
+# thredds catalogs by url: (catalog, time read), least recently used first
+_CATALOGS = OrderedDict()
+_CATALOGS_STATS = {"hits": 0, "misses": 0}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def _catalog_cache_get(key, stale=False):
+    """Return catalog cached under key if fresh, otherwise None.
+
+    Use `stale=True` to return the catalog even if it isn't fresh anymore, to use it again if it hasn't changed on the server.
+    """
+
+    ttl = pd.Timedelta(mc.FRESH["catalog"]).total_seconds()
+
+    with _CATALOGS_LOCK:
+        if key in _CATALOGS and (stale or time.time() - _CATALOGS[key][1] < ttl):
+            _CATALOGS.move_to_end(key)
+            if not stale:
+                _CATALOGS_STATS["hits"] += 1
+            return _CATALOGS[key][0]
+        if not stale:
+            _CATALOGS_STATS["misses"] += 1
+    return None
+
+
+def _catalog_cache_put(key, catalog):
+    """Cache catalog under key, evicting the least recently used catalogs if full."""
+
+    with _CATALOGS_LOCK:
+        _CATALOGS[key] = (catalog, time.time())
+        _CATALOGS.move_to_end(key)
+        while len(_CATALOGS) > mc.CATALOG_CACHE_SIZE:
+            _CATALOGS.popitem(last=False)
+
+
+def catalog_cache_info():
+    """Return information about the cache of thredds catalogs.
+
+    Returns
+    -------
+    dict
+        Number of cache "hits" and "misses" in this process, the number of catalogs held in memory ("size"), and ``mc.CATALOG_CACHE_SIZE`` ("maxsize").
+    """
+
+    with _CATALOGS_LOCK:
+        info = dict(_CATALOGS_STATS)
+        info["size"] = len(_CATALOGS)
+    info["maxsize"] = mc.CATALOG_CACHE_SIZE
+    return info
+
+
+def catalog_cache_clear():
+    """Forget thredds catalogs held in memory and reset hit/miss counts."""
+
+    with _CATALOGS_LOCK:
+        _CATALOGS.clear()
+        _CATALOGS_STATS.update({"hits": 0, "misses": 0})
+
+
+def _cached_catalog(key, url, read):
+    """Return catalog read from url, remembered under key.
+
+    Catalogs are remembered for ``mc.FRESH["catalog"]``, up to ``mc.CATALOG_CACHE_SIZE`` of them, so each catalog page is only requested once in that time. After that, the remembered catalog is used again without downloading or parsing it if the server responds that it has not been modified, and otherwise read from the response of that request.
+
+    Parameters
+    ----------
+    key : hashable
+        Key for the catalog in the cache.
+    url : str
+        Location of catalog.
+    read : function
+        Called without arguments to read the catalog if it isn't in the cache, by requesting url.
+    """
+
+    catalog = _catalog_cache_get(key)
+    if catalog is None:
+        previous = _catalog_cache_get(key, stale=True)
+        with _timed_request("catalog"):
+            resp = _revalidate(url) if previous is not None else None
+            if resp is not None and resp.not_modified:
+                catalog = previous
+            elif resp is not None:
+                # the catalog changed, so it is read from the response of the request
+                with _received(url, resp):
+                    catalog = read()
+            else:
+                catalog = read()
+        _catalog_cache_put(key, catalog)
+    return catalog
+
+
+def _tds_catalog(catloc):
+    """Open siphon TDSCatalog at catloc, using the pooled connections and the catalog cache."""
+
+    def read():
+        get_session()
+        return TDSCatalog(catloc)
+
+    return _cached_catalog(catloc, catloc, read)
+
+
+def _thredds_filelocs(catalog_url, filetype):
+    """Return OPeNDAP locations of model output files in thredds catalog, using the catalog cache.
+
+    The catalog is parsed as it is downloaded with ``_parse_thredds_catalog()`` instead of building siphon's full object tree, which matters for catalogs with thousands of files.
+    """
+
+    def read():
+        with get_session().get(catalog_url, stream=True) as resp:
+            resp.raise_for_status()
+            _, datasets = _parse_thredds_catalog(
+                resp.iter_content(2**16), resp.url, filetype
+            )
+        return list(datasets.values())
+
+    return _cached_catalog(("filelocs", catalog_url, filetype), catalog_url, read)
+
+
+def _revalidate(url):
+    """Request url conditionally on it having changed since it was cached.
+
+    Returns
+    -------
+    requests.Response or None
+        Response, whose ``not_modified`` is True if url has not been modified, or None if url isn't cached or the request failed.
+    """
+
+    if not _http_cacheable(url) or _http_cache_load(url) is None:
+        return None
+    try:
+        return get_session().get(url)
+    except requests.exceptions.RequestException:
+        return None
+
+
+# server status by (host, endpoint): (status, time checked)
+_HEALTH = {}
+_HEALTH_STATS = {"hits": 0, "misses": 0}
+_HEALTH_LOCK = threading.Lock()
+
+
+def _health_key(urlpath):
+    """Return (host, endpoint) for urlpath, or None if it is not a web address.
+
+    The endpoint is the service part of the path, for example "/thredds/dodsC".
+    """
+
+    parts = urlsplit(urlpath)
+    if parts.scheme not in ("http", "https"):
+        return None
+    endpoint = "/".join(parts.path.split("/")[:3])
+    return parts.netloc, endpoint
+
+
+def _health_lookup(key):
+    """Return cached server status for key if fresh, otherwise None.
+
+    A server that is down is remembered for ``mc.FRESH["missing"]`` instead of ``mc.FRESH["status"]``, and also by other processes through ``mc.cache``.
+    """
+
+    with _HEALTH_LOCK:
+        if key in _HEALTH:
+            status, checked = _HEALTH[key]
+            mu = mc.FRESH["status"] if status else mc.FRESH["missing"]
+            if time.time() - checked < pd.Timedelta(mu).total_seconds():
+                _HEALTH_STATS["hits"] += 1
+                return status
+
+    fname = mc.FILE_PATH_STATUS(*key)
+    if mc.STATUS_CACHE_DISK and is_fresh(fname):
+        try:
+            status = mc.cache.load(fname)["status"]
+            checked = fname.stat().st_mtime
+        except (FileNotFoundError, ValueError, TypeError, KeyError):
+            pass
+        else:
+            with _HEALTH_LOCK:
+                _HEALTH[key] = (status, checked)
+                _HEALTH_STATS["hits"] += 1
+            return status
+
+    # found to be down by another process
+    if mc.cache.get("missing", *key, key="server", mu=mc.FRESH["missing"]) is not None:
+        with _HEALTH_LOCK:
+            _HEALTH_STATS["hits"] += 1
+        return False
+
+    with _HEALTH_LOCK:
+        _HEALTH_STATS["misses"] += 1
+    return None
+
+
+def _server_status(status_code):
+    """Return whether the server of a response with status_code works, or None if the response doesn't say.
+
+    A file that is not found (e.g., 404) is about that url, not its server, so only 200 and server errors (5xx) are used for the status of the server.
+    """
+
+    if status_code == 200:
+        return True
+    if status_code >= 500:
+        return False
+    return None
+
+
+def _health_record(key, status, reason=None):
+    """Remember server status for key, saving in ``mc.cache`` that it is down for other processes.
+
+    Only call this with a status from ``_server_status()`` or after a failed request: since what is saved is shared with other processes, and other machines with ``mc.CACHE_BACKEND``, a server must not be saved as down because one file was not found. reason, such as "503 error", is what is saved for a server that is down.
+    """
+
+    with _HEALTH_LOCK:
+        _HEALTH[key] = (status, time.time())
+
+    if not status:
+        mc.cache.put("missing", *key, reason or "server down", key="server")
+    elif mc.cache.get("missing", *key, key="server") is not None:
+        mc.cache.delete("missing", *key, key="server")
+
+    if mc.STATUS_CACHE_DISK:
+        mc.cache.dump({"status": status}, mc.FILE_PATH_STATUS(*key))
+
+
+def status_cache_info():
+    """Return information about the server status cache.
+
+    Returns
+    -------
+    dict
+        Number of cache "hits" and "misses" in this process, and the server statuses held in memory under "servers", by host and endpoint.
+    """
+
+    with _HEALTH_LOCK:
+        info = dict(_HEALTH_STATS)
+        info["servers"] = {
+            f"{host}{endpoint}": status
+            for (host, endpoint), (status, _) in _HEALTH.items()
+        }
+    return info
+
+
+def status_cache_clear():
+    """Forget server statuses held in memory and servers saved as down, and reset hit/miss counts.
+
+    Files in ``mc.CACHE_PATH_STATUS`` are left in place and expire on their own.
+    """
+
+    with _HEALTH_LOCK:
+        _HEALTH.clear()
+        _HEALTH_STATS.update({"hits": 0, "misses": 0})
+    mc.cache.delete("missing", key="server")
+
+
+def status(urlpath, suffix=".das", use_cache=True):
     """Check status of server for urlpath.
 
+    Server status is remembered by host and endpoint (e.g., "/thredds/dodsC") for ``mc.FRESH["status"]``, so sources on the same server are only checked once in that time. Only a response of 200 means the server works, and failed connections, timeouts, and server errors (5xx) that it is down; other responses such as 404 return False for urlpath without being remembered for the server. A server that is down is remembered for the shorter ``mc.FRESH["missing"]``, and saved with ``mc.cache`` so that other processes don't check it again in that time either. If ``mc.STATUS_CACHE_DISK`` is True, statuses are also saved under ``mc.CACHE_PATH_STATUS`` for other processes to use. Uses the pooled session from ``get_session()``.
+
     Parameters
     ----------
     urlpath : str
         Path to file location to check.
+    suffix : str, optional
+        Suffix to add to urlpath for the request. Defaults to ".das" for OPeNDAP.
+    use_cache : bool, optional
+        If False, check server regardless of a previously-found status. Defaults to True.
 
     Returns
     -------
@@ -46,14 +642,290 @@ def status(urlpath, suffix=".das"):
         If True, server was reachable.
     """
 
-    resp = requests.get(urlpath + suffix)
-    if resp.status_code != 200:
-        status = False
+    key = _health_key(urlpath)
+    if use_cache and key is not None:
+        status = _health_lookup(key)
+        if status is not None:
+            return status
+
+    start = time.perf_counter()
+    try:
+        resp = get_session().get(urlpath + suffix)
+    except requests.exceptions.RequestException as e:
+        status, server, reason = False, False, type(e).__name__
     else:
-        status = True
+        status, server = resp.status_code == 200, _server_status(resp.status_code)
+        reason = f"{resp.status_code} error"
+    _record_request("status", time.perf_counter() - start, error=not status)
+
+    if key is not None and server is not None:
+        _health_record(key, server, reason)
+
     return status
 
 
+def status_many(sources_or_urls, suffix=".das", max_workers=None):
+    """Check status of servers for many sources or urlpaths at once.
+
+    Requests are made concurrently with a bounded number of threads, so checking a whole catalog takes about as long as the slowest server. Only one request is made per server host and endpoint, as in ``status()``, unless it is not found, in which case the others of that server are checked themselves.
+
+    Parameters
+    ----------
+    sources_or_urls : Source, str, or list of Sources and/or strs
+        Sources of type ``DatasetTransform`` or urlpaths to check. For sources, the urlpath and suffix are determined as in ``source.status``, and ``source._status`` is filled in. Sources whose status is already known are not checked again.
+    suffix : str, optional
+        Suffix to add to urlpaths that are input as strings. Defaults to ".das" for OPeNDAP.
+    max_workers : int, optional
+        Maximum number of requests to make at once. Defaults to ``mc.HTTP["pool_maxsize"]``.
+
+    Returns
+    -------
+    list
+        bool for each input, in the same order. If True, server was reachable.
+
+    Examples
+    --------
+
+    Check all sources of a catalog:
+
+    >>> main_cat = mc.setup()
+    >>> cat = main_cat["CBOFS"]
+    >>> mc.status_many([cat[model_source] for model_source in list(cat)])
+    """
+
+    items = astype(sources_or_urls, list)
+    if max_workers is None:
+        max_workers = mc.HTTP["pool_maxsize"]
+
+    # determine requests in this thread since sources might need to pick their target
+    reqs = []
+    for item in items:
+        if isinstance(item, str):
+            reqs.append((item, suffix))
+        elif hasattr(item, "_status"):
+            reqs.append(None)
+        else:
+            reqs.append(item._status_request())
+
+    # only one request per server since status is shared by host and endpoint
+    keys = [None if req is None else _health_key(req[0]) or req for req in reqs]
+    unique = dict(zip(keys, reqs))
+    unique.pop(None, None)
+    if len(unique) > 0:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as executor:
+            results = dict(
+                zip(unique, executor.map(lambda req: status(*req), unique.values()))
+            )
+
+            # a url that is not found doesn't mean that its server is down, so the others
+            # of that server are checked too; those of servers that are down are not
+            # requested again since status() remembers them
+            others = list(
+                dict.fromkeys(
+                    req
+                    for key, req in zip(keys, reqs)
+                    if key is not None and not results[key] and req != unique[key]
+                )
+            )
+            rechecked = dict(
+                zip(others, executor.map(lambda req: status(*req), others))
+            )
+
+    statuses = []
+    for item, key, req in zip(items, keys, reqs):
+        if key is None:
+            statuses.append(item._status)
+            continue
+        result = rechecked.get(req, results[key])
+        if not isinstance(item, str):
+            item._status = result
+        statuses.append(result)
+
+    return statuses
+
+
+# categories of saved information and network operations that metrics are kept for
+METRICS_CATEGORIES = ["compiled", "boundaries", "catrefs", "start", "end", "file_locs"]
+METRICS_OPERATIONS = ["status", "catalog", "opendap"]
+
+_METRICS = {}
+_METRICS_LOCK = threading.Lock()
+
+
+def _histogram():
+    """Return empty histogram of seconds with the buckets of ``mc.METRICS_BUCKETS``."""
+
+    bounds = sorted(mc.METRICS_BUCKETS) + [float("inf")]
+    return {"count": 0, "sum": 0.0, "buckets": dict.fromkeys(bounds, 0)}
+
+
+def _metrics_reset():
+    """Set all metrics to zero. Call with ``_METRICS_LOCK`` held."""
+
+    _METRICS["cache"] = {
+        category: {"hits": 0, "misses": 0, "seconds": _histogram()}
+        for category in METRICS_CATEGORIES
+    }
+    _METRICS["network"] = {
+        operation: {"requests": 0, "errors": 0, "seconds": _histogram()}
+        for operation in METRICS_OPERATIONS
+    }
+
+
+def _observe(histogram, seconds):
+    """Add seconds to histogram, whose buckets count the observations up to their bound."""
+
+    histogram["count"] += 1
+    histogram["sum"] += seconds
+    for bound in histogram["buckets"]:
+        if seconds <= bound:
+            histogram["buckets"][bound] += 1
+
+
+def _record_cache(category, hits=0, misses=0, seconds=None):
+    """Count saved information of category that was used (hits) or found again (misses), and the seconds it took to find it."""
+
+    with _METRICS_LOCK:
+        if not _METRICS:
+            _metrics_reset()
+        metrics = _METRICS["cache"][category]
+        metrics["hits"] += int(hits)
+        metrics["misses"] += int(misses)
+        if seconds is not None:
+            _observe(metrics["seconds"], seconds)
+
+
+@contextlib.contextmanager
+def _timed_cache(category, misses=1):
+    """Count misses of saved information of category, and time finding it again in the block."""
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_cache(category, misses=misses, seconds=time.perf_counter() - start)
+
+
+def _record_request(operation, seconds, error=False):
+    """Count a request of network operation, whether it failed, and the seconds it took."""
+
+    with _METRICS_LOCK:
+        if not _METRICS:
+            _metrics_reset()
+        metrics = _METRICS["network"][operation]
+        metrics["requests"] += 1
+        metrics["errors"] += int(error)
+        _observe(metrics["seconds"], seconds)
+
+
+@contextlib.contextmanager
+def _timed_request(operation):
+    """Time the request of network operation in the block, which failed if it raises."""
+
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        _record_request(operation, time.perf_counter() - start, error=True)
+        raise
+    _record_request(operation, time.perf_counter() - start)
+
+
+def metrics():
+    """Return counts and timing of saved information and network requests in this process.
+
+    Use these to tune ``mc.FRESH``: many misses of a category with little time each means it could be fresh for longer, and few misses that take a long time are worth warming up with ``mc.warm_cache()``.
+
+    Returns
+    -------
+    dict
+        Under "cache", for each category of saved information ("compiled", "boundaries", "catrefs", "start", "end", "file_locs"): the number of "hits" that were used because they were fresh, the number of "misses" that had to be found again (for "file_locs", in days), and a histogram of the "seconds" it took to find them. Under "network", for each operation ("status" for server status checks, "catalog" for THREDDS catalog requests, "opendap" for opening Datasets): the number of "requests", how many were "errors", and a histogram of their "seconds". Each histogram has the "count" and "sum" of the seconds, and under "buckets" the number of them up to each bound of ``mc.METRICS_BUCKETS`` and infinity.
+
+    Examples
+    --------
+
+    Number of times catrefs were found again and how long that took in total:
+
+    >>> mc.metrics()["cache"]["catrefs"]["misses"]
+    >>> mc.metrics()["cache"]["catrefs"]["seconds"]["sum"]
+    """
+
+    with _METRICS_LOCK:
+        if not _METRICS:
+            _metrics_reset()
+        return copy.deepcopy(_METRICS)
+
+
+def metrics_clear():
+    """Reset all counts of ``mc.metrics()`` to zero, which also applies changes to ``mc.METRICS_BUCKETS``."""
+
+    with _METRICS_LOCK:
+        _metrics_reset()
+
+
+def _prometheus_histogram(name, label, value, histogram):
+    """Return lines of Prometheus text format for a histogram of seconds."""
+
+    lines = []
+    for bound, count in histogram["buckets"].items():
+        le = "+Inf" if bound == float("inf") else repr(float(bound))
+        lines.append(f'{name}_bucket{{{label}="{value}",le="{le}"}} {count}')
+    lines.append(f'{name}_sum{{{label}="{value}"}} {histogram["sum"]!r}')
+    lines.append(f'{name}_count{{{label}="{value}"}} {histogram["count"]}')
+    return lines
+
+
+def metrics_prometheus(fname=None):
+    """Return ``mc.metrics()`` in the Prometheus text exposition format.
+
+    Counters are named ``model_catalogs_cache_hits_total``, ``model_catalogs_cache_misses_total``, ``model_catalogs_network_requests_total``, and ``model_catalogs_network_errors_total``, and histograms ``model_catalogs_cache_seconds`` and ``model_catalogs_network_seconds``, labeled by "category" or "operation".
+
+    Parameters
+    ----------
+    fname : str, Path, optional
+        If input, the text is also saved to fname, replacing it in one step as needed for the textfile collector of the Prometheus node exporter.
+
+    Returns
+    -------
+    str
+        Metrics in the Prometheus text format.
+    """
+
+    current = metrics()
+    families = [
+        ("cache_hits_total", "counter", "Saved information that was fresh and used."),
+        ("cache_misses_total", "counter", "Saved information that was found again."),
+        ("cache_seconds", "histogram", "Seconds to find saved information again."),
+        ("network_requests_total", "counter", "Network requests made."),
+        ("network_errors_total", "counter", "Network requests that failed."),
+        ("network_seconds", "histogram", "Seconds that network requests took."),
+    ]
+
+    lines = []
+    for family, kind, description in families:
+        name = f"model_catalogs_{family}"
+        group, _, field = family.partition("_")
+        label = "category" if group == "cache" else "operation"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for value, fields in current[group].items():
+            if kind == "histogram":
+                lines.extend(
+                    _prometheus_histogram(name, label, value, fields["seconds"])
+                )
+            else:
+                lines.append(
+                    f'{name}{{{label}="{value}"}} {fields[field.replace("_total", "")]}'
+                )
+    text = "\n".join(lines) + "\n"
+
+    if fname is not None:
+        with mc.cache.atomic_open(fname) as outfile:
+            outfile.write(text)
+
+    return text
+
+
 def file2dt(filename):
     """Return Timestamp of NOAA OFS filename
 
@@ -126,17 +998,149 @@ def file2dt(filename):
     return date
 
 
-def get_fresh_parameter(filename, source):
+# NOAA OFS file name parts: n/f and hour, or NYOFS-style nowcast/forecast; date; timing cycle.
+# The rest of the line is matched too so that there is one match per line of joined names.
+FILE_NAME = re.compile(
+    rb"\.(?:([nf])(\d{3})|(nowcast|forecast))\.(\d{8})\.t(\d{2})z\.[^\n]*"
+)
+
+
+def _parse_ints(column):
+    """Return int array of column of bytes of digits, or empty for 0, converting each distinct value once."""
+
+    codes, uniques = pd.factorize(np.asarray(column, dtype=object))
+    return np.array([int(value or 0) for value in uniques], dtype=np.int64)[codes]
+
+
+def files2dt(filenames):
+    """Return datetimes of many NOAA OFS filenames at once
+
+    ...without reading in the files. This gives the same datetimes as ``file2dt()`` for each filename, but the parts of all the filenames are parsed with one regular expression and the datetimes are calculated as arrays, so tens of thousands of file locations take milliseconds. Filenames with multiple times per file (NYOFS) have one datetime per time. Any filenames that don't follow the usual patterns are passed to ``file2dt()``.
+
+    Parameters
+    ----------
+    filenames : list of str
+        Filenames for which to decipher datetimes. Can be full paths or just file names.
+
+    Returns
+    -------
+    tuple
+        datetime64[ns] array of the time(s) in the files, in order, and int array of the same length of the position in `filenames` of the file of each time.
+
+    Examples
+    --------
+    >>> dates, index = mc.files2dt(["nos.cbofs.fields.n001.20220701.t00z.nc", "nos.cbofs.fields.n002.20220701.t00z.nc"])
+    >>> dates
+    array(['2022-06-30T19:00:00.000000000', '2022-06-30T20:00:00.000000000'], dtype='datetime64[ns]')
+    >>> index
+    array([0, 1])
+    """
+
+    filenames = astype(filenames, list)
+    joined = "\n".join(filenames).encode()
+    rows = FILE_NAME.findall(joined)
+    matched = np.ones(len(filenames), dtype=bool)
+    if len(rows) != len(filenames):
+        # some names don't match, so match them one by one to keep rows in order
+        rows = []
+        for i, filename in enumerate(filenames):
+            match = FILE_NAME.search(filename.encode())
+            matched[i] = match is not None
+            rows.append(
+                match.groups(b"") if matched[i] else (b"", b"0", b"", b"19700101", b"0")
+            )
+    if len(rows) == 0:
+        return np.array([], dtype="datetime64[ns]"), np.array([], dtype=np.int64)
+    kind, hour, multi, date, cycle = zip(*rows)
+
+    kind, multi = np.array(kind), np.array(multi)
+    hour, date, cycle = _parse_ints(hour), _parse_ints(date), _parse_ints(cycle)
+
+    def contains(model):
+        if model.encode() not in joined:
+            return np.zeros(len(filenames), dtype=bool)
+        return np.array([model in filename.split("/")[-1] for filename in filenames])
+
+    # number of hours in repeat cycle for forecast
+    tshift = np.where(contains("wcofs"), 24, 6)
+
+    # number of times in each file and hours of the first time from midnight
+    counts = np.ones(len(filenames), dtype=np.int64)
+    start = cycle + hour - np.where(kind == b"n", tshift, 0)
+    nowcast, forecast = multi == b"nowcast", multi == b"forecast"
+    counts[nowcast], start[nowcast] = 6, cycle[nowcast] - 5
+    # models all have different forecast lengths! Though only nyofs is left in this category
+    nyofs = forecast & contains("nyofs")
+    counts[nyofs], start[nyofs] = 54, cycle[nyofs] + 1
+    # file2dt() handles the rest, including raising for unknown forecast lengths
+    other = ~matched | (forecast & ~nyofs)
+    if other.any():
+        others = [
+            astype(file2dt(filename), list)
+            for filename, other_ in zip(filenames, other)
+            if other_
+        ]
+        counts[other] = [len(dates) for dates in others]
+
+    year, month_day = np.divmod(date, 10000)
+    month, day = np.divmod(month_day, 100)
+    day = ((year - 1970) * 12 + month - 1).astype("datetime64[M]").astype(
+        "datetime64[ns]"
+    ) + (day - 1).astype("timedelta64[D]")
+
+    # one row per time: file position and hours past the first time of the file
+    index = np.repeat(np.arange(len(filenames)), counts)
+    offsets = np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    hours = np.repeat(start, counts) + offsets
+    dates = np.repeat(day, counts) + hours.astype("timedelta64[h]")
+
+    if other.any():
+        dates[np.repeat(other, counts)] = np.array(
+            [date for dates_ in others for date in dates_], dtype="datetime64[ns]"
+        )
+
+    return dates, index
+
+
+def fresh_parameter(parameter, source=None):
+    """Get freshness parameter by name.
+
+    A freshness parameter is stored in ``__init__`` for required scenarios. The source is checked for an overriding freshness parameter value in its metadata, otherwise the default is used.
+
+    Parameters
+    ----------
+    parameter : str
+        Name of freshness parameter, a key of ``mc.FRESH``.
+    source : Intake Source, optional
+        Source from which to check for an overriding freshness parameter.
+
+    Returns
+    -------
+    str
+        mu, a pandas Timedelta-interpretable string describing the amount of time that the information should be considered fresh before needing to be recalculated.
+    """
+
+    # check for overriding freshness parameter in source metadata
+    if (
+        source is not None
+        and "freshness" in source.metadata
+        and parameter in source.metadata["freshness"]
+    ):
+        return source.metadata["freshness"][parameter]
+    return mc.FRESH[parameter]
+
+
+def get_fresh_parameter(filename, source=None):
     """Get freshness parameter, based on the filename.
 
-    A freshness parameter is stored in ``__init__`` for required scenarios which is looked up using the logic in this function, based on the filename. The source is checked for most types of actions for an overriding freshness parameter value, otherwise the default is used.
+    A freshness parameter is stored in ``__init__`` for required scenarios which is looked up using the logic in this function, based on the filename. The source is checked for most types of actions for an overriding freshness parameter value, otherwise the default is used. Information about model sources is now saved with ``mc.cache`` instead of in files, and its freshness parameter is found with ``fresh_parameter()``; files where older versions saved it are deprecated.
 
     Parameters
     ----------
     filename : Path
         Filename to determine freshness.
     source : Intake Source
-        Source from which to check for an overriding freshness parameter. Is not used for "compiled" catalog files.
+        Source from which to check for an overriding freshness parameter. Is not used for "compiled" catalog files or server "status" files.
 
     Returns
     -------
@@ -144,42 +1148,41 @@ def get_fresh_parameter(filename, source):
         mu, a pandas Timedelta-interpretable string describing the amount of time that filename should be considered fresh before needing to be recalculated.
     """
 
-    # a start or end datetime file
-    if filename.parent == mc.CACHE_PATH_AVAILABILITY:
+    # a start or end datetime, catrefs, or file locs file of older versions
+    if filename.parent in [mc.CACHE_PATH / "availability", mc.CACHE_PATH / "file_locs"]:
 
+        warnings.warn(
+            f"Files in {filename.parent} are deprecated: information about model sources is saved in mc.CACHE_PATH_DB instead. Use fresh_parameter() for its freshness parameter.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
         if source is None:
             raise ValueError("source cannot be None for this freshness calculation.")
 
         # which type are we after
-        if "start" in filename.name:
+        if filename.parent.name == "file_locs":
+            parameter = "file_locs"
+        elif "start" in filename.name:
             parameter = "start"
         elif "end" in filename.name:
             parameter = "end"
-        elif "catrefs" in filename.name:
-            parameter = "catrefs"
-
-        # check for overriding freshness parameter in source metadata
-        if "freshness" in source.metadata and parameter in source.metadata["freshness"]:
-            mu = source.metadata["freshness"][parameter]
-        else:
-            mu = mc.FRESH[parameter]
-            # a file of file locs for aggregation
-    elif filename.parent == mc.CACHE_PATH_FILE_LOCS:
-
-        if source is None:
-            raise ValueError("source cannot be None for this freshness calculation.")
-
-        parameter = "file_locs"
-        # check for overriding freshness parameter in source metadata
-        if "freshness" in source.metadata and parameter in source.metadata["freshness"]:
-            mu = source.metadata["freshness"][parameter]
         else:
-            mu = mc.FRESH[parameter]
+            parameter = "catrefs"
+        mu = fresh_parameter(parameter, source)
 
     # a compiled catalog file
     elif filename.parent == mc.CACHE_PATH_COMPILED:
         mu = mc.FRESH["compiled"]
 
+    # a server status file
+    elif filename.parent == mc.CACHE_PATH_STATUS:
+        mu = mc.FRESH["status"]
+
+    else:
+        raise ValueError(
+            f"No freshness parameter for {filename}. Use fresh_parameter() for information saved with mc.cache."
+        )
+
     return mu
 
 
@@ -193,7 +1196,7 @@ def is_fresh(filename, source=None):
     filename : Path
         Filename to determine freshness
     source : Intake Source
-        Source from which to check for an overriding freshness parameter. Is not used for "compiled" catalog files.
+        Source from which to check for an overriding freshness parameter. Is not used for "compiled" catalog files or server "status" files.
 
     Returns
     -------
@@ -201,16 +1204,21 @@ def is_fresh(filename, source=None):
         True if fresh and False if not or if filename is not found.
     """
 
-    now = pd.Timestamp.today(tz="UTC")
     try:
-        filetime = pd.Timestamp(filename.stat().st_mtime_ns).tz_localize("UTC")
+        mtime_ns = filename.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
 
-        mu = get_fresh_parameter(filename, source=source)
+    mu = get_fresh_parameter(filename, source=source)
 
-        return now - filetime < pd.Timedelta(mu)
+    return time.time_ns() - mtime_ns < _timedelta_ns(mu)
 
-    except FileNotFoundError:
-        return False
+
+@functools.lru_cache(maxsize=None)
+def _timedelta_ns(mu):
+    """Return freshness parameter mu in nanoseconds."""
+
+    return pd.Timedelta(mu).value
 
 
 def find_bbox(ds, dd=None, alpha=None):
@@ -304,9 +1312,78 @@ def find_bbox(ds, dd=None, alpha=None):
     # return lonkey, latkey, list(p0.bounds), p0.wkt, p1.wkt
 
 
+class FileDates:
+    """Datetimes of NOAA OFS file locations, sorted and with one file per datetime.
+
+    Stored as arrays: int64 datetimes `times` (also as DatetimeIndex `index`), int32 `codes` of the file of each datetime, and the table of file locations `filenames`, so each file location is kept once no matter how many datetimes it has. Where several files have the same datetime, the file whose location sorts last is kept, which is the nowcast file over the forecast file.
+
+    Parameters
+    ----------
+    filelocs : list of str
+        File locations.
+
+    Examples
+    --------
+    >>> filedates = mc.FileDates(filelocs)
+    >>> filedates.select("2022-09-20", "2022-09-21")
+    """
+
+    def __init__(self, filelocs):
+        """Find, sort, and deduplicate datetimes of filelocs."""
+
+        filelocs = astype(filelocs, list)
+        filedates, index = files2dt(filelocs)
+
+        codes, self.filenames = pd.factorize(np.asarray(filelocs, dtype=object))
+        codes = codes.astype(np.int32)[index]
+        times = filedates.view(np.int64)
+
+        # file locations only need to be compared where datetimes are tied
+        order = np.argsort(times, kind="stable")
+        tied = np.zeros(len(times), dtype=bool)
+        same = times[order][1:] == times[order][:-1]
+        tied[order[1:][same]], tied[order[:-1][same]] = True, True
+        tied_codes = np.unique(codes[tied])
+        ranks = np.zeros(len(self.filenames), dtype=np.int32)
+        ranks[tied_codes[np.argsort(self.filenames[tied_codes])]] = np.arange(
+            1, len(tied_codes) + 1
+        )
+
+        # sort by datetime and then file location; keep the last file for each datetime
+        order = np.lexsort((ranks[codes], times))
+        times, codes = times[order], codes[order]
+        keep = np.append(times[1:] != times[:-1], True)
+        self.times, self.codes = times[keep], codes[keep]
+        self.index = pd.DatetimeIndex(self.times.view("datetime64[ns]"), name="index")
+
+    def __len__(self):
+        """Number of datetimes."""
+        return len(self.times)
+
+    def select(self, start=None, end=None):
+        """Return file locations with datetimes in range, in order and each only once.
+
+        Parameters
+        ----------
+        start, end : datetime-interpretable str, pd.Timestamp, or None; optional
+            Start and end of range, inclusive, which are interpreted as when slicing a DataFrame with a DatetimeIndex. For example, an `end` of "2022-09-20" includes all of that day. None leaves the range open.
+
+        Returns
+        -------
+        list
+            File locations.
+        """
+
+        # the index is sorted so this uses binary searches
+        selected = self.index.slice_indexer(start, end)
+        return list(self.filenames[pd.unique(self.codes[selected])])
+
+
 def filedates2df(filelocs):
     """Set up dataframe of datetimes to filenames.
 
+    For many file locations, ``FileDates`` selects the file locations of a date range with less memory.
+
     Parameters
     ----------
     filelocs : list of str
@@ -315,28 +1392,186 @@ def filedates2df(filelocs):
     Returns
     -------
     DataFrame
-        Contains the index datetimes corresponding to file locations (column 'filenames').
+        Contains the index datetimes corresponding to file locations (column 'filenames'), sorted and with nowcast files kept over forecast files for the same datetime.
+    """
+
+    filedates = FileDates(filelocs)
+    return pd.DataFrame(
+        index=filedates.index,
+        data={"filenames": filedates.filenames[filedates.codes]},
+    )
+
+
+# expressions that were evaluated in catalog file patterns, and the date format they give
+PATTERN_FIELDS = {
+    "date.year": "%Y",
+    "str(date.month).zfill(2)": "%m",
+    "str(date.day).zfill(2)": "%d",
+}
+
+# strftime codes in file patterns: regular expression group name and number of digits
+PATTERN_DATE_CODES = {"%Y": ("year", 4), "%m": ("month", 2), "%d": ("day", 2)}
+
+FileTable = namedtuple("FileTable", ["nowcast", "any", "cycle"])
+FileTable.__doc__ = """File locations parsed by ``FilePattern.parse()``: nowcast files by date parts, nowcast and forecast files by date parts and timing cycle, and the timing cycle with the most files."""  # noqa: E501
+
+
+class FilePattern:
+    """Compiled pattern of NOAA OFS file names for a filetype, to select files for aggregation by date.
+
+    The pattern is turned into regular expressions once, with the date and timing cycle as groups, so that a listing of file locations is parsed once and the files of any date are then selected from it. Use ``file_pattern()`` for a cached instance.
+
+    Parameters
+    ----------
+    filetype: str
+        Which filetype to use.
+    pattern: str, optional
+        Pattern of file names if the default does not match, from the source metadata. Fields in braces can be "{filetype}", a date format such as "{date:%Y%m%d}", or the expressions in ``PATTERN_FIELDS``, e.g. "{date.year}". Patterns are not evaluated as python code.
     """
 
-    # 1+ number of times possible from mc.file2dt, need the number of filenames to match
-    filedates, filenames = [], []
-    for fname in filelocs:
-        filedate = mc.astype(mc.file2dt(fname), list)
-        filenames.extend([fname] * len(filedate))
-        filedates.extend(filedate)
+    def __init__(self, filetype, pattern=None):
+        """Compile regular expressions for pattern."""
+
+        if pattern is None:
+            glob = f"*{filetype}*.n*.%Y%m%d.t??z.*"
+        else:
+
+            def field(match):
+                expr = match.group(1)
+                if expr == "filetype":
+                    return filetype
+                if expr in PATTERN_FIELDS:
+                    return PATTERN_FIELDS[expr]
+                if expr.startswith("date:"):
+                    return expr[len("date:") :]
+                raise ValueError(
+                    f"Field {{{expr}}} of file pattern {pattern} is not supported."
+                )
+
+            glob = re.sub(r"\{([^{}]*)\}", field, pattern)
+
+        # forecast files of the timing cycle are found along with its nowcast files
+        self.nowcast = self._compile(glob)
+        self.any = self._compile(glob.replace(".n*.", ".[n,f]*."))
+
+    @staticmethod
+    def _compile(glob):
+        """Return regular expression that matches lines of joined strings that match glob."""
+
+        parts, seen, i = [], set(), 0
+        while i < len(glob):
+            if glob.startswith(".t??z.", i):
+                parts.append(r"\.t(?P<cycle>..)z\.")
+                i += len(".t??z.")
+            elif glob[i : i + 2] in PATTERN_DATE_CODES:
+                name, width = PATTERN_DATE_CODES[glob[i : i + 2]]
+                parts.append(
+                    f"(?P={name})" if name in seen else f"(?P<{name}>\\d{{{width}}})"
+                )
+                seen.add(name)
+                i += 2
+            elif glob[i] == "*":
+                parts.append(".*")
+                i += 1
+            elif glob[i] == "?":
+                parts.append(".")
+                i += 1
+            elif glob[i] == "[" and "]" in glob[i + 2 :]:
+                end = glob.index("]", i + 2)
+                chars = glob[i + 1 : end]
+                if chars[0] == "!":
+                    chars = "^" + chars[1:]
+                parts.append("[" + chars.replace("\\", "\\\\") + "]")
+                i = end + 1
+            else:
+                parts.append(re.escape(glob[i]))
+                i += 1
+
+        return re.compile(f"^(?P<name>{''.join(parts)})$", re.MULTILINE)
+
+    def _key(self, regex, date):
+        """Return date parts of date that regex has groups for, as the key of its files."""
+
+        return tuple(
+            date.strftime(code) if name in regex.groupindex else None
+            for code, (name, _) in PATTERN_DATE_CODES.items()
+        )
+
+    def _group(self, regex, joined, cycle=False):
+        """Return dict of file locations of lines of joined that match regex, by date parts and cycle."""
+
+        groups = [name for name, _ in PATTERN_DATE_CODES.values()]
+        if cycle:
+            groups.append("cycle")
+        files = {}
+        for match in regex.finditer(joined):
+            key = tuple(
+                match.group(group) if group in regex.groupindex else None
+                for group in groups
+            )
+            files.setdefault(key, []).append(match.group("name"))
+        return files
+
+    def parse(self, strings):
+        """Parse file locations once for selecting the files of any date.
+
+        Parameters
+        ----------
+        strings: list
+            List of strings to be filtered. Expected to be file locations from a thredds catalog.
+
+        Returns
+        -------
+        FileTable
+        """
+
+        joined = "\n".join(strings)
+
+        # choose the timing cycle that is latest but also has the most times available
+        # sometimes the forecast files aren't available yet so don't want to use that time
+        cycles, counts = np.unique(
+            re.findall(".t([0-9]{2})z.", joined), return_counts=True
+        )
+        cycle = cycles[counts == counts.max()][-1] if len(cycles) > 0 else None
+
+        return FileTable(
+            self._group(self.nowcast, joined),
+            self._group(self.any, joined, cycle=True),
+            cycle,
+        )
+
+    def select(self, table, date, is_forecast=False):
+        """Select files for aggregation for date from parsed file locations.
+
+        See ``agg_for_date()`` for details.
+        """
+
+        date = astype(date, pd.Timestamp)
+
+        # find all nowcast files of date
+        fnames = table.nowcast.get(self._key(self.nowcast, date), [])
 
-    # Make dataframe
-    df = pd.DataFrame(index=filedates, data={"filenames": filenames})
+        # if using forecast, find nowcast and forecast files for the latest full timing cycle
+        if is_forecast:
+            cycle = table.cycle if "cycle" in self.any.groupindex else None
+            key = self._key(self.any, date) + (cycle,)
+            # Include the nowcast files between the start of the day and when the time
+            # series represented by the files of the cycle begins
+            fnames = table.any.get(key, []) + fnames
 
-    # Sort resulting df by filenames and then by index which is the datetime of each file
-    df = df.reset_index().sort_values(by=["index", "filenames"]).set_index("index")
+            if len(fnames) == 0:
+                raise ValueError(
+                    f"Error finding filenames. Filenames found so far: {fnames}. "
+                    "Maybe you have the wrong source for the days requested."
+                )
 
-    # df = df.sort_values(axis="index", by="filenames").sort_index()
+        return list(fnames)
 
-    # remove rows if index is duplicated, sorting makes it so nowcast files are kept
-    df = df[~df.index.duplicated(keep="last")]
 
-    return df
+@functools.lru_cache(maxsize=None)
+def file_pattern(filetype, pattern=None):
+    """Return cached ``FilePattern`` for filetype and pattern."""
+    return FilePattern(filetype, pattern)
 
 
 def agg_for_date(date, strings, filetype, is_forecast=False, pattern=None):
@@ -355,7 +1590,7 @@ def agg_for_date(date, strings, filetype, is_forecast=False, pattern=None):
     is_forecast: bool, optional
         If True, then date is the last day of the time period being sought and the forecast files should be brought in along with the nowcast files, to get the model output the length of the forecast out in time. The forecast files brought in will have the latest timing cycle of the day that is available. If False, all nowcast files (for all timing cycles) are brought in.
     pattern: str, optional
-        If a model file pattern doesn't match that assumed in this code, input one that will work. Currently only NYOFS doesn't match but the pattern is built into the catalog file.
+        If a model file pattern doesn't match that assumed in this code, input one that will work. Currently only NYOFS doesn't match but the pattern is built into the catalog file. See ``FilePattern`` for the fields it can have.
 
     Returns
     -------
@@ -363,62 +1598,211 @@ def agg_for_date(date, strings, filetype, is_forecast=False, pattern=None):
         Contains URLs for where to find all of the model output files that match the keyword arguments. List is not sorted correctly for times (this happens later).
     """
 
-    date = astype(date, pd.Timestamp)
+    file_pattern_ = file_pattern(filetype, pattern)
+    return file_pattern_.select(file_pattern_.parse(strings), date, is_forecast)
 
-    if pattern is None:
-        pattern = date.strftime(f"*{filetype}*.n*.%Y%m%d.t??z.*")
-    else:
-        pattern = eval(f"f'{pattern}'")
 
-    # if using forecast, find nowcast and forecast files for the latest full timing cycle
-    if is_forecast:
+XLINK = "{http://www.w3.org/1999/xlink}"
 
-        import re
 
-        # Find the most recent, complete timing cycle for the forecast day
-        regex = re.compile(".t[0-9]{2}z.")
-        # substrings: list of repeated strings of hours, e.g. ['12', '06', '00', '12', ...]
-        subs = [substr[2:4] for substr in regex.findall("".join(strings))]
-        # unique str times, in increasing order, e.g. ['00', '06', '12']
-        times = sorted(list(set(subs)))
-        # choose the timing cycle that is latest but also has the most times available
-        # sometimes the forecast files aren't available yet so don't want to use that time
-        cycle = sorted(times, key=subs.count)[-1]  # noqa: F841
-
-        # find all nowcast files with only timing "cycle"
-        # replace '.t??z.' in pattern with '.t{cycle}z.' to get the latest timing cycle only
-        pattern1 = pattern.replace(".t??z.", ".t{cycle}z.").replace(".n*.", ".[n,f]*.")
-        pattern1 = eval(f"f'{pattern1}'")  # use `eval` to sub in value of `cycle`
-        # sort nowcast files alone to get correct time order
-        fnames_cycle = fnmatch.filter(strings, pattern1)
-
-        # Include the nowcast files between the start of the day and when the time series
-        # represented in fnames begins
-        # fnames_now = find_nowcast_cycles(strings, pattern)
-        fnames_nowcast = fnmatch.filter(strings, pattern)
-
-        fnames = fnames_cycle + fnames_nowcast  # combine
-
-        if len(fnames) == 0:
-            raise ValueError(
-                f"Error finding filenames. Filenames found so far: {fnames}. "
-                "Maybe you have the wrong source for the days requested."
-            )
+def _is_model_output(dataset, filetype):
+    """Whether dataset name is a model output file of filetype (and not stations or vibrio probability output)."""
+    return (
+        "stations" not in dataset
+        and "vibrioprob" not in dataset
+        and filetype in dataset
+    )
 
-    # if not using forecast, find all nowcast files matching pattern
-    else:
-        fnames = fnmatch.filter(strings, pattern)
 
-    return fnames
+def _opendap_base(service):
+    """Return base of service if it is an OPeNDAP service, or of the first OPeNDAP service that it is made of, otherwise None."""
+
+    if service.attrib.get("serviceType", "").lower() == "opendap":
+        return service.attrib.get("base")
+    for child in service:
+        if child.tag.split("}")[-1] == "service":
+            base = _opendap_base(child)
+            if base is not None:
+                return base
+    return None
+
+
+def _parse_thredds_catalog(content, catalog_url, filetype=None):
+    """Parse thredds catalog xml into catalog references and OPeNDAP dataset locations.
+
+    This is a lightweight alternative to siphon's ``TDSCatalog``: the xml can be parsed in chunks as it is downloaded, elements are removed from the tree once read, and only the datasets that are needed are kept. The OPeNDAP location of each dataset uses the service named by its own or inherited ``serviceName``, or the first OPeNDAP service of the catalog if it has none.
+
+    Parameters
+    ----------
+    content : bytes, str, or iterable of bytes
+        Catalog xml, or chunks of it such as from ``requests.Response.iter_content()``.
+    catalog_url : str
+        Location of catalog, used to resolve relative links.
+    filetype : str, optional
+        If input, only keep datasets that are model output files of filetype, as in ``find_filelocs()``.
+
+    Returns
+    -------
+    tuple
+        dict of catalog reference titles to catalog urls, and dict of dataset names to OPeNDAP urls, both in catalog order.
+    """
+
+    if isinstance(content, str):
+        content = content.encode()
+    if isinstance(content, bytes):
+        content = [content]
+
+    # OPeNDAP base by service name, and the first one for datasets without a service
+    services, default_base = {}, None
+    catalog_refs, url_paths = {}, {}
+    # elements that are open, and {"inherited": ..., "own": ...} service names of datasets
+    elements, open_datasets = [], []
+
+    def read(events):
+        nonlocal default_base
+
+        for event, element in events:
+            tag = element.tag.split("}")[-1]
+            if event == "start":
+                elements.append(element)
+                if tag == "dataset":
+                    inherited = (
+                        open_datasets[-1]["inherited"] if open_datasets else None
+                    )
+                    own = element.attrib.get("serviceName")
+                    open_datasets.append({"inherited": inherited, "own": own})
+                continue
+
+            elements.pop()
+            parent = elements[-1] if elements else None
+            if tag == "service":
+                base = _opendap_base(element)
+                services[element.attrib.get("name")] = base
+                if default_base is None:
+                    default_base = base
+            elif tag == "serviceName" and open_datasets:
+                inherited = (
+                    parent is not None
+                    and parent.tag.split("}")[-1] == "metadata"
+                    and parent.attrib.get("inherited", "").lower() == "true"
+                )
+                open_datasets[-1]["inherited" if inherited else "own"] = element.text
+            elif tag == "catalogRef":
+                href = urljoin(catalog_url, element.attrib[f"{XLINK}href"])
+                catalog_refs[element.attrib[f"{XLINK}title"]] = href
+                parent.remove(element)
+            elif tag == "dataset":
+                service = open_datasets.pop()
+                name = element.attrib.get("name", "")
+                if "urlPath" in element.attrib and (
+                    filetype is None or _is_model_output(name, filetype)
+                ):
+                    url_paths[name] = (
+                        service["own"] or service["inherited"],
+                        element.attrib["urlPath"],
+                    )
+                if parent is not None:
+                    parent.remove(element)
+
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    for chunk in content:
+        parser.feed(chunk)
+        read(parser.read_events())
+    parser.close()
+    read(parser.read_events())
+
+    datasets = {}
+    for name, (service, url_path) in url_paths.items():
+        base = services[service] if service in services else default_base
+        if base is not None:
+            datasets[name] = urljoin(catalog_url, base) + url_path
+
+    return catalog_refs, datasets
+
+
+def _follow(catalog_ref, deadline):
+    """Follow siphon CatalogRef unless deadline (from `time.monotonic`) has passed."""
+
+    if time.monotonic() > deadline:
+        raise requests.exceptions.Timeout(
+            f"Crawling catalog took longer than {mc.HTTP['crawl_timeout']} seconds; stopped before {catalog_ref.href}."
+        )
+    return _tds_catalog(catalog_ref.href)
+
+
+def _follow_all(catalog_refs, deadline, max_workers, progress=False, level=None):
+    """Follow siphon CatalogRefs concurrently with at most max_workers threads.
+
+    Returns
+    -------
+    list
+        TDSCatalog for each of catalog_refs, in the same order.
+    """
+
+    catalogs = []
+    if len(catalog_refs) == 0:
+        return catalogs
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(catalog_refs))
+    ) as executor:
+        for catalog in executor.map(
+            lambda catalog_ref: _follow(catalog_ref, deadline), catalog_refs
+        ):
+            catalogs.append(catalog)
+            if progress:
+                print(
+                    f"Level {level}: read {len(catalogs)} of {len(catalog_refs)} catalogs",
+                    end="\r" if len(catalogs) < len(catalog_refs) else "\n",
+                )
+    return catalogs
 
 
-def find_catrefs(catloc):
+def _branches_to_relist(branches, catrefs):
+    """Return branches of the catalog hierarchy to read again when updating catrefs.
+
+    These are the branches that are not in catrefs yet, and the earliest and latest branches that are: model output is added at the recent end and can be removed at the early end of a catalog.
+
+    Parameters
+    ----------
+    branches : list
+        Tuples of labels describing branches on one level of the hierarchy, in order.
+    catrefs : list or None
+        Previously-found catrefs. If None, all branches are returned.
+    """
+
+    if catrefs is None or len(branches) == 0:
+        return list(branches)
+    known = {catref[: len(branches[0])] for catref in catrefs}
+    surviving = [branch for branch in branches if branch in known]
+    edges = surviving[:1] + surviving[-1:]
+    return [branch for branch in branches if branch not in known or branch in edges]
+
+
+def _known_labels(branch, catrefs):
+    """Return labels one level below branch in previously-found catrefs, in order."""
+
+    return sorted(
+        {catref[len(branch)] for catref in catrefs if catref[: len(branch)] == branch}
+    )
+
+
+def find_catrefs(catloc, max_workers=None, progress=False, catrefs=None):
     """Find hierarchy of catalog references for thredds catalog.
 
+    The catalogs on each level of the hierarchy are read concurrently, and each catalog is only read once. The whole search has to finish within ``mc.HTTP["crawl_timeout"]`` seconds, otherwise ``requests.exceptions.Timeout`` is raised.
+
+    If previously-found `catrefs` are input, they are updated instead of searching the whole hierarchy: on each level, only new catalogs and the earliest and latest previously-found catalogs are read again. Catalogs that are no longer listed are dropped.
+
     Parameters
     ----------
     catloc: str
         Search in thredds catalog structure from base catalog, catloc.
+    max_workers : int, optional
+        Maximum number of catalogs to read at once. Defaults to ``mc.HTTP["pool_maxsize"]``.
+    progress : bool, optional
+        If True, print how many catalogs have been read on each level.
+    catrefs : list, optional
+        Previously-found output of this function for catloc, to update.
 
     Returns
     -------
@@ -426,49 +1810,82 @@ def find_catrefs(catloc):
         Contains tuples containing the hierarchy of directories in the thredds catalog structure to get to where the datafiles start.
     """
 
+    deadline = time.monotonic() + mc.HTTP["crawl_timeout"]
+    if max_workers is None:
+        max_workers = mc.HTTP["pool_maxsize"]
+    if catrefs is not None:
+        catrefs = [tuple(catref) for catref in catrefs] or None
+
     # 0th level catalog
-    cat = TDSCatalog(catloc)
-    catrefs_to_check = list(cat.catalog_refs)
+    cat = _tds_catalog(catloc)
     # only keep numerical directories
-    catrefs_to_check = [catref for catref in catrefs_to_check if catref.isnumeric()]
+    years = [(catref,) for catref in cat.catalog_refs if catref.isnumeric()]
 
     # 1st level catalog
-    catrefs_to_check1 = [
-        cat.catalog_refs[catref].follow().catalog_refs for catref in catrefs_to_check
-    ]
+    relist = _branches_to_relist(years, catrefs)
+    cats1 = dict(
+        zip(
+            relist,
+            _follow_all(
+                [cat.catalog_refs[year[0]] for year in relist],
+                deadline,
+                max_workers,
+                progress,
+                level=1,
+            ),
+        )
+    )
+
+    def cat1(year):
+        """Catalog for year, which is read if it wasn't on the 1st level."""
+        if year not in cats1:
+            cats1[year] = _follow(cat.catalog_refs[year[0]], deadline)
+        return cats1[year]
 
     # Combine the catalog references together
-    catrefs = [
-        (catref0, catref1)
-        for catref0, catrefs1 in zip(catrefs_to_check, catrefs_to_check1)
-        for catref1 in catrefs1
+    catrefs1 = [
+        year + (catref1,)
+        for year in years
+        for catref1 in (
+            cats1[year].catalog_refs if year in cats1 else _known_labels(year, catrefs)
+        )
     ]
 
     # Check first one to see if there are more catalog references or not
-    cat_ref_test = (
-        cat.catalog_refs[catrefs[0][0]]
-        .follow()
-        .catalog_refs[catrefs[0][1]]
-        .follow()
-        .catalog_refs
-    )
-    # If there are more catalog references, run another level of catalog and combine, ## 2
-    if len(cat_ref_test) > 0:
-        catrefs2 = [
-            cat.catalog_refs[catref[0]]
-            .follow()
-            .catalog_refs[catref[1]]
-            .follow()
-            .catalog_refs
-            for catref in catrefs
-        ]
-        catrefs = [
-            (catref[0], catref[1], catref22)
-            for catref, catref2 in zip(catrefs, catrefs2)
-            for catref22 in catref2
-        ]
+    if catrefs is None:
+        cat_ref_test = _follow(
+            cat1(catrefs1[0][:1]).catalog_refs[catrefs1[0][1]], deadline
+        ).catalog_refs
+        more_levels = len(cat_ref_test) > 0
+    else:
+        more_levels = len(catrefs[0]) == 3
 
-    return catrefs
+    # If there are more catalog references, run another level of catalog and combine, ## 2
+    if not more_levels:
+        return catrefs1
+
+    relist = _branches_to_relist(catrefs1, catrefs)
+    cats2 = dict(
+        zip(
+            relist,
+            _follow_all(
+                [cat1(catref[:1]).catalog_refs[catref[1]] for catref in relist],
+                deadline,
+                max_workers,
+                progress,
+                level=2,
+            ),
+        )
+    )
+    return [
+        catref + (catref2,)
+        for catref in catrefs1
+        for catref2 in (
+            cats2[catref].catalog_refs
+            if catref in cats2
+            else _known_labels(catref, catrefs)
+        )
+    ]
 
 
 def find_filelocs(catref, catloc, filetype="fields"):
@@ -492,38 +1909,18 @@ def find_filelocs(catref, catloc, filetype="fields"):
         Locations of files found from catloc to hierarchical location described by catref.
     """
 
-    filelocs = []
-    cat = TDSCatalog(catloc)
-    if len(catref) == 2:
-        catref1, catref2 = catref
-        cat1 = cat.catalog_refs[catref1].follow()
-        cat2 = cat1.catalog_refs[catref2].follow()
-        last_cat = cat2
-        datasets = cat2.datasets
-    elif len(catref) == 3:
-        catref1, catref2, catref3 = catref
-        cat1 = cat.catalog_refs[catref1].follow()
-        cat2 = cat1.catalog_refs[catref2].follow()
-        cat3 = cat2.catalog_refs[catref3].follow()
-        last_cat = cat3
-        datasets = cat3.datasets
-
-    for dataset in datasets:
-        if (
-            "stations" not in dataset
-            and "vibrioprob" not in dataset
-            and filetype in dataset
-        ):
+    # catalogs on the way down are usually already cached from previous calls
+    cat = _tds_catalog(catloc)
+    for label in catref[:-1]:
+        cat = _tds_catalog(cat.catalog_refs[label].href)
 
-            url = last_cat.datasets[dataset].access_urls["OPENDAP"]
-            filelocs.append(url)
-    return filelocs
+    return list(_thredds_filelocs(cat.catalog_refs[catref[-1]].href, filetype))
 
 
 def calculate_boundaries(cats, save_files=True, return_boundaries=False):
     """Calculate boundary information for all models.
 
-    This loops over all input catalogs and will try with multiple model_source if necessary (in case servers aren't working) to access the example model output files and calculate the bounding box and numerical domain boundary. The numerical domain boundary is calculated using `alpha_shape` with previously-chosen parameters stored in the original model catalog files. The bounding box and boundary string representation (as WKT) are then saved to files.
+    This loops over all input catalogs and will try with multiple model_source if necessary (in case servers aren't working) to access the example model output files and calculate the bounding box and numerical domain boundary. Catalogs for which no server is working are skipped with a warning. The numerical domain boundary is calculated using `alpha_shape` with previously-chosen parameters stored in the original model catalog files. The bounding box and boundary string representation (as WKT) are then saved to files.
 
     The files are saved the first time you run this function, so this function should only be rerun if you suspect that a model domain has changed or you have a new model catalog.
 
@@ -546,33 +1943,59 @@ def calculate_boundaries(cats, save_files=True, return_boundaries=False):
     >>> mc.calculate_boundaries(main_cat["CBOFS"])
     """
 
+    cats = mc.astype(cats, list)
+
+    # set up transformed sources for all catalogs first so that the servers
+    # for all of them can be checked at once
+    cat_transforms = []
+    for cat in cats:
+        source_transforms = [
+            mc.transform_source(cat[model_source]) for model_source in list(cat)
+        ]
+
+        # need to make catalog to transfer information properly from
+        # source_orig to source_transform
+        cat_transform = mc.make_catalog(
+            source_transforms,
+            full_cat_name=cat.name,  # model name
+            full_cat_description=cat.description,
+            full_cat_metadata=cat.metadata,
+            cat_driver=mc.process.DatasetTransform,
+            cat_path=None,
+            save_catalog=False,
+        )
+        cat_transforms.append(cat_transform)
+
+    mc.status_many(
+        [
+            cat_transform[model_source]
+            for cat_transform in cat_transforms
+            for model_source in list(cat_transform)
+        ]
+    )
+
     # loop over all orig catalogs
     boundaries = {}
-    for cat in mc.astype(cats, list):
+    for cat, cat_transform in zip(cats, cat_transforms):
 
         # loop over available sources and use the first that works
-        for model_source in list(cat):
-            source_orig = cat[model_source]
-            source_transform = mc.transform_source(source_orig)
-
-            # need to make catalog to transfer information properly from
-            # source_orig to source_transform
-            cat_transform = mc.make_catalog(
-                source_transform,
-                full_cat_name=cat.name,  # model name
-                full_cat_description=cat.description,
-                full_cat_metadata=cat.metadata,
-                cat_driver=mc.process.DatasetTransform,
-                cat_path=None,
-                save_catalog=False,
-            )
+        ds = None
+        for model_source in list(cat_transform):
 
             if cat_transform[model_source].status:
 
                 # read in model output
+                start = time.perf_counter()
                 ds = cat_transform[model_source].to_dask()
                 break
 
+        if ds is None:
+            warnings.warn(
+                f"Boundaries of {cat.name} were not calculated since the servers of none of its sources are working.",  # noqa: E501
+                RuntimeWarning,
+            )
+            continue
+
         # find boundary information for model
         if "alpha_shape" in cat.metadata:
             dd, alpha = cat.metadata["alpha_shape"]
@@ -581,11 +2004,13 @@ def calculate_boundaries(cats, save_files=True, return_boundaries=False):
         lonkey, latkey, bbox, wkt = mc.find_bbox(ds, dd=dd, alpha=alpha)
 
         ds.close()
+        _record_cache("boundaries", misses=1, seconds=time.perf_counter() - start)
 
         # save boundary info to file
         if save_files:
-            with open(mc.FILE_PATH_BOUNDARIES(cat.name.lower()), "w") as outfile:
-                yaml.dump({"bbox": bbox, "wkt": wkt}, outfile, default_flow_style=False)
+            fname = mc.FILE_PATH_BOUNDARIES(cat.name.lower())
+            mc.cache.dump({"bbox": bbox, "wkt": wkt}, fname)
+            mc.cache.share("boundaries", cat.name.lower(), fname)
 
         if return_boundaries:
             boundaries[cat.name] = {"bbox": bbox, "wkt": wkt}